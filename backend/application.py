@@ -3,22 +3,47 @@ import logging
 
 logging.basicConfig(level=logging.INFO)
 
-from flask import Flask
+from flask import Flask, jsonify, request
 from flask_cors import CORS
-from db import close_connection
+from db import close_connection, db_pool, PoolTimeout, DB_POOL_RETRY_AFTER
+from metrics import observe_response, render_metrics
+from http_cache import compress_response
 from routes import register_routes
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://10.0.0.164:3000"]}})
+CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://10.0.0.164:3000"]}}, expose_headers=['X-Next-After-Id', 'ETag'])
 
 register_routes(app)
 
 app.teardown_appcontext(close_connection)
 
+@app.after_request
+def record_response_size(response):
+    observe_response(request.endpoint, response)
+    return response
+
+# Registered last so it runs first and the size above is what goes over the wire
+app.after_request(compress_response)
+
+# A saturated pool is temporary; tell clients to retry instead of failing with a 500
+@app.errorhandler(PoolTimeout)
+def pool_timeout(e):
+    logging.warning(f'Database pool exhausted: {str(e)}')
+    return jsonify({'error': 'Database is busy, try again shortly'}), 503, {'Retry-After': str(DB_POOL_RETRY_AFTER)}
+
 @app.route('/health')
 def health_check():
     return 'OK', 200
 
+@app.route('/metrics')
+def metrics():
+    body, content_type = render_metrics()
+    return body, 200, {'Content-Type': content_type}
+
+@app.route('/db-pool')
+def db_pool_stats():
+    return jsonify(db_pool.stats())
+
 # For Gunicorn, ensure it binds to the port from environment variable
 port = int(os.environ.get('PORT', 8000))
 
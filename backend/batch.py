@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+
+from parsing import TrimTagNotFound
+from parse_pool import run_extract_rows, ParseJobError
+from loader import load_scraper_definitions, definition_plan
+from results import fetch_if_changed, page_upstream, stored_upstream
+
+# Concurrent fetches per batch, and how many of them may hit the same host at once
+BATCH_FETCH_WORKERS = int(os.environ.get('BATCH_FETCH_WORKERS', 16))
+BATCH_MAX_PER_HOST = int(os.environ.get('BATCH_MAX_PER_HOST', 2))
+
+
+class HostLimiter:
+    def __init__(self, limit=BATCH_MAX_PER_HOST, min_interval=0):
+        self.limit = limit
+        self.min_interval = min_interval
+        self._semaphores = {}
+        self._next_start = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.limit)
+        with semaphore:
+            if self.min_interval:
+                self._wait_turn(host)
+            yield
+
+    # Reserve the next start time for the host so requests to it are spaced min_interval apart
+    def _wait_turn(self, host):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class BatchJob:
+    def __init__(self, scraper_id, scraping_url, plan, page_cache_ttl=None, parser_backend=None, last_content_hash=None,
+                 upstream=None):
+        self.scraper_id = scraper_id
+        self.scraping_url = scraping_url
+        self.plan = plan
+        self.page_cache_ttl = page_cache_ttl
+        self.parser_backend = parser_backend
+        self.last_content_hash = last_content_hash
+        self.upstream = upstream or {}
+
+
+# scraper_ids=None loads every scraper; returns runnable jobs plus error results for the rest
+def load_batch_jobs(cursor, scraper_ids=None):
+    definitions = load_scraper_definitions(cursor, scraper_ids)
+
+    errors = []
+    if scraper_ids is not None:
+        found = {definition['scraper_id'] for definition in definitions}
+        errors.extend({'scraper_id': i, 'status': 404, 'error': 'Scraper not found'} for i in scraper_ids if i not in found)
+
+    jobs = []
+    for definition in definitions:
+        if definition['config'] is None:
+            errors.append({'scraper_id': definition['scraper_id'], 'status': 404, 'error': 'Scraper config not found'})
+            continue
+        jobs.append(BatchJob(definition['scraper_id'], definition['scraping_url'], definition_plan(definition),
+                             definition.get('page_cache_ttl'), definition.get('parser_backend'),
+                             definition.get('last_content_hash'), stored_upstream(definition)))
+    return jobs, errors
+
+
+# skip_unchanged sends the stored validators and returns without parsing when the stored results still hold
+def run_job(job, limiter, skip_unchanged=False):
+    try:
+        # Only the download holds the host slot; parsing happens after it is released
+        with limiter.slot(job.scraping_url):
+            page, fingerprint = fetch_if_changed(job.scraping_url, job.page_cache_ttl,
+                                                 job.last_content_hash if skip_unchanged else None,
+                                                 job.upstream, job.plan.version)
+    except requests.Timeout as e:
+        return {'scraper_id': job.scraper_id, 'status': 504, 'error': f'Timed out fetching URL: {str(e)}'}
+    except Exception as e:
+        return {'scraper_id': job.scraper_id, 'status': 500, 'error': f'Failed to fetch URL: {str(e)}'}
+
+    if page is None:
+        return {'scraper_id': job.scraper_id, 'status': 200, 'unchanged': True, 'fingerprint': fingerprint}
+
+    try:
+        rows = run_extract_rows(page.text, job.parser_backend, job.plan)
+    except TrimTagNotFound:
+        return {'scraper_id': job.scraper_id, 'status': 404, 'error': 'Trim tag not found in page'}
+    except ParseJobError as e:
+        return {'scraper_id': job.scraper_id, 'status': e.status, 'error': str(e), 'code': e.code}
+    except Exception as e:
+        logging.error(f'Batch extraction failed for scraper {job.scraper_id}: {str(e)}')
+        return {'scraper_id': job.scraper_id, 'status': 500, 'error': f'Failed to extract data: {str(e)}'}
+
+    return {'scraper_id': job.scraper_id, 'status': 200, 'data': rows, 'fingerprint': fingerprint,
+            'upstream': page_upstream(page)}
+
+
+# Yields one result per job in completion order, so fast hosts are not held back by slow ones
+def iter_batch(jobs, max_workers=BATCH_FETCH_WORKERS, max_per_host=BATCH_MAX_PER_HOST):
+    if not jobs:
+        return
+    limiter = HostLimiter(max_per_host)
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(jobs)))
+    try:
+        futures = [executor.submit(run_job, job, limiter) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # A client that disconnects mid-stream should not leave queued fetches running
+        executor.shutdown(wait=False, cancel_futures=True)
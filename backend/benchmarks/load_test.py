@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from benchmarks.pipeline_benchmark import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER_CLASSES = ('gthread', 'gevent')
+STUB_PAGE = '<html><body><table>' + ''.join(
+    f'<tr><td>name {i}</td><td>{i}.00</td></tr>' for i in range(50)
+) + '</table></body></html>'
+
+
+class SlowServer:
+    def __init__(self, delay):
+        body = STUB_PAGE.encode('utf-8')
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(delay)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        # Enough backlog that the stub never becomes the bottleneck
+        self._server.request_queue_size = 1024
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_port}/slow'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# Inserts a scraper pointing at the stub; page_cache_ttl 0 makes every scrape go upstream
+def seed_scraper(url):
+    from db import connect
+
+    now = datetime.utcnow()
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO scraper_config (trim_input, group_row_count, created_on, last_updated_on) VALUES (%s, %s, %s, %s) RETURNING scraper_config_id',
+            (None, 2, now, now)
+        )
+        scraper_config_id = cursor.fetchone()['scraper_config_id']
+        cursor.execute(
+            'INSERT INTO scraper_config_tags (scraper_config_id, tag, created_on, last_updated_on) VALUES (%s, %s, %s, %s)',
+            (scraper_config_id, '<td>', now, now)
+        )
+        cursor.execute(
+            '''INSERT INTO scrapers (scraper_name, scraping_url, scraper_config_id, created_on, page_cache_ttl)
+            VALUES (%s, %s, %s, %s, %s) RETURNING scraper_id''',
+            ('load test', url, scraper_config_id, now, 0)
+        )
+        scraper_id = cursor.fetchone()['scraper_id']
+        conn.commit()
+        return scraper_id, scraper_config_id
+    finally:
+        conn.close()
+
+
+def drop_scraper(scraper_id, scraper_config_id):
+    from db import connect
+
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM scrapers WHERE scraper_id = %s', (scraper_id,))
+        cursor.execute('DELETE FROM scraper_config WHERE scraper_config_id = %s', (scraper_config_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def wait_until_healthy(base_url, process=None, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode} before becoming healthy')
+        try:
+            if requests.get(f'{base_url}/health', timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not become healthy within {timeout}s')
+
+
+def start_server(worker_class, port, workers, concurrency, app='application:app'):
+    env = dict(
+        os.environ,
+        WEB_WORKER_CLASS=worker_class,
+        WEB_WORKERS=str(workers),
+        PORT=str(port),
+        # The stub is a single host; lift the per-host cap so it measures the server, not the politeness limit
+        FETCH_MAX_CONNECTIONS_PER_HOST=str(concurrency)
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', app, '--config', 'gunicorn.conf.py', '--log-level', 'warning', '--access-logfile', os.devnull],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+    try:
+        wait_until_healthy(f'http://127.0.0.1:{port}', process)
+    except Exception:
+        process.terminate()
+        process.wait()
+        raise
+    return process
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# Polls /health during the load so a blocked server shows up as health latency
+def probe_health(base_url, stop, latencies, errors):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            requests.get(f'{base_url}/health', timeout=30).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException:
+            errors.append(time.perf_counter() - start)
+        stop.wait(0.1)
+
+
+def run_load(base_url, scraper_id, concurrency, total_requests):
+    latencies = []
+    errors = []
+
+    # A distinct query per request keeps identical in-flight scrapes from being coalesced into one
+    def one_request(n):
+        start = time.perf_counter()
+        try:
+            response = requests.get(f'{base_url}/scrape/{scraper_id}?refresh=1&n={n}', timeout=120)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException as e:
+            errors.append(str(e))
+
+    health_latencies = []
+    health_errors = []
+    stop = threading.Event()
+    prober = threading.Thread(target=probe_health, args=(base_url, stop, health_latencies, health_errors), daemon=True)
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_request, range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    prober.join()
+    return {
+        'requests': total_requests,
+        'errors': len(errors),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'health_p95_ms': round(percentile(health_latencies, 95) * 1000, 1),
+        'health_errors': len(health_errors),
+        'sample_error': errors[0] if errors else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent /scrape throughput against a slow local stub site')
+    parser.add_argument('--worker-class', action='append', dest='worker_classes', choices=WORKER_CLASSES,
+                        help='Serving mode to start and measure (repeatable, default: both)')
+    parser.add_argument('--base-url', help='Measure an already running server instead of starting gunicorn')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the gunicorn servers this starts')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn worker processes')
+    parser.add_argument('--delay', type=float, default=1.0, help='Seconds the stub site takes to answer')
+    parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once')
+    parser.add_argument('--requests', type=int, default=500, help='Total /scrape requests per run')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = []
+    with SlowServer(args.delay) as stub:
+        scraper_id, scraper_config_id = seed_scraper(stub.url)
+        try:
+            if args.base_url:
+                results.append({'server': args.base_url, **run_load(args.base_url, scraper_id, args.concurrency, args.requests)})
+            else:
+                for worker_class in args.worker_classes or WORKER_CLASSES:
+                    process = start_server(worker_class, args.port, args.workers, args.concurrency)
+                    try:
+                        result = run_load(f'http://127.0.0.1:{args.port}', scraper_id, args.concurrency, args.requests)
+                    finally:
+                        stop_server(process)
+                    results.append({'server': worker_class, **result})
+        finally:
+            drop_scraper(scraper_id, scraper_config_id)
+
+    columns = ['server', 'requests', 'errors', 'elapsed_s', 'throughput_rps', 'p50_ms', 'p95_ms', 'health_p95_ms']
+    print(' '.join(f'{column:>14}' for column in columns))
+    for result in results:
+        print(' '.join(f'{str(result[column]):>14}' for column in columns))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'delay': args.delay, 'concurrency': args.concurrency, 'workers': args.workers, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
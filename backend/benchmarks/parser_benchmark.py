@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import argparse
+import statistics
+
+from parsing import PARSER_BACKENDS, parse_trim_input
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+REFERENCE_BACKEND = 'html.parser'
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    with open(os.path.join(fixtures_dir, 'fixtures.json')) as f:
+        fixtures = json.load(f)
+    for fixture in fixtures:
+        with open(os.path.join(fixtures_dir, fixture['file']), encoding='utf-8') as f:
+            fixture['html'] = f.read()
+    return fixtures
+
+
+def time_call(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def benchmark_backend(backend, fixture, repeat):
+    parse_time, root = time_call(lambda: backend.parse(fixture['html']), repeat)
+
+    node = root
+    trim_time = 0.0
+    tag_name, attrs = parse_trim_input(fixture['trim_tag']) if fixture.get('trim_tag') else (None, {})
+    if tag_name:
+        trim_time, node = time_call(lambda: backend.find(root, tag_name, attrs), repeat)
+
+    extract_time, cells = time_call(lambda: backend.extract_text_sequentially(node, fixture['tags']), repeat)
+    nested_time, nested_cells = time_call(
+        lambda: backend.extract_text_sequentially_nested(node, fixture['tag_paths']), repeat
+    )
+
+    timings = {
+        'parse_ms': round(parse_time * 1000, 3),
+        'trim_ms': round(trim_time * 1000, 3),
+        'extract_ms': round(extract_time * 1000, 3),
+        'extract_nested_ms': round(nested_time * 1000, 3),
+        'cells': len(cells),
+        'nested_cells': len(nested_cells)
+    }
+    return timings, (cells, nested_cells)
+
+
+def run(backend_names=None, repeat=5, fixtures_dir=FIXTURES_DIR):
+    backend_names = backend_names or list(PARSER_BACKENDS)
+    results = []
+    for fixture in load_fixtures(fixtures_dir):
+        # Every backend has to extract exactly what html.parser extracts
+        _, reference = benchmark_backend(PARSER_BACKENDS[REFERENCE_BACKEND], fixture, 1)
+        for name in backend_names:
+            if name not in PARSER_BACKENDS:
+                print(f'Skipping {name}: not installed')
+                continue
+            timings, output = benchmark_backend(PARSER_BACKENDS[name], fixture, repeat)
+            results.append({
+                'fixture': fixture['name'],
+                'backend': name,
+                **timings,
+                'matches_reference': output == reference
+            })
+    return results
+
+
+def print_results(results):
+    columns = ['fixture', 'backend', 'parse_ms', 'trim_ms', 'extract_ms', 'extract_nested_ms', 'cells', 'matches_reference']
+    print(' '.join(f'{column:>18}' for column in columns))
+    for result in results:
+        print(' '.join(f'{str(result[column]):>18}' for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare parse and extract time per parser backend')
+    parser.add_argument('--backend', action='append', dest='backends', help='Backend to run (repeatable, default: all installed)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the median is reported')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='Directory containing fixtures.json')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = run(args.backends, args.repeat, args.fixtures)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
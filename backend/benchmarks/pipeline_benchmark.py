@@ -0,0 +1,288 @@
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import threading
+import tracemalloc
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import metrics
+import scraper_routes
+from application import app
+from fetch import page_cache
+from parsing import document_cache, prettify_cache, PARSER_BACKEND
+from loader import definition_cache
+from benchmarks.parser_benchmark import FIXTURES_DIR, load_fixtures
+
+ENDPOINTS = ('scrape', 'raw_scrape', 'raw_list_tags')
+# Latency and memory may grow by this fraction over the baseline before --compare fails
+DEFAULT_MAX_REGRESSION = 0.2
+
+
+class FixtureServer:
+    def __init__(self, fixtures):
+        pages = {f'/{fixture["name"]}': fixture['html'].encode('utf-8') for fixture in fixtures}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = pages.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, name):
+        return f'http://127.0.0.1:{self._server.server_port}/{name}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _Samples(list):
+    def observe(self, value):
+        self.append(value)
+
+
+# Stands in for the stage histogram so every stage timing is kept, not just bucketed
+class StageRecorder:
+    def __init__(self):
+        self.samples = {}
+
+    def labels(self, stage):
+        return self.samples.setdefault(stage, _Samples())
+
+
+# Scraper definitions are seeded into the in-memory cache, so no database is needed
+def seed_definition(scraper_id, fixture, url, backend_name):
+    definition = {
+        'scraper_id': scraper_id,
+        'scraper_name': fixture['name'],
+        'scraping_url': url,
+        'scraper_config_id': scraper_id,
+        'parser_backend': backend_name,
+        'config': {
+            'scraper_config_id': scraper_id,
+            'trim_input': fixture.get('trim_tag'),
+            'group_row_count': fixture.get('group_row_count'),
+            'last_updated_on': 'benchmark'
+        },
+        'tags': [{'tag': f'<{tag}>'} for tag in fixture['tags']],
+        'row_labels': [{'row_label': label} for label in fixture.get('row_labels', [])]
+    }
+    definition_cache.put(definition, definition_cache.generation_for(scraper_id))
+
+
+def endpoint_path(endpoint, scraper_id, fixture):
+    if endpoint == 'scrape':
+        return f'/scrape/{scraper_id}'
+    if endpoint == 'raw_scrape':
+        params = {
+            'output_format': 'json',
+            'trim_tag': fixture.get('trim_tag') or '',
+            'group_row_count': fixture.get('group_row_count') or '',
+            'tags': fixture['tag_paths'],
+            'row_labels': fixture.get('row_labels', [])
+        }
+        return f'/raw/{scraper_id}?{urlencode(params, doseq=True)}'
+    return f'/raw/{scraper_id}/tags?{urlencode({"trim_tag": fixture.get("trim_tag") or ""})}'
+
+
+def clear_caches():
+    page_cache.clear()
+    document_cache.clear()
+    prettify_cache.clear()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(timings):
+    return {
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3)
+    }
+
+
+def request(client, path):
+    response = client.get(path)
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response
+
+
+def benchmark_endpoint(client, path, repeat, warm):
+    # The first request pays for imports and plan compilation; it is not measured
+    request(client, path)
+
+    recorder = StageRecorder()
+    timings = []
+    response_bytes = 0
+    histogram, metrics.STAGE_SECONDS = metrics.STAGE_SECONDS, recorder
+    try:
+        for _ in range(repeat):
+            if not warm:
+                clear_caches()
+            start = time.perf_counter()
+            response = request(client, path)
+            timings.append(time.perf_counter() - start)
+            response_bytes = len(response.get_data())
+    finally:
+        metrics.STAGE_SECONDS = histogram
+
+    # Memory is traced in a separate pass since tracing slows every allocation
+    if not warm:
+        clear_caches()
+    tracemalloc.start()
+    try:
+        request(client, path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': repeat,
+        **summarize(timings),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'throughput_rps': round(len(timings) / sum(timings), 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'response_bytes': response_bytes,
+        'stages': {stage: {'count': len(samples), **summarize(samples)} for stage, samples in recorder.samples.items()}
+    }
+
+
+def run(backend_names=None, endpoints=ENDPOINTS, fixture_names=None, repeat=20, warm=False, fixtures_dir=FIXTURES_DIR,
+        parse_pool=False):
+    backend_names = backend_names or [PARSER_BACKEND]
+    fixtures = [fixture for fixture in load_fixtures(fixtures_dir) if not fixture_names or fixture['name'] in fixture_names]
+    # Without these the benchmark would hit the cache TTL on long runs, or store results, and reach for the database
+    definition_cache.ttl = float('inf')
+    scraper_routes.store_scrape_results = lambda *args: None
+    # In the pool, parse, trim and memory happen in other processes and drop out of the stage and peak numbers; the
+    # default measures the in-process path whatever PARSE_POOL_OFFLOAD is set to
+    scraper_routes.PARSE_POOL_OFFLOAD = parse_pool
+
+    results = []
+    client = app.test_client()
+    with FixtureServer(fixtures) as server:
+        scraper_id = 0
+        for fixture in fixtures:
+            for backend_name in backend_names:
+                scraper_id += 1
+                seed_definition(scraper_id, fixture, server.url(fixture['name']), backend_name)
+                for endpoint in endpoints:
+                    path = endpoint_path(endpoint, scraper_id, fixture)
+                    results.append({
+                        'fixture': fixture['name'],
+                        'endpoint': endpoint,
+                        'backend': backend_name,
+                        **benchmark_endpoint(client, path, repeat, warm)
+                    })
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'warm': warm,
+            'parse_pool': parse_pool
+        },
+        'results': results
+    }
+
+
+def result_key(result):
+    return result['fixture'], result['endpoint'], result['backend']
+
+
+# Returns the regressions beyond max_regression; latency is compared at p50 since p95 is noisy on short runs
+def compare(baseline, current, max_regression=DEFAULT_MAX_REGRESSION):
+    previous = {result_key(result): result for result in baseline['results']}
+    rows = []
+    regressions = []
+    for result in current['results']:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        row = {'fixture': result['fixture'], 'endpoint': result['endpoint'], 'backend': result['backend']}
+        for field in ('p50_ms', 'p95_ms', 'peak_memory_kb'):
+            change = (result[field] - before[field]) / before[field] if before[field] else 0.0
+            row[field] = f'{before[field]} -> {result[field]} ({change:+.0%})'
+            if field != 'p95_ms' and change > max_regression:
+                regressions.append(f'{"/".join(result_key(result))} {field}: {change:+.0%}')
+        rows.append(row)
+    return rows, regressions
+
+
+def print_table(rows, columns):
+    print(' '.join(f'{column:>16}' for column in columns))
+    for row in rows:
+        print(' '.join(f'{str(row[column]):>16}' for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure scrape, raw and tag-listing latency on the fixture pages')
+    parser.add_argument('--backend', action='append', dest='backends', help='Backend to run (repeatable, default: PARSER_BACKEND)')
+    parser.add_argument('--endpoint', action='append', dest='endpoints', choices=ENDPOINTS, help='Endpoint to run (repeatable, default: all)')
+    parser.add_argument('--fixture', action='append', dest='fixtures', help='Fixture to run (repeatable, default: all)')
+    parser.add_argument('--repeat', type=int, default=20, help='Measured requests per endpoint and fixture')
+    parser.add_argument('--warm', action='store_true', help='Keep page and document caches between requests')
+    parser.add_argument('--parse-pool', action='store_true',
+                        help='Parse /scrape and /raw pages in the process pool; stages and peak memory then cover only this process')
+    parser.add_argument('--fixtures-dir', default=FIXTURES_DIR, help='Directory containing fixtures.json')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run; exits non-zero on regressions')
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                        help='Allowed p50 latency and peak memory growth over the baseline, as a fraction')
+    args = parser.parse_args()
+
+    # Per-request INFO logging would dominate the small fixtures
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = run(args.backends, args.endpoints or ENDPOINTS, args.fixtures, args.repeat, args.warm, args.fixtures_dir, args.parse_pool)
+    print_table(report['results'], ['fixture', 'endpoint', 'backend', 'p50_ms', 'p95_ms', 'throughput_rps', 'peak_memory_kb'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('parse_pool', False) != args.parse_pool:
+            print('Warning: baseline and this run parse pages differently (--parse-pool); stage and memory numbers are not comparable')
+        rows, regressions = compare(baseline, report, args.max_regression)
+        print()
+        print_table(rows, ['fixture', 'endpoint', 'backend', 'p50_ms', 'p95_ms', 'peak_memory_kb'])
+        if regressions:
+            print()
+            print('Regressions over baseline:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
 import os
 import json
+import time
+import logging
+import threading
 import boto3
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import ThreadedConnectionPool
 from flask import g
 
 # Use environment variables for RDS connection
@@ -12,6 +17,16 @@ RDS_DBNAME = os.environ.get('RDS_DBNAME')
 RDS_USER = os.environ.get('RDS_USER')
 RDS_SECRET_ARN = os.environ.get('RDS_SECRET_ARN')
 
+# Connection pool sizing; each gunicorn worker process gets its own pool
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+# Retry-After seconds sent with the 503 when no connection frees up in time
+DB_POOL_RETRY_AFTER = int(os.environ.get('DB_POOL_RETRY_AFTER', 1))
+
 
 # Function to get secret from AWS Secrets Manager
 
@@ -31,70 +46,202 @@ def get_secret():
 RDS_PASSWORD = get_secret()
 
 
+def connect():
+    return psycopg2.connect(
+        host=RDS_HOST,
+        port=RDS_PORT,
+        dbname=RDS_DBNAME,
+        user=RDS_USER,
+        password=RDS_PASSWORD,
+        cursor_factory=RealDictCursor
+    )
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Wraps a pooled connection so the routes' conn.close() hands it back instead of closing it
+class PooledConnection:
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError('connection already returned to the pool')
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self):
+        return self._conn is None or bool(self._conn.closed)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.in_use = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    # Created on first use so it is opened inside the gunicorn worker, not the master
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                logging.info(f'Opening database pool (min={self.minconn}, max={self.maxconn})')
+                self._pool = ThreadedConnectionPool(
+                    self.minconn,
+                    self.maxconn,
+                    host=RDS_HOST,
+                    port=RDS_PORT,
+                    dbname=RDS_DBNAME,
+                    user=RDS_USER,
+                    password=RDS_PASSWORD,
+                    cursor_factory=RealDictCursor
+                )
+            return self._pool
+
+    def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, pool, conn):
+        self._last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+        with self._lock:
+            self.discarded += 1
+
+    def _healthy_connection(self):
+        pool = self._get_pool()
+        # Every pooled connection may have gone stale, plus one fresh attempt
+        for _ in range(self.maxconn + 1):
+            conn = pool.getconn()
+            if self._is_alive(conn):
+                return conn
+            logging.warning('Discarding dead database connection')
+            self._discard(pool, conn)
+        raise psycopg2.OperationalError('Could not get a healthy database connection')
+
+    def checkout(self):
+        start = time.perf_counter()
+        # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f'No database connection available within {self.timeout}s')
+        try:
+            conn = self._healthy_connection()
+        except Exception:
+            self._slots.release()
+            raise
+
+        wait = time.perf_counter() - start
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        pool = self._get_pool()
+        try:
+            # Never hand the next request a connection with an open transaction
+            if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self._last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=bool(conn.closed))
+        except psycopg2.Error:
+            self._discard(pool, conn)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            'min_size': self.minconn,
+            'max_size': self.maxconn,
+            'in_use': self.in_use,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'discarded': self.discarded,
+            'avg_checkout_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            'max_checkout_ms': round(self.max_wait * 1000, 3)
+        }
+
+    def closeall(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._last_used.clear()
+
+
+db_pool = ConnectionPool()
+
+
 def get_db_connection():
     db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = psycopg2.connect(
-            host=RDS_HOST,
-            port=RDS_PORT,
-            dbname=RDS_DBNAME,
-            user=RDS_USER,
-            password=RDS_PASSWORD,
-            cursor_factory=RealDictCursor
-        )
+    if db is None or db.closed:
+        db = g._database = db_pool.checkout()
     return db
 
 
 def close_connection(exception):
-    db = getattr(g, '_database', None)
+    db = g.pop('_database', None)
     if db is not None:
         db.close()
 
 
+# Brings the schema up to date in place; existing data is kept
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Drop existing tables
-    cursor.execute('DROP TABLE IF EXISTS scrapers')
-    cursor.execute('DROP TABLE IF EXISTS scraper_config')
-    cursor.execute('DROP TABLE IF EXISTS scraper_config_row_labels')
-    cursor.execute('DROP TABLE IF EXISTS scraper_config_tags')
-
-    # Recreate tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scrapers (
-            scraper_id SERIAL PRIMARY KEY,
-            scraper_name TEXT NOT NULL,
-            scraping_url TEXT NOT NULL,
-            scraper_config_id INTEGER NOT NULL,
-            created_on TIMESTAMP NOT NULL,
-            last_scraped_on TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scraper_config (
-            scraper_config_id SERIAL PRIMARY KEY,
-            config_name TEXT NOT NULL,
-            created_on TIMESTAMP NOT NULL
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scraper_config_row_labels (
-            row_label_id SERIAL PRIMARY KEY,
-            scraper_config_id INTEGER NOT NULL,
-            label TEXT NOT NULL
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scraper_config_tags (
-            tag_id SERIAL PRIMARY KEY,
-            scraper_config_id INTEGER NOT NULL,
-            tag TEXT NOT NULL
-        )
-    ''')
-
-    conn.commit()
+    from migrations import migrate
+
+    conn = connect()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+
+# Drops every table and rebuilds the schema from scratch; all data is lost
+def reset_db():
+    from migrations import migrate
+
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        for table in ('scrape_results', 'scrape_jobs', 'scraper_config_tags', 'scraper_config_row_labels',
+                      'scrapers', 'scraper_config', 'schema_migrations'):
+            cursor.execute(f'DROP TABLE IF EXISTS {table} CASCADE')
+        conn.commit()
+        migrate(conn)
+    finally:
+        conn.close()
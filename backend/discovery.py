@@ -0,0 +1,68 @@
+import os
+
+# Budgets for tag discovery; requests may lower them but not exceed them
+TAG_DISCOVERY_MAX_DEPTH = int(os.environ.get('TAG_DISCOVERY_MAX_DEPTH', 64))
+TAG_DISCOVERY_MAX_NODES = int(os.environ.get('TAG_DISCOVERY_MAX_NODES', 50000))
+TAG_DISCOVERY_EXAMPLE_CHARS = int(os.environ.get('TAG_DISCOVERY_EXAMPLE_CHARS', 200))
+
+
+# Iterative walk; each distinct path gets an integer id and its string is built once
+def discover_tags(backend, root, max_depth=TAG_DISCOVERY_MAX_DEPTH, max_nodes=TAG_DISCOVERY_MAX_NODES,
+                  example_chars=TAG_DISCOVERY_EXAMPLE_CHARS, order='document'):
+    path_ids = {}
+    paths = []
+    counts = []
+    examples = []
+
+    def visit(parent_id, element):
+        key = (parent_id, backend.tag_name(element))
+        path_id = path_ids.get(key)
+        if path_id is None:
+            path_id = path_ids[key] = len(paths)
+            prefix = paths[parent_id] if parent_id is not None else ''
+            paths.append(f'{prefix}<{key[1]}>')
+            counts.append(0)
+            examples.append('')
+        counts[path_id] += 1
+        # Keep trying later elements of the path until one has text
+        if not examples[path_id]:
+            examples[path_id] = backend.text_prefix(element, example_chars)
+        return path_id
+
+    # ancestors[d] is the path id of the element currently open at depth d
+    ancestors = [visit(None, root)]
+    visited = 1
+    truncated = False
+    # Depth counts levels below the root, so the root's children are at depth 1
+    for element, depth in backend.walk(root, max_depth=max_depth):
+        if visited >= max_nodes:
+            truncated = True
+            break
+        del ancestors[depth:]
+        ancestors.append(visit(ancestors[depth - 1], element))
+        visited += 1
+        # The walk does not descend past max_depth; report it if anything was left below
+        if depth == max_depth and not truncated:
+            truncated = next(iter(backend.children(element)), None) is not None
+
+    tags = [
+        {'tag': path, 'count': count, 'example_output': example}
+        for path, count, example in zip(paths, counts, examples)
+    ]
+    if order == 'frequency':
+        # Stable sort keeps document order among equally common paths
+        tags.sort(key=lambda tag: -tag['count'])
+    return {'tags': tags, 'nodes_visited': visited, 'truncated': truncated}
+
+
+# Reads order and budgets from request args; callers can tighten the budgets but not raise them
+def discovery_args(args):
+    order = args.get('order', 'document')
+    if order not in ('document', 'frequency'):
+        raise ValueError('order must be document or frequency')
+    return {
+        'max_depth': min(max(args.get('max_depth', TAG_DISCOVERY_MAX_DEPTH, type=int), 1), TAG_DISCOVERY_MAX_DEPTH),
+        'max_nodes': min(max(args.get('max_nodes', TAG_DISCOVERY_MAX_NODES, type=int), 1), TAG_DISCOVERY_MAX_NODES),
+        'example_chars': min(max(args.get('example_chars', TAG_DISCOVERY_EXAMPLE_CHARS, type=int), 0), TAG_DISCOVERY_EXAMPLE_CHARS),
+        'order': order
+    }
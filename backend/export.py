@@ -0,0 +1,72 @@
+import io
+import csv
+from itertools import chain
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = ('json', 'csv', 'arrow', 'parquet')
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def export_format(args):
+    file_format = args.get('format', 'json')
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f'format must be one of {list(EXPORT_FORMATS)}')
+    if file_format != 'json' and args.get('stream') == 'ndjson':
+        raise ValueError('format cannot be combined with stream=ndjson')
+    if file_format in ('arrow', 'parquet') and pyarrow is None:
+        raise ExportUnavailable(f'{file_format} export needs pyarrow, which is not installed')
+    return file_format
+
+
+# Stored results come back as row dicts; columns follow the order labels first appear in
+def rows_to_columns(rows):
+    labels = dict.fromkeys(chain.from_iterable(rows))
+    return {label: [row.get(label) for row in rows] for label in labels}
+
+
+def _csv(columns):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    writer.writerows(zip(*columns.values()))
+    return out.getvalue().encode('utf-8')
+
+
+def _table(columns):
+    return pyarrow.table({label: pyarrow.array(values, type=pyarrow.string()) for label, values in columns.items()})
+
+
+def _arrow(columns):
+    table = _table(columns)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _parquet(columns):
+    sink = pyarrow.BufferOutputStream()
+    pyarrow.parquet.write_table(_table(columns), sink)
+    return sink.getvalue().to_pybytes()
+
+
+EXPORTERS = {'csv': _csv, 'arrow': _arrow, 'parquet': _parquet}
+
+
+# Returns a body and headers that can be shared between coalesced callers
+def export_columns(columns, file_format):
+    return EXPORTERS[file_format](columns), {'Content-Type': EXPORT_MIMETYPES[file_format]}
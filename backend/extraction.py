@@ -0,0 +1,188 @@
+import threading
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
+
+
+class _TrieNode:
+    __slots__ = ('children',)
+
+    def __init__(self):
+        self.children = {}
+
+
+class ExtractionPlan:
+    def __init__(self, tags, row_labels, trim_tag, group_row_count, nested=False, version=None):
+        self.tags = list(tags)
+        self.row_labels = list(row_labels)
+        self.trim_tag = trim_tag
+        self.group_row_count = group_row_count
+        self.nested = nested
+        self.version = version
+
+        self.tag_names = frozenset(self.tags)
+        self.tag_paths = [tag.strip('<>').split('><') for tag in self.tags]
+        # Empty path segments mean "any tag" to find_all(); leave those to the backend
+        self.single_walk = all(all(path) for path in self.tag_paths)
+        self._tries = {}
+
+        if self.row_labels:
+            self.effective_row_labels = self.row_labels
+        elif nested:
+            self.effective_row_labels = self.tags
+        else:
+            # Generate keys from last tag name in each tag path
+            self.effective_row_labels = [path[-1] for path in self.tag_paths]
+
+    def _trie(self, root_name):
+        compiled = self._tries.get(root_name)
+        if compiled is None:
+            root = _TrieNode()
+            terminals = []
+            for path in self.tag_paths:
+                # A path starting with the root's own tag skips that level
+                if path and path[0] == root_name:
+                    path = path[1:]
+                node = root
+                for tag in path:
+                    node = node.children.setdefault(tag, _TrieNode())
+                terminals.append(node)
+            compiled = self._tries[root_name] = (root, terminals)
+        return compiled
+
+    def find_nested(self, backend, root):
+        trie, terminals = self._trie(backend.tag_name(root))
+        matches = {id(node): [] for node in terminals}
+
+        # created[d] holds the partial matches opened by the ancestor at depth d + 1
+        initial = [(trie, ())]
+        created = []
+        for index, (element, depth) in enumerate(backend.walk(root)):
+            del created[depth - 1:]
+            name = backend.tag_name(element)
+            opened = []
+            for frame in chain((initial,), created):
+                for node, key in frame:
+                    child = node.children.get(name)
+                    if child is None:
+                        continue
+                    child_key = key + (index,)
+                    if id(child) in matches:
+                        matches[id(child)].append((child_key, element))
+                    if child.children:
+                        opened.append((child, child_key))
+            created.append(opened)
+
+        # Order matches the level-by-level find_all() walk: by first element, then second, ...
+        results = []
+        for terminal in terminals:
+            if terminal is trie:
+                results.append([root])
+            else:
+                results.append([element for _, element in sorted(matches[id(terminal)], key=itemgetter(0))])
+        return results
+
+    def iter_cells(self, backend, root):
+        if not self.nested:
+            yield from backend.iter_text_sequentially(root, self.tag_names)
+            return
+        if not self.single_walk:
+            yield from backend.extract_text_sequentially_nested(root, self.tags)
+            return
+
+        for elements in self.find_nested(backend, root):
+            for element in elements:
+                text = backend.text(element)
+                if text:
+                    yield text
+
+    def extract(self, backend, root):
+        return list(self.iter_cells(backend, root))
+
+    def _row_size(self, cells):
+        group_row_count = self.group_row_count
+        if not group_row_count or group_row_count <= 0:
+            if self.row_labels:
+                group_row_count = len(self.row_labels)
+            else:
+                # Without labels or a row size everything lands in one row, so the cells are needed up front
+                cells = list(cells)
+                group_row_count = len(cells) or 1
+        return group_row_count, cells
+
+    def iter_rows(self, cells):
+        group_row_count, cells = self._row_size(cells)
+        labels = self.effective_row_labels
+        group = []
+        for cell in cells:
+            group.append(cell)
+            if len(group) == group_row_count:
+                yield {labels[j]: group[j] for j in range(min(len(labels), len(group)))}
+                group = []
+
+        # Previews only show complete rows; scrapes keep the trailing partial row
+        if group and not self.nested:
+            yield {labels[j]: group[j] for j in range(min(len(labels), len(group)))}
+
+    def group(self, cells):
+        return list(self.iter_rows(cells))
+
+    # The rows iter_rows() would build, written column by column; missing trailing cells are None
+    def columns(self, cells):
+        group_row_count, cells = self._row_size(cells)
+        labels = self.effective_row_labels[:group_row_count]
+        # A repeated label keeps the last cell for it, as it does as a dict key
+        slots = {label: j for j, label in enumerate(labels)}
+        buffers = [(j, []) for j in slots.values()]
+
+        group = []
+        for cell in cells:
+            group.append(cell)
+            if len(group) == group_row_count:
+                for j, buffer in buffers:
+                    buffer.append(group[j])
+                group = []
+
+        if group and not self.nested:
+            row = {labels[j]: group[j] for j in range(min(len(labels), len(group)))}
+            for label, (_, buffer) in zip(slots, buffers):
+                buffer.append(row.get(label))
+        return {label: buffer for label, (_, buffer) in zip(slots, buffers)}
+
+
+class PlanCache:
+    def __init__(self):
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def get(self, scraper_config_id, version):
+        with self._lock:
+            plan = self._plans.get(scraper_config_id)
+        if plan is not None and plan.version == version:
+            return plan
+        return None
+
+    def put(self, scraper_config_id, plan):
+        with self._lock:
+            self._plans[scraper_config_id] = plan
+
+    def invalidate(self, scraper_config_id):
+        with self._lock:
+            self._plans.pop(scraper_config_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+plan_cache = PlanCache()
+
+
+def compile_plan(tags, row_labels, trim_tag, group_row_count, version=None):
+    # Stored configs hold tags with their angle brackets
+    return ExtractionPlan([tag.strip('<>') for tag in tags], row_labels, trim_tag, group_row_count, version=version)
+
+
+@lru_cache(maxsize=256)
+def compile_preview_plan(tags, row_labels, trim_tag, group_row_count):
+    return ExtractionPlan(tags, row_labels, trim_tag, group_row_count, nested=True)
@@ -0,0 +1,259 @@
+import os
+import time
+import logging
+import hashlib
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import SizedLRUCache
+from metrics import stage_timer, record_fetch_error
+
+# Page cache sizing, overridable per environment
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+PAGE_CACHE_DEFAULT_TTL = int(os.environ.get('PAGE_CACHE_DEFAULT_TTL', 300))
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 64 * 1024))
+
+# Outbound connection pooling, timeouts and retries
+FETCH_CONNECT_TIMEOUT = float(os.environ.get('FETCH_CONNECT_TIMEOUT', 5))
+FETCH_READ_TIMEOUT = float(os.environ.get('FETCH_READ_TIMEOUT', 30))
+FETCH_MAX_HOSTS = int(os.environ.get('FETCH_MAX_HOSTS', 100))
+FETCH_MAX_CONNECTIONS_PER_HOST = int(os.environ.get('FETCH_MAX_CONNECTIONS_PER_HOST', 4))
+# Seconds a fetch waits for a free connection to its host before failing, so one slow site can't hold every request thread
+FETCH_POOL_TIMEOUT = float(os.environ.get('FETCH_POOL_TIMEOUT', 5))
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', 2))
+FETCH_BACKOFF_FACTOR = float(os.environ.get('FETCH_BACKOFF_FACTOR', 0.5))
+FETCH_USER_AGENT = os.environ.get('FETCH_USER_AGENT', 'web-scraping-api')
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def build_session():
+    retry = Retry(
+        total=FETCH_RETRIES,
+        connect=FETCH_RETRIES,
+        # A site that is slow to answer stays slow; retrying reads would only multiply the stall
+        read=False,
+        status=FETCH_RETRIES,
+        backoff_factor=FETCH_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        # Hand the last response back so raise_for_status() reports the real status
+        raise_on_status=False
+    )
+    # One keep-alive pool per host; host_connection() keeps callers from queueing on pool_block without a limit
+    adapter = HTTPAdapter(
+        pool_connections=FETCH_MAX_HOSTS,
+        pool_maxsize=FETCH_MAX_CONNECTIONS_PER_HOST,
+        pool_block=True,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = FETCH_USER_AGENT
+    return session
+
+
+http_session = build_session()
+
+
+class HostBusy(requests.Timeout):
+    metric_reason = 'host_busy'
+
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+
+# Holds one of the host's connections for the duration of the block
+@contextmanager
+def host_connection(url):
+    host = urlsplit(url).netloc.lower()
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = _host_semaphores[host] = threading.BoundedSemaphore(FETCH_MAX_CONNECTIONS_PER_HOST)
+    if not semaphore.acquire(timeout=FETCH_POOL_TIMEOUT):
+        raise HostBusy(f'No free connection to {host} within {FETCH_POOL_TIMEOUT}s')
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def http_get(url, **kwargs):
+    kwargs.setdefault('timeout', (FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT))
+    return http_session.get(url, **kwargs)
+
+
+class CachedPage:
+    def __init__(self, url, content, encoding, etag=None, last_modified=None, ttl=0):
+        self.url = url
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time()
+        self.expires_at = self.fetched_at + max(ttl, 0)
+        self._content_hash = None
+
+    @property
+    def text(self):
+        # Same decoding rules as requests.Response.text
+        try:
+            return str(self.content, self.encoding, errors='replace')
+        except LookupError:
+            return str(self.content, errors='replace')
+
+    @property
+    def content_hash(self):
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.content).hexdigest()
+        return self._content_hash
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def is_fresh(self):
+        return time.time() < self.expires_at
+
+    def refresh(self, ttl):
+        self.fetched_at = time.time()
+        self.expires_at = self.fetched_at + max(ttl, 0)
+
+
+# Returned by fetch_page when the origin confirms the caller's stored validators with a 304
+NOT_MODIFIED = object()
+
+
+class PageCache:
+    def __init__(self, max_bytes=PAGE_CACHE_MAX_BYTES, default_ttl=PAGE_CACHE_DEFAULT_TTL):
+        self.default_ttl = default_ttl
+        self._pages = SizedLRUCache(max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+
+    def get(self, url):
+        return self._pages.get(url)
+
+    def put(self, page):
+        self._pages.put(page.url, page, page.size)
+
+    def remove(self, url):
+        self._pages.remove(url)
+
+    def clear(self):
+        self._pages.clear()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        return {
+            'entries': len(self._pages),
+            'bytes': self._pages.bytes,
+            'max_bytes': self._pages.max_bytes,
+            'default_ttl': self.default_ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'not_modified': self.not_modified,
+            'evictions': self._pages.evictions
+        }
+
+    def fetch(self, url, ttl=None, etag=None, last_modified=None):
+        if ttl is None:
+            ttl = self.default_ttl
+
+        cached = self.get(url)
+        if cached is not None and cached.is_fresh():
+            self._count('hits')
+            return cached
+
+        # Stale entry: ask the origin whether our copy is still good
+        # Without a local copy, the caller's validators from its last run can still save the download
+        if cached is not None:
+            etag, last_modified = cached.etag, cached.last_modified
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        with host_connection(url):
+            response = http_get(url, headers=headers)
+        if headers and response.status_code == 304:
+            if cached is None:
+                self._count('not_modified')
+                return NOT_MODIFIED
+            logging.info(f'Revalidated cached page for {url}')
+            cached.refresh(ttl)
+            self._count('revalidations')
+            return cached
+
+        response.raise_for_status()
+        self._count('misses')
+
+        page = CachedPage(
+            url,
+            response.content,
+            response.encoding or response.apparent_encoding,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            ttl=ttl
+        )
+        # Keep zero-TTL pages only when they can be revalidated cheaply
+        if ttl > 0 or page.etag or page.last_modified:
+            self.put(page)
+        else:
+            self.remove(url)
+        return page
+
+
+page_cache = PageCache()
+
+
+def fetch_page(url, ttl=None, etag=None, last_modified=None):
+    try:
+        with stage_timer('fetch'):
+            return page_cache.fetch(url, ttl=ttl, etag=etag, last_modified=last_modified)
+    except requests.RequestException as e:
+        record_fetch_error(url, e)
+        raise
+
+
+# Decoded body chunks for incremental parsing; bypasses the page cache
+@contextmanager
+def stream_page(url, chunk_size=STREAM_CHUNK_SIZE):
+    # The connection stays checked out until the body is closed
+    try:
+        with host_connection(url):
+            try:
+                response = http_get(url, stream=True)
+            except requests.RequestException as e:
+                record_fetch_error(url, e)
+                raise
+            try:
+                response.raise_for_status()
+                if response.encoding is None:
+                    response.encoding = 'utf-8'
+                yield response.iter_content(chunk_size=chunk_size, decode_unicode=True)
+            except requests.RequestException as e:
+                # Read timeouts and dropped connections surface while the body is being consumed
+                record_fetch_error(url, e)
+                raise
+            finally:
+                response.close()
+    except HostBusy as e:
+        record_fetch_error(url, e)
+        raise
@@ -0,0 +1,29 @@
+import os
+
+# 'gthread' holds a thread for every in-flight request; 'gevent' yields while fetches and queries wait
+WEB_WORKER_CLASS = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+worker_class = WEB_WORKER_CLASS
+workers = int(os.environ.get('WEB_WORKERS', 3))
+threads = int(os.environ.get('WEB_THREADS', 8))
+# Concurrent requests per gevent worker; parsing still runs one request at a time per worker
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', 1000))
+timeout = 120
+loglevel = 'debug'
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    if WEB_WORKER_CLASS == 'gevent':
+        # psycopg2 waits on its socket in C and would block every greenlet in the worker without this
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Without this a dead worker's live gauges stay in the shared metrics directory forever
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
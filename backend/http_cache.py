@@ -0,0 +1,74 @@
+import os
+import gzip
+import hashlib
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this go out uncompressed; the framing overhead isn't worth it
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+# Brotli's top qualities are far too slow to run per response
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/csv',
+    'application/vnd.apache.arrow.stream'
+)
+CONTENT_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def make_etag(*parts):
+    return hashlib.sha256(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+
+
+def etag_header(etag):
+    return {'ETag': f'"{etag}"'} if etag else {}
+
+
+# Compressed responses carry the encoding as an ETag suffix, so those tags also match
+def not_modified(etag):
+    if_none_match = request.if_none_match
+    return if_none_match.contains(etag) or any(
+        if_none_match.contains(f'{etag}-{encoding}') for encoding in CONTENT_ENCODINGS
+    )
+
+
+def not_modified_response(etag):
+    return '', 304, etag_header(etag)
+
+
+# For responses with no cheaper version to key on, the body itself is the validator
+def conditional(response, etag=None):
+    etag = etag or hashlib.sha256(response.get_data()).hexdigest()[:32]
+    if not_modified(etag):
+        response = Response(status=304)
+    response.headers.update(etag_header(etag))
+    return response
+
+
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(CONTENT_ENCODINGS)
+    if encoding is None or response.calculate_content_length() < COMPRESS_MIN_BYTES:
+        return response
+
+    data = response.get_data()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+
+    # A strong ETag names exact bytes, so each encoding gets its own
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
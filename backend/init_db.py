@@ -1,6 +1,4 @@
-from app import app
 from db import init_db
 
-with app.app_context():
-    init_db()
-    print("Database initialized.")
+init_db()
+print("Database initialized.")
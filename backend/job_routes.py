@@ -0,0 +1,89 @@
+from flask import Blueprint, request, jsonify
+from db import get_db_connection
+from http_cache import conditional
+from listing import ListArgsError, parse_int_arg, LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT
+from scheduler import enqueue_job, QueueFull, JOB_STATUSES, SCHEDULER_POLL_INTERVAL
+
+bp = Blueprint('job_routes', __name__)
+
+
+@bp.route('/scrapers/<int:scraper_id>/jobs', methods=['POST'])
+def create_job(scraper_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT scraper_id FROM scrapers WHERE scraper_id = %s', (scraper_id,))
+    if cursor.fetchone() is None:
+        conn.close()
+        return jsonify({'error': 'Scraper not found'}), 404
+
+    try:
+        job = enqueue_job(cursor, scraper_id)
+    except QueueFull:
+        conn.close()
+        response = jsonify({'error': 'Job queue is full, try again later'})
+        response.headers['Retry-After'] = str(int(SCHEDULER_POLL_INTERVAL) or 1)
+        return response, 429
+    conn.commit()
+    conn.close()
+
+    return jsonify(dict(job)), 202
+
+
+@bp.route('/jobs', methods=['GET'])
+def get_jobs():
+    status = request.args.get('status')
+    try:
+        scraper_id = parse_int_arg(request.args, 'scraper_id')
+        limit = parse_int_arg(request.args, 'limit') or LIST_DEFAULT_LIMIT
+    except ListArgsError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    limit = min(limit, LIST_MAX_LIMIT)
+
+    if status and status not in JOB_STATUSES:
+        return jsonify({'error': f'status must be one of {list(JOB_STATUSES)}'}), 400
+
+    conditions = []
+    params = []
+    if status:
+        conditions.append('status = %s')
+        params.append(status)
+    if scraper_id is not None:
+        conditions.append('scraper_id = %s')
+        params.append(scraper_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT * FROM scrape_jobs {where} ORDER BY job_id DESC LIMIT %s', (*params, limit))
+    jobs = cursor.fetchall()
+    conn.close()
+
+    return conditional(jsonify([dict(job) for job in jobs]))
+
+
+@bp.route('/jobs/stats', methods=['GET'])
+def get_job_stats():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT status, COUNT(*) AS count FROM scrape_jobs GROUP BY status')
+    counts = {row['status']: row['count'] for row in cursor.fetchall()}
+    conn.close()
+
+    return jsonify({status: counts.get(status, 0) for status in JOB_STATUSES})
+
+
+@bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM scrape_jobs WHERE job_id = %s', (job_id,))
+    job = cursor.fetchone()
+    conn.close()
+
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(dict(job))
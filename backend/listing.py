@@ -0,0 +1,68 @@
+import os
+from datetime import datetime
+
+from flask import jsonify
+
+from http_cache import conditional
+
+# Page size for list endpoints; clients page with after_id using the X-Next-After-Id header
+LIST_DEFAULT_LIMIT = int(os.environ.get('LIST_DEFAULT_LIMIT', 100))
+LIST_MAX_LIMIT = int(os.environ.get('LIST_MAX_LIMIT', 1000))
+
+
+class ListArgsError(Exception):
+    pass
+
+
+def parse_int_arg(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ListArgsError(f'{name} must be an integer')
+
+
+def parse_datetime_arg(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ListArgsError(f'{name} must be an ISO 8601 timestamp')
+
+
+# Substring pattern for ILIKE ... ESCAPE '\', so %, _ and \ in user input match literally
+def contains_pattern(value):
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+# Returns (after_id, limit, columns); columns always include the key so the next cursor can be built
+def parse_list_args(args, id_column, allowed_fields):
+    after_id = parse_int_arg(args, 'after_id')
+    limit = parse_int_arg(args, 'limit') or LIST_DEFAULT_LIMIT
+    if limit < 1:
+        raise ListArgsError('limit must be positive')
+    limit = min(limit, LIST_MAX_LIMIT)
+
+    columns = list(allowed_fields)
+    fields = args.get('fields')
+    if fields:
+        columns = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in columns if field not in allowed_fields]
+        if unknown:
+            raise ListArgsError(f'Unknown fields: {unknown}')
+        if id_column not in columns:
+            columns.insert(0, id_column)
+    return after_id, limit, columns
+
+
+# rows holds up to limit + 1 records; the extra one only signals that another page exists
+def list_response(rows, limit, id_column):
+    response = jsonify([dict(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        response.headers['X-Next-After-Id'] = str(rows[limit - 1][id_column])
+    return conditional(response)
@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+
+from db import get_db_connection
+from extraction import plan_cache, compile_plan
+from metrics import stage_timer
+from singleflight import flights
+
+# Upper bound on how long another worker's edits can go unseen; local edits invalidate immediately
+SCRAPER_CACHE_TTL = float(os.environ.get('SCRAPER_CACHE_TTL', 30))
+
+# The whole scraper definition (scraper, config, tags, row labels) in one round-trip
+SCRAPER_DEFINITION_QUERY = '''
+    SELECT s.*,
+        row_to_json(c) AS config,
+        (SELECT COALESCE(json_agg(t ORDER BY t.scraper_config_tag_id), '[]'::json)
+            FROM scraper_config_tags t WHERE t.scraper_config_id = s.scraper_config_id) AS tags,
+        (SELECT COALESCE(json_agg(l ORDER BY l.row_order), '[]'::json)
+            FROM scraper_config_row_labels l WHERE l.scraper_config_id = s.scraper_config_id) AS row_labels
+    FROM scrapers s
+    LEFT JOIN scraper_config c ON c.scraper_config_id = s.scraper_config_id
+'''
+
+
+# scraper_ids=None loads every scraper
+def load_scraper_definitions(cursor, scraper_ids=None):
+    if scraper_ids is None:
+        cursor.execute(SCRAPER_DEFINITION_QUERY + ' ORDER BY s.scraper_id')
+    else:
+        cursor.execute(SCRAPER_DEFINITION_QUERY + ' WHERE s.scraper_id = ANY(%s) ORDER BY s.scraper_id', (list(scraper_ids),))
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def definition_plan(definition):
+    config = definition['config']
+    plan = plan_cache.get(config['scraper_config_id'], config['last_updated_on'])
+    if plan is None:
+        plan = compile_plan(
+            [tag['tag'] for tag in definition['tags']],
+            [label['row_label'] for label in definition['row_labels']],
+            config['trim_input'],
+            config['group_row_count'],
+            version=config['last_updated_on']
+        )
+        plan_cache.put(config['scraper_config_id'], plan)
+    return plan
+
+
+class DefinitionCache:
+    def __init__(self, ttl=SCRAPER_CACHE_TTL):
+        self.ttl = ttl
+        self._definitions = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write is not cached; a single
+        # scraper's invalidation only bumps its own counter, so it doesn't cancel loads of the others
+        self.generation = 0
+        self._scraper_generations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, scraper_id):
+        with self._lock:
+            entry = self._definitions.get(scraper_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def generation_for(self, scraper_id):
+        with self._lock:
+            return self.generation, self._scraper_generations.get(scraper_id, 0)
+
+    def put(self, definition, generation):
+        scraper_id = definition['scraper_id']
+        with self._lock:
+            if generation == (self.generation, self._scraper_generations.get(scraper_id, 0)):
+                self._definitions[scraper_id] = (definition, time.monotonic())
+
+    def invalidate(self, scraper_id):
+        with self._lock:
+            self._scraper_generations[scraper_id] = self._scraper_generations.get(scraper_id, 0) + 1
+            self._definitions.pop(scraper_id, None)
+
+    def invalidate_config(self, scraper_config_id):
+        with self._lock:
+            self.generation += 1
+            for scraper_id, (definition, _) in list(self._definitions.items()):
+                if definition['scraper_config_id'] == scraper_config_id:
+                    del self._definitions[scraper_id]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._definitions.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._definitions),
+            'ttl': self.ttl,
+            'generation': self.generation,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+definition_cache = DefinitionCache()
+
+
+# Cached definitions are shared between requests and must be treated as read-only
+def _load_scraper_definition(scraper_id):
+    generation = definition_cache.generation_for(scraper_id)
+    with stage_timer('db_load'):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        definitions = load_scraper_definitions(cursor, [scraper_id])
+        conn.close()
+
+    if not definitions:
+        return None
+    definition_cache.put(definitions[0], generation)
+    return definitions[0]
+
+
+def get_scraper_definition(scraper_id):
+    definition = definition_cache.get(scraper_id)
+    if definition is not None:
+        return definition
+    # A burst of requests for an uncached scraper runs one query
+    return flights.do('definition', scraper_id, lambda: _load_scraper_definition(scraper_id))
+
+
+# Anything that changes what a scrape of this definition returns
+def definition_version(definition):
+    config = definition['config'] or {}
+    return definition['scraping_url'], definition.get('parser_backend'), config.get('last_updated_on')
+
+
+def invalidate_scraper_config(scraper_config_id):
+    plan_cache.invalidate(scraper_config_id)
+    definition_cache.invalidate_config(scraper_config_id)
@@ -0,0 +1,99 @@
+import os
+import time
+import logging
+import random
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Fraction of requests whose payloads (cells, grouped rows, trimmed HTML) are logged at DEBUG; 0 disables it
+PAYLOAD_LOG_SAMPLE_RATE = float(os.environ.get('PAYLOAD_LOG_SAMPLE_RATE', 0))
+
+# Set this to a shared empty directory when running several gunicorn workers so /metrics covers all of them
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+STAGE_SECONDS = Histogram(
+    'scrape_stage_seconds',
+    'Time spent in each stage of serving a scrape',
+    ['stage'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+RESPONSE_BYTES = Histogram(
+    'http_response_bytes',
+    'Size of buffered response bodies',
+    ['endpoint'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+)
+CELL_COUNT = Histogram(
+    'scrape_cells',
+    'Number of cells extracted per scrape',
+    ['endpoint'],
+    buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+)
+COALESCED_CALLS = Counter(
+    'coalesced_calls_total',
+    'Calls that ran a computation versus calls that waited on an identical one already in flight',
+    ['endpoint', 'outcome']
+)
+FETCH_ERRORS = Counter(
+    'fetch_errors_total',
+    'Failed page fetches by host',
+    ['host', 'reason']
+)
+
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def observe_cells(endpoint, count):
+    CELL_COUNT.labels(endpoint).observe(count)
+
+
+def observe_response(endpoint, response):
+    # Streamed bodies have no length up front and are not buffered just to measure them;
+    # calculate_content_length() would do exactly that through implicit sequence conversion
+    if response.is_streamed:
+        return
+    size = response.calculate_content_length()
+    if size is not None:
+        RESPONSE_BYTES.labels(endpoint or 'unknown').observe(size)
+
+
+def fetch_error_reason(error):
+    if getattr(error, 'metric_reason', None):
+        return error.metric_reason
+    if isinstance(error, requests.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return f'http_{error.response.status_code}'
+    if isinstance(error, requests.ConnectionError):
+        return 'connection'
+    return 'other'
+
+
+def record_fetch_error(url, error):
+    FETCH_ERRORS.labels(urlsplit(url).hostname or 'unknown', fetch_error_reason(error)).inc()
+
+
+# Decided once per request so a sampled request logs all of its payloads; nothing is sampled unless DEBUG is on
+def sample_payload_logging():
+    return (PAYLOAD_LOG_SAMPLE_RATE > 0 and logging.getLogger().isEnabledFor(logging.DEBUG)
+            and random.random() < PAYLOAD_LOG_SAMPLE_RATE)
+
+
+def render_metrics():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
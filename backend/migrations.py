@@ -0,0 +1,241 @@
+import sys
+import logging
+from datetime import datetime
+
+# Arbitrary key for pg_advisory_lock so two processes never migrate at the same time
+MIGRATION_LOCK_ID = 4815162342
+
+
+def _column_exists(table, column):
+    return f'''EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = '{table}' AND column_name = '{column}'
+    )'''
+
+
+# (version, name, statements); never edit an applied migration, append a new one instead
+MIGRATIONS = [
+    (1, 'create base tables', [
+        '''
+        CREATE TABLE IF NOT EXISTS scrapers (
+            scraper_id SERIAL PRIMARY KEY,
+            scraper_name TEXT NOT NULL,
+            scraping_url TEXT NOT NULL,
+            scraper_config_id INTEGER NOT NULL,
+            created_on TIMESTAMP NOT NULL,
+            last_scraped_on TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS scraper_config (
+            scraper_config_id SERIAL PRIMARY KEY,
+            trim_input TEXT,
+            group_row_count INTEGER,
+            created_on TIMESTAMP NOT NULL,
+            last_updated_on TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS scraper_config_row_labels (
+            scraper_config_row_label_id SERIAL PRIMARY KEY,
+            scraper_config_id INTEGER NOT NULL,
+            row_order INTEGER NOT NULL,
+            row_label TEXT NOT NULL,
+            created_on TIMESTAMP NOT NULL,
+            last_updated_on TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS scraper_config_tags (
+            scraper_config_tag_id SERIAL PRIMARY KEY,
+            scraper_config_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            created_on TIMESTAMP NOT NULL,
+            last_updated_on TIMESTAMP
+        )
+        '''
+    ]),
+    # Databases created by the old drop-and-recreate init_db used different column names
+    (2, 'align tables created by the old init_db', [
+        f'''
+        DO $$
+        BEGIN
+            IF {_column_exists('scraper_config_row_labels', 'row_label_id')} THEN
+                ALTER TABLE scraper_config_row_labels RENAME COLUMN row_label_id TO scraper_config_row_label_id;
+            END IF;
+            IF {_column_exists('scraper_config_row_labels', 'label')} THEN
+                ALTER TABLE scraper_config_row_labels RENAME COLUMN label TO row_label;
+            END IF;
+            IF {_column_exists('scraper_config_tags', 'tag_id')} THEN
+                ALTER TABLE scraper_config_tags RENAME COLUMN tag_id TO scraper_config_tag_id;
+            END IF;
+            IF {_column_exists('scraper_config', 'config_name')} THEN
+                ALTER TABLE scraper_config ALTER COLUMN config_name DROP NOT NULL;
+            END IF;
+            -- Existing labels keep their insertion order
+            IF NOT {_column_exists('scraper_config_row_labels', 'row_order')} THEN
+                ALTER TABLE scraper_config_row_labels ADD COLUMN row_order INTEGER NOT NULL DEFAULT 0;
+                UPDATE scraper_config_row_labels l SET row_order = ordered.position
+                FROM (
+                    SELECT scraper_config_row_label_id,
+                        ROW_NUMBER() OVER (PARTITION BY scraper_config_id ORDER BY scraper_config_row_label_id) - 1 AS position
+                    FROM scraper_config_row_labels
+                ) ordered
+                WHERE l.scraper_config_row_label_id = ordered.scraper_config_row_label_id;
+            END IF;
+        END $$
+        ''',
+        'ALTER TABLE scraper_config ADD COLUMN IF NOT EXISTS trim_input TEXT',
+        'ALTER TABLE scraper_config ADD COLUMN IF NOT EXISTS group_row_count INTEGER',
+        'ALTER TABLE scraper_config ADD COLUMN IF NOT EXISTS last_updated_on TIMESTAMP',
+        'ALTER TABLE scraper_config_row_labels ADD COLUMN IF NOT EXISTS created_on TIMESTAMP NOT NULL DEFAULT now()',
+        'ALTER TABLE scraper_config_row_labels ADD COLUMN IF NOT EXISTS last_updated_on TIMESTAMP',
+        'ALTER TABLE scraper_config_tags ADD COLUMN IF NOT EXISTS created_on TIMESTAMP NOT NULL DEFAULT now()',
+        'ALTER TABLE scraper_config_tags ADD COLUMN IF NOT EXISTS last_updated_on TIMESTAMP'
+    ]),
+    (3, 'scraper fetch, parser and schedule settings', [
+        'ALTER TABLE scrapers ADD COLUMN IF NOT EXISTS page_cache_ttl INTEGER',
+        'ALTER TABLE scrapers ADD COLUMN IF NOT EXISTS parser_backend TEXT',
+        'ALTER TABLE scrapers ADD COLUMN IF NOT EXISTS scrape_interval INTEGER',
+        'ALTER TABLE scrapers ADD COLUMN IF NOT EXISTS last_content_hash TEXT'
+    ]),
+    (4, 'scrape jobs and results', [
+        '''
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            job_id SERIAL PRIMARY KEY,
+            scraper_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            triggered_by TEXT NOT NULL,
+            enqueued_on TIMESTAMP NOT NULL,
+            started_on TIMESTAMP,
+            finished_on TIMESTAMP,
+            row_count INTEGER,
+            error TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS scrape_results (
+            scrape_result_id SERIAL PRIMARY KEY,
+            scraper_id INTEGER NOT NULL,
+            row_index INTEGER NOT NULL,
+            row_hash TEXT NOT NULL,
+            row_data TEXT NOT NULL,
+            created_on TIMESTAMP NOT NULL,
+            last_updated_on TIMESTAMP NOT NULL,
+            UNIQUE (scraper_id, row_index)
+        )
+        '''
+    ]),
+    # Every config lookup filters on scraper_config_id; the second column also serves the ORDER BY
+    (5, 'indexes for config lookups, listings and the job queue', [
+        'CREATE INDEX IF NOT EXISTS idx_scraper_config_tags_config ON scraper_config_tags (scraper_config_id, scraper_config_tag_id)',
+        'CREATE INDEX IF NOT EXISTS idx_scraper_config_row_labels_config_order ON scraper_config_row_labels (scraper_config_id, row_order)',
+        'CREATE INDEX IF NOT EXISTS idx_scrapers_scraper_config_id ON scrapers (scraper_config_id)',
+        'CREATE INDEX IF NOT EXISTS idx_scrapers_last_scraped_on ON scrapers (last_scraped_on, scraper_id)',
+        'CREATE INDEX IF NOT EXISTS idx_scraper_config_last_updated_on ON scraper_config (last_updated_on)',
+        'CREATE INDEX IF NOT EXISTS idx_scrape_jobs_status ON scrape_jobs (status, job_id)',
+        'CREATE INDEX IF NOT EXISTS idx_scrape_jobs_scraper_status ON scrape_jobs (scraper_id, status)'
+    ]),
+    # NOT VALID enforces the keys for new writes without failing on orphans that already exist
+    (6, 'foreign keys to parent tables', [
+        '''
+        ALTER TABLE scraper_config_tags ADD CONSTRAINT fk_scraper_config_tags_config
+            FOREIGN KEY (scraper_config_id) REFERENCES scraper_config (scraper_config_id) ON DELETE CASCADE NOT VALID
+        ''',
+        '''
+        ALTER TABLE scraper_config_row_labels ADD CONSTRAINT fk_scraper_config_row_labels_config
+            FOREIGN KEY (scraper_config_id) REFERENCES scraper_config (scraper_config_id) ON DELETE CASCADE NOT VALID
+        ''',
+        '''
+        ALTER TABLE scrape_jobs ADD CONSTRAINT fk_scrape_jobs_scraper
+            FOREIGN KEY (scraper_id) REFERENCES scrapers (scraper_id) ON DELETE CASCADE NOT VALID
+        ''',
+        '''
+        ALTER TABLE scrape_results ADD CONSTRAINT fk_scrape_results_scraper
+            FOREIGN KEY (scraper_id) REFERENCES scrapers (scraper_id) ON DELETE CASCADE NOT VALID
+        '''
+    ]),
+    # Validators and body hash of the page behind the stored results, for conditional re-scrapes
+    (7, 'upstream validators for conditional scraping', [
+        'ALTER TABLE scrapers ADD COLUMN IF NOT EXISTS upstream_etag TEXT',
+        'ALTER TABLE scrapers ADD COLUMN IF NOT EXISTS upstream_last_modified TEXT',
+        'ALTER TABLE scrapers ADD COLUMN IF NOT EXISTS upstream_content_hash TEXT'
+    ]),
+    # Older duplicates were possible before this; keep the oldest open job per scraper
+    (8, 'one open job per scraper', [
+        '''
+        UPDATE scrape_jobs j SET status = 'failed', finished_on = now(), error = 'Duplicate open job'
+        WHERE j.status IN ('pending', 'running') AND EXISTS (
+            SELECT 1 FROM scrape_jobs o
+            WHERE o.scraper_id = j.scraper_id AND o.status IN ('pending', 'running') AND o.job_id < j.job_id
+        )
+        ''',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_scrape_jobs_open_scraper ON scrape_jobs (scraper_id)
+            WHERE status IN ('pending', 'running')
+        '''
+    ])
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_on TIMESTAMP NOT NULL
+        )
+    ''')
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row['version'] for row in cursor.fetchall()}
+
+
+# Each migration commits on its own, so a failure leaves the schema at the last good version
+def migrate(conn, target=LATEST_VERSION):
+    cursor = conn.cursor()
+    cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+    try:
+        applied = applied_versions(cursor)
+        conn.commit()
+        for version, name, statements in MIGRATIONS:
+            if version in applied or version > target:
+                continue
+            logging.info(f'Applying migration {version}: {name}')
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(
+                'INSERT INTO schema_migrations (version, name, applied_on) VALUES (%s, %s, %s)',
+                (version, name, datetime.utcnow())
+            )
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+
+def pending_migrations(conn):
+    cursor = conn.cursor()
+    applied = applied_versions(cursor)
+    conn.commit()
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+if __name__ == '__main__':
+    from db import connect
+
+    logging.basicConfig(level=logging.INFO)
+    conn = connect()
+    try:
+        if '--status' in sys.argv:
+            for version, name in pending_migrations(conn):
+                print(f'pending {version}: {name}')
+        else:
+            migrate(conn)
+            print(f'Database schema at version {LATEST_VERSION}')
+    finally:
+        conn.close()
@@ -0,0 +1,165 @@
+import os
+import gc
+import signal
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from parsing import get_backend, trim_document
+
+# Parsing is CPU bound, so it runs in separate processes instead of request or batch threads
+PARSE_POOL_WORKERS = int(os.environ.get('PARSE_POOL_WORKERS', os.cpu_count() or 2))
+# Forking a threaded server can deadlock the children; spawn starts them clean
+PARSE_POOL_START_METHOD = os.environ.get('PARSE_POOL_START_METHOD', 'spawn')
+# Set to 0 to parse /scrape and /raw pages in the request worker, where they can use the document cache
+PARSE_POOL_OFFLOAD = os.environ.get('PARSE_POOL_OFFLOAD', '1') == '1'
+# Hard deadline per job in seconds, and address-space cap per pool process in MB; 0 disables either
+PARSE_JOB_TIMEOUT = float(os.environ.get('PARSE_JOB_TIMEOUT', 30))
+PARSE_JOB_MAX_MEMORY_MB = int(os.environ.get('PARSE_JOB_MAX_MEMORY_MB', 1024))
+# Pool processes are replaced after this many jobs so fragmented heaps are given back; 0 keeps them
+PARSE_POOL_MAX_TASKS_PER_CHILD = int(os.environ.get('PARSE_POOL_MAX_TASKS_PER_CHILD', 0))
+# How long past its own deadline a job may run before the parent gives up on its process
+PARSE_JOB_GRACE = 5
+
+_pool = None
+_pool_lock = threading.Lock()
+# Set in each pool process by its initializer
+_memory_limit_mb = PARSE_JOB_MAX_MEMORY_MB
+
+
+class ParseJobError(Exception):
+    code = 'parse_failed'
+    status = 500
+
+
+class ParseTimeout(ParseJobError):
+    code = 'parse_timeout'
+    status = 504
+
+
+class ParseMemoryExceeded(ParseJobError):
+    code = 'parse_memory_exceeded'
+    status = 413
+
+
+def _init_worker(max_memory_mb):
+    global _memory_limit_mb
+    _memory_limit_mb = max_memory_mb
+    if max_memory_mb and resource is not None:
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _warm_worker():
+    # Loads the parser backends before the first real job needs them
+    get_backend()
+
+
+def get_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            logging.info(f'Starting parse pool with {PARSE_POOL_WORKERS} workers')
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSE_POOL_WORKERS,
+                mp_context=multiprocessing.get_context(PARSE_POOL_START_METHOD),
+                initializer=_init_worker,
+                initargs=(PARSE_JOB_MAX_MEMORY_MB,),
+                max_tasks_per_child=PARSE_POOL_MAX_TASKS_PER_CHILD or None
+            )
+            for _ in range(PARSE_POOL_WORKERS):
+                _pool.submit(_warm_worker)
+        return _pool
+
+
+def _discard_pool(pool, kill=False):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    if kill:
+        # Python 3.14 has terminate_workers(); before that the processes are only reachable privately
+        terminate = getattr(pool, 'terminate_workers', None)
+        if terminate is not None:
+            terminate()
+        else:
+            for process in list((getattr(pool, '_processes', None) or {}).values()):
+                process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Runs inside a pool process; SIGALRM interrupts the parse without losing the process
+def _with_deadline(timeout, fn, *args):
+    def on_deadline(signum, frame):
+        raise ParseTimeout(f'Parsing did not finish within {timeout}s')
+
+    use_alarm = timeout and hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        signal.signal(signal.SIGALRM, on_deadline)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args)
+    except MemoryError:
+        pass
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    # Parse trees are full of reference cycles; free the half-built one before the error is pickled back
+    gc.collect()
+    raise ParseMemoryExceeded(f'Parsing needed more than {_memory_limit_mb}MB')
+
+
+def _parse(text, backend_name, plan):
+    backend = get_backend(backend_name)
+    return backend, trim_document(backend, backend.parse(text), plan.trim_tag)
+
+
+def _extract_cells(text, backend_name, plan):
+    backend, root = _parse(text, backend_name, plan)
+    return plan.extract(backend, root)
+
+
+def _extract_rows(text, backend_name, plan):
+    backend, root = _parse(text, backend_name, plan)
+    return plan.group(plan.iter_cells(backend, root))
+
+
+# The plan travels pickled with the page text
+def extract_cells(text, backend_name, plan, timeout=None):
+    return _with_deadline(timeout, _extract_cells, text, backend_name, plan)
+
+
+def extract_rows(text, backend_name, plan, timeout=None):
+    return _with_deadline(timeout, _extract_rows, text, backend_name, plan)
+
+
+def _run(fn, text, backend_name, plan, timeout):
+    pool = get_parse_pool()
+    future = pool.submit(fn, text, backend_name, plan, timeout or None)
+    try:
+        return future.result(timeout=timeout + PARSE_JOB_GRACE if timeout else None)
+    except FuturesTimeout:
+        # The job ignored its alarm (stuck in C code); killing the pool is the only way to get the process back
+        logging.error(f'Parse job overran its {timeout}s deadline, restarting the parse pool')
+        _discard_pool(pool, kill=True)
+        raise ParseTimeout(f'Parsing did not finish within {timeout}s')
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OOM killer); start a fresh pool for the next caller
+        logging.error('Parse pool broke, restarting it')
+        _discard_pool(pool)
+        raise ParseJobError('Parse worker exited unexpectedly')
+
+
+def run_extract_cells(text, backend_name, plan, timeout=PARSE_JOB_TIMEOUT):
+    return _run(extract_cells, text, backend_name, plan, timeout)
+
+
+def run_extract_rows(text, backend_name, plan, timeout=PARSE_JOB_TIMEOUT):
+    return _run(extract_rows, text, backend_name, plan, timeout)
@@ -0,0 +1,360 @@
+import os
+import re
+import logging
+import threading
+
+from bs4 import BeautifulSoup, Tag
+
+from cache import SizedLRUCache
+from metrics import stage_timer
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+# Backend used when a scraper does not pick one
+PARSER_BACKEND = os.environ.get('PARSER_BACKEND', 'html.parser')
+
+# Parsed trees are much larger than their source; budget by estimated tree size
+DOCUMENT_CACHE_MAX_BYTES = int(os.environ.get('DOCUMENT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+DOCUMENT_SIZE_FACTOR = int(os.environ.get('DOCUMENT_SIZE_FACTOR', 10))
+# A trimmed entry shares its root's tree, which is already charged; this covers only the entry itself
+TRIMMED_DOCUMENT_COST = 1024
+PRETTIFY_CACHE_MAX_BYTES = int(os.environ.get('PRETTIFY_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+
+class TrimTagNotFound(Exception):
+    pass
+
+
+def parse_trim_input(trim_input):
+    tag_match = re.match(r'<(\w+)([^>]*)>', trim_input)
+    if not tag_match:
+        return None, {}
+    tag_name = tag_match.group(1)
+    attr_string = tag_match.group(2).strip()
+    attrs = {}
+    if attr_string:
+        class_match = re.search(r'class=["\']([^"\']+)["\']', attr_string)
+        if class_match:
+            attrs['class'] = class_match.group(1).split()
+    return tag_name, attrs
+
+
+class ParserBackend:
+    name = None
+
+    def parse(self, text):
+        raise NotImplementedError
+
+    def find(self, node, tag_name, attrs):
+        raise NotImplementedError
+
+    def find_all(self, node, tag_name):
+        raise NotImplementedError
+
+    def descendants(self, node):
+        raise NotImplementedError
+
+    def children(self, node):
+        raise NotImplementedError
+
+    def tag_name(self, node):
+        raise NotImplementedError
+
+    def text(self, node):
+        raise NotImplementedError
+
+    def prettify(self, node):
+        raise NotImplementedError
+
+    # Same text as text(), cut to limit characters; backends override it to stop reading early
+    def text_prefix(self, node, limit):
+        return self.text(node)[:limit]
+
+    # Depth-first walk yielding (element, depth), with the node's children at depth 1
+    def walk(self, node, max_depth=None):
+        stack = [iter(self.children(node))]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                continue
+            yield child, len(stack)
+            if max_depth is None or len(stack) < max_depth:
+                stack.append(iter(self.children(child)))
+
+    def iter_text_sequentially(self, parent, tag_names):
+        for element in self.descendants(parent):
+            if self.tag_name(element) in tag_names:
+                text = self.text(element)
+                if text:
+                    yield text
+
+    def extract_text_sequentially(self, parent, tag_names):
+        return list(self.iter_text_sequentially(parent, tag_names))
+
+    # Find all elements matching a nested tag path such as <tr><td>
+    def traverse_nested_tags_all(self, node, nested_tag_path):
+        tags = nested_tag_path.strip('<>').split('><')
+
+        # If first tag matches the node itself, skip it
+        if tags and self.tag_name(node) == tags[0]:
+            tags = tags[1:]
+
+        current_elements = [node]
+        for tag in tags:
+            next_elements = []
+            for element in current_elements:
+                next_elements.extend(self.find_all(element, tag))
+            current_elements = next_elements
+            if not current_elements:
+                break
+        return current_elements
+
+    def extract_text_sequentially_nested(self, parent, nested_tag_paths):
+        result = []
+        for nested_path in nested_tag_paths:
+            for element in self.traverse_nested_tags_all(parent, nested_path):
+                text = self.text(element)
+                if text:
+                    result.append(text)
+        return result
+
+
+class BeautifulSoupBackend(ParserBackend):
+    def __init__(self, name, features):
+        self.name = name
+        self.features = features
+
+    def parse(self, text):
+        return BeautifulSoup(text, self.features)
+
+    def find(self, node, tag_name, attrs):
+        return node.find(tag_name, attrs=attrs)
+
+    def find_all(self, node, tag_name):
+        return node.find_all(tag_name)
+
+    def descendants(self, node):
+        return (child for child in node.descendants if isinstance(child, Tag))
+
+    def children(self, node):
+        return (child for child in node.children if isinstance(child, Tag))
+
+    def tag_name(self, node):
+        return node.name
+
+    def text(self, node):
+        return node.get_text(strip=True)
+
+    def text_prefix(self, node, limit):
+        return _join_prefix(node.stripped_strings, limit)
+
+    def prettify(self, node):
+        return node.prettify()
+
+
+# BeautifulSoup leaves the text of these tags out of get_text()
+_NON_TEXT_CONTAINERS = ('script', 'style', 'template', 'rt', 'rp')
+_NON_TEXT_SELECTOR = ', '.join(_NON_TEXT_CONTAINERS)
+_SIMPLE_TAG_NAME = re.compile(r'^[a-z][a-z0-9-]*$')
+
+
+def _join_prefix(strings, limit):
+    parts = []
+    length = 0
+    for string in strings:
+        parts.append(string)
+        length += len(string)
+        if length >= limit:
+            break
+    return ''.join(parts)[:limit]
+
+
+class SelectolaxBackend(ParserBackend):
+    name = 'selectolax'
+
+    def parse(self, text):
+        # Work from the document node so paths and lookups match BeautifulSoup's root
+        return LexborHTMLParser(text).root.parent
+
+    def find(self, node, tag_name, attrs):
+        classes = set(attrs.get('class') or [])
+        for element in self.find_all(node, tag_name):
+            if not classes or classes & set((element.attributes.get('class') or '').split()):
+                return element
+        return None
+
+    def find_all(self, node, tag_name):
+        if _SIMPLE_TAG_NAME.match(tag_name):
+            # css() also matches the node itself, which find_all() never does
+            return [element for element in node.css(tag_name) if element.mem_id != node.mem_id]
+        return [element for element in self.descendants(node) if element.tag == tag_name]
+
+    def iter_text_sequentially(self, parent, tag_names):
+        if not all(_SIMPLE_TAG_NAME.match(name) for name in tag_names):
+            yield from super().iter_text_sequentially(parent, tag_names)
+            return
+
+        # One selector for all tags keeps the walk in C and still yields document order
+        plain_text = parent.css_first(_NON_TEXT_SELECTOR) is None
+        for element in parent.css(', '.join(tag_names)) if tag_names else []:
+            if element.mem_id != parent.mem_id:
+                if plain_text:
+                    text = element.text(deep=True, separator='', strip=True)
+                else:
+                    text = self.text(element)
+                if text:
+                    yield text
+
+    def descendants(self, node):
+        for element in node.traverse():
+            if element.is_element_node and element.mem_id != node.mem_id:
+                yield element
+
+    def children(self, node):
+        return (child for child in node.iter() if child.is_element_node)
+
+    def tag_name(self, node):
+        if node.is_document_node:
+            return '[document]'
+        return node.tag
+
+    def text(self, node):
+        if node.css_first(_NON_TEXT_SELECTOR) is None and node.tag not in _NON_TEXT_CONTAINERS:
+            return node.text(deep=True, separator='', strip=True)
+
+        return ''.join(self._stripped_strings(node))
+
+    def text_prefix(self, node, limit):
+        return _join_prefix(self._stripped_strings(node), limit)
+
+    # Slow path: walk text nodes ourselves so script/style text is skipped like get_text()
+    def _stripped_strings(self, node):
+        stack = [node.iter(include_text=True)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+            elif child.is_text_node:
+                text = child.text_content.strip()
+                if text:
+                    yield text
+            elif child.is_element_node and child.tag not in _NON_TEXT_CONTAINERS:
+                stack.append(child.iter(include_text=True))
+
+    def prettify(self, node):
+        html = node.parser.html if node.is_document_node else node.html
+        return BeautifulSoup(html, 'html.parser').prettify()
+
+
+PARSER_BACKENDS = {
+    'html.parser': BeautifulSoupBackend('html.parser', 'html.parser')
+}
+if lxml is not None:
+    PARSER_BACKENDS['lxml'] = BeautifulSoupBackend('lxml', 'lxml')
+if LexborHTMLParser is not None:
+    PARSER_BACKENDS['selectolax'] = SelectolaxBackend()
+
+KNOWN_PARSER_BACKENDS = ('html.parser', 'lxml', 'selectolax')
+
+
+def get_backend(name=None):
+    name = name or PARSER_BACKEND
+    backend = PARSER_BACKENDS.get(name)
+    if backend is None:
+        logging.warning(f'Parser backend {name} is not available, falling back to html.parser')
+        backend = PARSER_BACKENDS['html.parser']
+    return backend
+
+
+def trim_document(backend, root, trim_tag):
+    tag_name, attrs = parse_trim_input(trim_tag) if trim_tag else (None, {})
+    if not tag_name:
+        return root
+    document = backend.find(root, tag_name, attrs)
+    if document is None:
+        raise TrimTagNotFound(trim_tag)
+    return document
+
+
+class DocumentCache:
+    def __init__(self, max_bytes=DOCUMENT_CACHE_MAX_BYTES):
+        self._documents = SizedLRUCache(max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def clear(self):
+        self._documents.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._documents),
+            'estimated_bytes': self._documents.bytes,
+            'max_bytes': self._documents.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self._documents.evictions
+        }
+
+    def load(self, page, trim_tag=None, backend=None):
+        backend = backend or get_backend()
+
+        # Cached documents are shared between requests and must be treated as read-only
+        key = (page.content_hash, backend.name, trim_tag or None)
+        root_key = (page.content_hash, backend.name, None)
+        document = self._documents.get(key)
+        if document is not None:
+            self._count('hits')
+            # Keeps the root more recent than its trimmed entries, so LRU never evicts the charged tree first
+            self._documents.get(root_key)
+            return document
+        self._count('misses')
+
+        soup = self._documents.get(root_key)
+        if soup is None:
+            with stage_timer('parse'):
+                soup = backend.parse(page.text)
+            self._documents.put(root_key, soup, page.size * DOCUMENT_SIZE_FACTOR)
+
+        with stage_timer('trim'):
+            document = trim_document(backend, soup, trim_tag)
+        if document is not soup:
+            self._documents.put(key, document, TRIMMED_DOCUMENT_COST)
+            # A root too big to cache would leave its tree alive but uncharged behind the trimmed entry
+            if self._documents.get(root_key) is None:
+                self._documents.remove(key)
+        return document
+
+
+document_cache = DocumentCache()
+
+
+def load_document(page, trim_tag=None, backend=None):
+    return document_cache.load(page, trim_tag, backend)
+
+
+# Prettified HTML is costly to render and previews page through it, so keep it per trimmed document
+prettify_cache = SizedLRUCache(PRETTIFY_CACHE_MAX_BYTES)
+
+
+def prettify_document(page, document, trim_tag=None, backend=None):
+    backend = backend or get_backend()
+    key = (page.content_hash, backend.name, trim_tag or None)
+    html = prettify_cache.get(key)
+    if html is None:
+        html = backend.prettify(document)
+        prettify_cache.put(key, html, len(html))
+    return html
@@ -1,6 +1,4 @@
-from .app import app
-from .db import init_db
+from db import reset_db
 
-with app.app_context():
-    init_db()
-    print('Database reset successfully')
+reset_db()
+print('Database reset successfully')
@@ -0,0 +1,137 @@
+import json
+import hashlib
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+from fetch import fetch_page, NOT_MODIFIED
+
+
+# Rows per multi-row INSERT/UPDATE statement when saving results
+RESULTS_WRITE_PAGE_SIZE = 1000
+# First key of the per-scraper advisory lock that serializes result writes; the scraper id is the second
+RESULTS_LOCK_CLASS = 2038
+
+
+def serialize_row(row):
+    return json.dumps(row)
+
+
+def row_hash(serialized):
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+# Results only change when the page or the extraction config changes
+def result_fingerprint(content_hash, config_version):
+    return hashlib.sha256(f'{content_hash}:{config_version}'.encode('utf-8')).hexdigest()
+
+
+# Validators and body hash of the page the stored results were extracted from
+def page_upstream(page):
+    return {'etag': page.etag, 'last_modified': page.last_modified, 'content_hash': page.content_hash}
+
+
+def stored_upstream(scraper):
+    return {
+        'etag': scraper.get('upstream_etag'),
+        'last_modified': scraper.get('upstream_last_modified'),
+        'content_hash': scraper.get('upstream_content_hash')
+    }
+
+
+# Returns (page, fingerprint); page is None when the stored results are still current
+def fetch_if_changed(url, ttl, last_content_hash, upstream, config_version):
+    if last_content_hash is None:
+        page = fetch_page(url, ttl=ttl)
+        return page, result_fingerprint(page.content_hash, config_version)
+
+    page = fetch_page(url, ttl=ttl, etag=upstream.get('etag'), last_modified=upstream.get('last_modified'))
+    if page is NOT_MODIFIED:
+        # A 304 only vouches for the body; the stored results must also come from the current config
+        if upstream.get('content_hash') and result_fingerprint(upstream['content_hash'], config_version) == last_content_hash:
+            return None, last_content_hash
+        page = fetch_page(url, ttl=ttl)
+
+    fingerprint = result_fingerprint(page.content_hash, config_version)
+    if fingerprint == last_content_hash:
+        return None, fingerprint
+    return page, fingerprint
+
+
+def save_upstream(cursor, scraper_id, fingerprint, upstream):
+    cursor.execute(
+        '''UPDATE scrapers SET last_content_hash = %s, upstream_etag = %s, upstream_last_modified = %s, upstream_content_hash = %s
+        WHERE scraper_id = %s''',
+        (fingerprint, upstream.get('etag'), upstream.get('last_modified'), upstream.get('content_hash'), scraper_id)
+    )
+
+
+# Diffs rows by position against what is stored and writes only the differences
+def save_results(cursor, scraper_id, rows, fingerprint, upstream):
+    now = datetime.utcnow()
+    # Concurrent /scrape calls and scheduled runs would otherwise diff against the same rows and collide on insert;
+    # held until the caller commits
+    cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', (RESULTS_LOCK_CLASS, scraper_id))
+    cursor.execute('SELECT row_index, row_hash FROM scrape_results WHERE scraper_id = %s', (scraper_id,))
+    stored = {row['row_index']: row['row_hash'] for row in cursor.fetchall()}
+
+    inserts = []
+    updates = []
+    for index, row in enumerate(rows):
+        serialized = serialize_row(row)
+        digest = row_hash(serialized)
+        if index not in stored:
+            inserts.append((scraper_id, index, digest, serialized, now, now))
+        elif stored[index] != digest:
+            updates.append((digest, serialized, now, scraper_id, index))
+
+    # executemany() is a round trip per row on psycopg2; these send a page of rows per statement
+    if inserts:
+        execute_values(
+            cursor,
+            '''INSERT INTO scrape_results (scraper_id, row_index, row_hash, row_data, created_on, last_updated_on) VALUES %s
+            ON CONFLICT (scraper_id, row_index) DO UPDATE
+            SET row_hash = EXCLUDED.row_hash, row_data = EXCLUDED.row_data, last_updated_on = EXCLUDED.last_updated_on''',
+            inserts,
+            page_size=RESULTS_WRITE_PAGE_SIZE
+        )
+    if updates:
+        execute_values(
+            cursor,
+            '''UPDATE scrape_results r SET row_hash = v.row_hash, row_data = v.row_data, last_updated_on = v.last_updated_on
+            FROM (VALUES %s) AS v (row_hash, row_data, last_updated_on, scraper_id, row_index)
+            WHERE r.scraper_id = v.scraper_id AND r.row_index = v.row_index''',
+            updates,
+            page_size=RESULTS_WRITE_PAGE_SIZE
+        )
+    removed = sum(1 for index in stored if index >= len(rows))
+    if removed:
+        cursor.execute('DELETE FROM scrape_results WHERE scraper_id = %s AND row_index >= %s', (scraper_id, len(rows)))
+
+    save_upstream(cursor, scraper_id, fingerprint, upstream)
+    return {'inserted': len(inserts), 'updated': len(updates), 'removed': removed}
+
+
+# Stored rows with the fingerprint they were extracted from; one statement, so both come from the same write
+def load_current_results(cursor, scraper_id):
+    cursor.execute(
+        '''SELECT s.last_content_hash, r.row_data FROM scrapers s
+        LEFT JOIN scrape_results r ON r.scraper_id = s.scraper_id
+        WHERE s.scraper_id = %s ORDER BY r.row_index''',
+        (scraper_id,)
+    )
+    stored = cursor.fetchall()
+    if not stored:
+        return [], None
+    return [json.loads(row['row_data']) for row in stored if row['row_data'] is not None], stored[0]['last_content_hash']
+
+
+def load_results(cursor, scraper_id):
+    cursor.execute(
+        'SELECT row_data, last_updated_on FROM scrape_results WHERE scraper_id = %s ORDER BY row_index',
+        (scraper_id,)
+    )
+    stored = cursor.fetchall()
+    rows = [json.loads(row['row_data']) for row in stored]
+    last_updated_on = max((row['last_updated_on'] for row in stored), default=None)
+    return rows, last_updated_on
@@ -8,8 +8,10 @@ bp = Blueprint('routes', __name__)
 
 from scraper_routes import bp as scraper_bp
 from scraper_config_routes import bp as scraper_config_bp
+from job_routes import bp as job_bp
 
 
 def register_routes(app):
     app.register_blueprint(scraper_bp)
     app.register_blueprint(scraper_config_bp)
+    app.register_blueprint(job_bp)
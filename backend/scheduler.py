@@ -0,0 +1,242 @@
+import os
+import time
+import signal
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from db import connect
+from batch import BATCH_MAX_PER_HOST, HostLimiter, load_batch_jobs, run_job
+from results import save_results
+
+# Runs as its own process (see Procfile) so scrapes never occupy a gunicorn worker
+SCHEDULER_POLL_INTERVAL = float(os.environ.get('SCHEDULER_POLL_INTERVAL', 5))
+SCHEDULER_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', 8))
+# Backpressure: enqueueing stops once this many jobs are waiting
+SCHEDULER_MAX_PENDING = int(os.environ.get('SCHEDULER_MAX_PENDING', 500))
+# Minimum seconds between two requests to the same host
+SCHEDULER_HOST_MIN_INTERVAL = float(os.environ.get('SCHEDULER_HOST_MIN_INTERVAL', 1))
+# Running jobs older than this are assumed lost with a crashed worker
+SCHEDULER_JOB_TIMEOUT = int(os.environ.get('SCHEDULER_JOB_TIMEOUT', 600))
+
+JOB_STATUSES = ('pending', 'running', 'succeeded', 'failed')
+# Matches the partial unique index that allows one open job per scraper
+OPEN_JOB_CONFLICT = "(scraper_id) WHERE status IN ('pending', 'running')"
+
+
+class QueueFull(Exception):
+    pass
+
+
+def pending_count(cursor):
+    cursor.execute("SELECT COUNT(*) AS count FROM scrape_jobs WHERE status = 'pending'")
+    return cursor.fetchone()['count']
+
+
+def enqueue_job(cursor, scraper_id, triggered_by='manual'):
+    # A scraper already waiting or running keeps its existing job
+    cursor.execute(
+        "SELECT * FROM scrape_jobs WHERE scraper_id = %s AND status IN ('pending', 'running') ORDER BY job_id LIMIT 1",
+        (scraper_id,)
+    )
+    existing = cursor.fetchone()
+    if existing is not None:
+        return existing
+
+    if pending_count(cursor) >= SCHEDULER_MAX_PENDING:
+        raise QueueFull()
+
+    # The partial unique index settles two requests racing past the check above
+    cursor.execute(
+        f'''INSERT INTO scrape_jobs (scraper_id, status, triggered_by, enqueued_on) VALUES (%s, 'pending', %s, %s)
+        ON CONFLICT {OPEN_JOB_CONFLICT} DO NOTHING RETURNING *''',
+        (scraper_id, triggered_by, datetime.utcnow())
+    )
+    job = cursor.fetchone()
+    if job is None:
+        cursor.execute(
+            "SELECT * FROM scrape_jobs WHERE scraper_id = %s AND status IN ('pending', 'running') ORDER BY job_id LIMIT 1",
+            (scraper_id,)
+        )
+        job = cursor.fetchone()
+    return job
+
+
+def enqueue_due(cursor, now):
+    free = SCHEDULER_MAX_PENDING - pending_count(cursor)
+    if free <= 0:
+        logging.warning('Scrape job queue is full, not enqueueing due scrapers')
+        return 0
+
+    # Due when the interval has passed since the last success and since the last attempt
+    cursor.execute(f'''
+        INSERT INTO scrape_jobs (scraper_id, status, triggered_by, enqueued_on)
+        SELECT s.scraper_id, 'pending', 'schedule', %s
+        FROM scrapers s
+        WHERE s.scrape_interval > 0
+            AND (s.last_scraped_on IS NULL OR s.last_scraped_on <= %s - s.scrape_interval * INTERVAL '1 second')
+            AND NOT EXISTS (
+                SELECT 1 FROM scrape_jobs j
+                WHERE j.scraper_id = s.scraper_id
+                    AND (j.status IN ('pending', 'running') OR j.finished_on > %s - s.scrape_interval * INTERVAL '1 second')
+            )
+        ORDER BY s.last_scraped_on NULLS FIRST
+        LIMIT %s
+        ON CONFLICT {OPEN_JOB_CONFLICT} DO NOTHING
+    ''', (now, now, now, free))
+    return cursor.rowcount
+
+
+def expire_stale_jobs(cursor, now):
+    cursor.execute(
+        "UPDATE scrape_jobs SET status = 'failed', finished_on = %s, error = 'Job timed out' WHERE status = 'running' AND started_on < %s",
+        (now, now - timedelta(seconds=SCHEDULER_JOB_TIMEOUT))
+    )
+    return cursor.rowcount
+
+
+def claim_jobs(cursor, limit, now):
+    # SKIP LOCKED lets several scheduler processes share the queue without taking the same job
+    cursor.execute('''
+        UPDATE scrape_jobs SET status = 'running', started_on = %s
+        WHERE job_id IN (
+            SELECT job_id FROM scrape_jobs WHERE status = 'pending'
+            ORDER BY job_id LIMIT %s FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+    ''', (now, limit))
+    return cursor.fetchall()
+
+
+# Only a job still marked running is finished; one that expired meanwhile keeps its outcome and its
+# late result is dropped. Returns whether the job was finished.
+def finish_job(cursor, job_id, result, now):
+    if result['status'] != 200:
+        cursor.execute(
+            "UPDATE scrape_jobs SET status = 'failed', finished_on = %s, error = %s WHERE job_id = %s AND status = 'running'",
+            (now, result['error'], job_id)
+        )
+        if cursor.rowcount == 0:
+            logging.warning(f'Scrape job {job_id} is no longer running, not recording its failure')
+            return False
+        return True
+
+    if result.get('unchanged'):
+        cursor.execute('SELECT COUNT(*) AS count FROM scrape_results WHERE scraper_id = %s', (result['scraper_id'],))
+        row_count = cursor.fetchone()['count']
+    else:
+        row_count = len(result['data'])
+    # The row lock taken here also holds off expire_stale_jobs until this transaction commits
+    cursor.execute(
+        "UPDATE scrape_jobs SET status = 'succeeded', finished_on = %s, row_count = %s WHERE job_id = %s AND status = 'running'",
+        (now, row_count, job_id)
+    )
+    if cursor.rowcount == 0:
+        logging.warning(f'Scrape job {job_id} is no longer running, dropping its results')
+        return False
+
+    if result.get('unchanged'):
+        logging.info(f'Scraper {result["scraper_id"]} content unchanged, keeping stored results')
+    else:
+        changes = save_results(cursor, result['scraper_id'], result['data'], result['fingerprint'], result['upstream'])
+        logging.info(f'Scraper {result["scraper_id"]} results saved: {changes}')
+    cursor.execute('UPDATE scrapers SET last_scraped_on = %s WHERE scraper_id = %s', (now, result['scraper_id']))
+    return True
+
+
+class Scheduler:
+    def __init__(self, workers=SCHEDULER_WORKERS, host_min_interval=SCHEDULER_HOST_MIN_INTERVAL):
+        self.workers = workers
+        self.limiter = HostLimiter(BATCH_MAX_PER_HOST, host_min_interval)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.running = {}
+        self.stopping = False
+
+    # Each job is recorded in its own transaction and only forgotten once that commits
+    def _record_finished(self, conn, now):
+        cursor = conn.cursor()
+        for future in [future for future in self.running if future.done()]:
+            job_id = self.running[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'status': 500, 'error': str(e)}
+            logging.info(f'Scrape job {job_id} finished with status {result["status"]}')
+            try:
+                finish_job(cursor, job_id, result, now)
+                conn.commit()
+            except psycopg2.DatabaseError as e:
+                # e.g. a concurrent /scrape storing the same rows; fail this job rather than leave it running
+                conn.rollback()
+                logging.error(f'Recording scrape job {job_id} failed: {str(e)}')
+                finish_job(cursor, job_id, {'status': 500, 'error': f'Saving results failed: {str(e)}'}, now)
+                conn.commit()
+            del self.running[future]
+
+    def _start_jobs(self, conn, now):
+        cursor = conn.cursor()
+        free = self.workers - len(self.running)
+        if free <= 0 or self.stopping:
+            return
+        claimed = claim_jobs(cursor, free, now)
+        if not claimed:
+            return
+
+        batch_jobs, errors = load_batch_jobs(cursor, [job['scraper_id'] for job in claimed])
+        batch_jobs = {batch_job.scraper_id: batch_job for batch_job in batch_jobs}
+        errors = {error['scraper_id']: error for error in errors}
+        for job in claimed:
+            if job['scraper_id'] not in batch_jobs:
+                finish_job(cursor, job['job_id'], errors[job['scraper_id']], now)
+        # Claims are committed before any work starts, so a failed commit can't leave jobs running untracked
+        conn.commit()
+
+        for job in claimed:
+            batch_job = batch_jobs.get(job['scraper_id'])
+            if batch_job is not None:
+                future = self.executor.submit(run_job, batch_job, self.limiter, skip_unchanged=True)
+                self.running[future] = job['job_id']
+
+    def tick(self, conn):
+        now = datetime.utcnow()
+        self._record_finished(conn, now)
+        cursor = conn.cursor()
+        expire_stale_jobs(cursor, now)
+        if not self.stopping:
+            enqueue_due(cursor, now)
+        conn.commit()
+        self._start_jobs(conn, now)
+        conn.commit()
+
+    def stop(self, *args):
+        logging.info('Scheduler stopping after running jobs finish')
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logging.info(f'Scheduler started with {self.workers} workers')
+
+        conn = None
+        while not self.stopping or self.running:
+            try:
+                if conn is None:
+                    conn = connect()
+                self.tick(conn)
+            except Exception as e:
+                logging.error(f'Scheduler tick failed: {str(e)}')
+                if conn is not None:
+                    conn.close()
+                conn = None
+            time.sleep(SCHEDULER_POLL_INTERVAL if not self.stopping else 0.5)
+
+        self.executor.shutdown()
+        if conn is not None:
+            conn.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    Scheduler().run()
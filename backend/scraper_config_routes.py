@@ -1,23 +1,87 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
+from psycopg2.extras import execute_values
 from db import get_db_connection
+from loader import invalidate_scraper_config
+from listing import ListArgsError, parse_list_args, parse_datetime_arg, list_response
 from bs4 import BeautifulSoup, Tag
 import requests
 import re
+import time
+import logging
 from collections import OrderedDict
 
 bp = Blueprint('scraper_config_routes', __name__)
 
+
+def touch_scraper_config(cursor, scraper_config_id, last_updated_on):
+    # Tag and row label edits change the config too; bumping it lets every worker drop its cached plan
+    cursor.execute(
+        'UPDATE scraper_config SET last_updated_on = %s WHERE scraper_config_id = %s',
+        (last_updated_on, scraper_config_id)
+    )
+
+
+def insert_tags(cursor, scraper_config_id, tags, created_on):
+    if not tags:
+        return
+    # One multi-row INSERT for the whole list instead of a statement per tag
+    execute_values(
+        cursor,
+        'INSERT INTO scraper_config_tags (scraper_config_id, tag, created_on, last_updated_on) VALUES %s',
+        [(scraper_config_id, tag, created_on, created_on) for tag in tags],
+        page_size=len(tags)
+    )
+
+
+def insert_row_labels(cursor, scraper_config_id, row_orders, row_labels, created_on):
+    if not row_labels:
+        return
+    execute_values(
+        cursor,
+        'INSERT INTO scraper_config_row_labels (scraper_config_id, row_order, row_label, created_on, last_updated_on) VALUES %s',
+        [(scraper_config_id, row_order, row_label, created_on, created_on) for row_order, row_label in zip(row_orders, row_labels)],
+        page_size=len(row_labels)
+    )
+
+
+def scraper_config_exists(cursor, scraper_config_id):
+    cursor.execute('SELECT scraper_config_id FROM scraper_config WHERE scraper_config_id = %s', (scraper_config_id,))
+    return cursor.fetchone() is not None
+
+
 # --- Scraper Config Routes ---
 
+SCRAPER_CONFIG_FIELDS = ('scraper_config_id', 'trim_input', 'group_row_count', 'created_on', 'last_updated_on')
+
+
 @bp.route('/scraper-config', methods=['GET'])
 def list_scraper_configs():
+    try:
+        after_id, limit, columns = parse_list_args(request.args, 'scraper_config_id', SCRAPER_CONFIG_FIELDS)
+        updated_after = parse_datetime_arg(request.args, 'updated_after')
+    except ListArgsError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conditions = []
+    params = []
+    if after_id is not None:
+        conditions.append('scraper_config_id > %s')
+        params.append(after_id)
+    if updated_after is not None:
+        conditions.append('last_updated_on >= %s')
+        params.append(updated_after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM scraper_config')
+    cursor.execute(
+        f"SELECT {', '.join(columns)} FROM scraper_config {where} ORDER BY scraper_config_id LIMIT %s",
+        (*params, limit + 1)
+    )
     configs = cursor.fetchall()
     conn.close()
-    return jsonify([dict(config) for config in configs])
+    return list_response(configs, limit, 'scraper_config_id')
 
 @bp.route('/scraper-config/<int:scraper_config_id>', methods=['GET'])
 def get_scraper_config(scraper_config_id):
@@ -40,11 +104,11 @@ def create_scraper_config():
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        'INSERT INTO scraper_config (trim_input, group_row_count, created_on, last_updated_on) VALUES (%s, %s, %s, %s)',
+        'INSERT INTO scraper_config (trim_input, group_row_count, created_on, last_updated_on) VALUES (%s, %s, %s, %s) RETURNING scraper_config_id',
         (trim_input, group_row_count, created_on, None)
     )
+    scraper_config_id = cursor.fetchone()['scraper_config_id']
     conn.commit()
-    scraper_config_id = cursor.lastrowid
     conn.close()
     return jsonify({'message': 'Scraper config created', 'scraper_config_id': scraper_config_id}), 201
 
@@ -68,6 +132,7 @@ def update_scraper_config(scraper_config_id):
     )
     conn.commit()
     conn.close()
+    invalidate_scraper_config(scraper_config_id)
     return jsonify({'message': 'Scraper config updated'})
 
 @bp.route('/scraper-config/<int:scraper_config_id>', methods=['DELETE'])
@@ -82,6 +147,7 @@ def delete_scraper_config(scraper_config_id):
     cursor.execute('DELETE FROM scraper_config WHERE scraper_config_id = %s', (scraper_config_id,))
     conn.commit()
     conn.close()
+    invalidate_scraper_config(scraper_config_id)
     return jsonify({'message': 'Scraper config deleted'})
 
 # --- Scraper Config Row Labels Routes ---
@@ -127,17 +193,53 @@ def create_row_label(scraper_config_id):
 
     conn = get_db_connection()
     cursor = conn.cursor()
+    if not scraper_config_exists(cursor, scraper_config_id):
+        conn.close()
+        return jsonify({'error': 'Scraper config not found'}), 404
 
-    for row_order, row_label in zip(row_orders, row_labels):
-        cursor.execute(
-            'INSERT INTO scraper_config_row_labels (scraper_config_id, row_order, row_label, created_on, last_updated_on) VALUES (%s, %s, %s, %s, %s)',
-            (scraper_config_id, row_order, row_label, created_on, last_updated_on)
-        )
+    insert_row_labels(cursor, scraper_config_id, row_orders, row_labels, created_on)
+    touch_scraper_config(cursor, scraper_config_id, last_updated_on)
 
     conn.commit()
     conn.close()
+    invalidate_scraper_config(scraper_config_id)
     return jsonify({'message': 'Row labels created'}), 201
 
+@bp.route('/scraper-config/<int:scraper_config_id>/row-labels', methods=['PUT'])
+def replace_row_labels(scraper_config_id):
+    data = request.json
+    row_labels = data.get('row_label', [])
+    if not isinstance(row_labels, list):
+        row_labels = [row_labels]
+    # Without explicit orders the labels keep the order they were sent in
+    row_orders = data.get('row_order', list(range(len(row_labels))))
+    if not isinstance(row_orders, list):
+        row_orders = [row_orders]
+
+    if len(row_orders) != len(row_labels):
+        return jsonify({'error': 'row_order and row_label must have the same length'}), 400
+
+    start = time.perf_counter()
+    last_updated_on = datetime.utcnow()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if not scraper_config_exists(cursor, scraper_config_id):
+        conn.close()
+        return jsonify({'error': 'Scraper config not found'}), 404
+
+    # Delete and re-insert in one transaction so readers never see a half-saved config
+    cursor.execute('DELETE FROM scraper_config_row_labels WHERE scraper_config_id = %s', (scraper_config_id,))
+    insert_row_labels(cursor, scraper_config_id, row_orders, row_labels, last_updated_on)
+    touch_scraper_config(cursor, scraper_config_id, last_updated_on)
+    conn.commit()
+    conn.close()
+    invalidate_scraper_config(scraper_config_id)
+
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    logging.info(f'Replaced {len(row_labels)} row labels for scraper config {scraper_config_id} in {elapsed_ms}ms')
+    return jsonify({'message': 'Row labels replaced', 'count': len(row_labels), 'elapsed_ms': elapsed_ms})
+
 @bp.route('/scraper-config/row-labels/<int:row_label_id>', methods=['PUT'])
 def update_row_label(row_label_id):
     data = request.json
@@ -148,7 +250,8 @@ def update_row_label(row_label_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM scraper_config_row_labels WHERE scraper_config_row_label_id = %s', (row_label_id,))
-    if cursor.fetchone() is None:
+    existing_row_label = cursor.fetchone()
+    if existing_row_label is None:
         conn.close()
         return jsonify({'error': 'Row label not found'}), 404
 
@@ -156,8 +259,10 @@ def update_row_label(row_label_id):
         'UPDATE scraper_config_row_labels SET row_order = %s, row_label = %s, last_updated_on = %s WHERE scraper_config_row_label_id = %s',
         (row_order, row_label, last_updated_on, row_label_id)
     )
+    touch_scraper_config(cursor, existing_row_label['scraper_config_id'], last_updated_on)
     conn.commit()
     conn.close()
+    invalidate_scraper_config(existing_row_label['scraper_config_id'])
     return jsonify({'message': 'Row label updated'})
 
 @bp.route('/scraper-config/row-labels/<int:row_label_id>', methods=['DELETE'])
@@ -165,13 +270,16 @@ def delete_row_label(row_label_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM scraper_config_row_labels WHERE scraper_config_row_label_id = %s', (row_label_id,))
-    if cursor.fetchone() is None:
+    existing_row_label = cursor.fetchone()
+    if existing_row_label is None:
         conn.close()
         return jsonify({'error': 'Row label not found'}), 404
 
     cursor.execute('DELETE FROM scraper_config_row_labels WHERE scraper_config_row_label_id = %s', (row_label_id,))
+    touch_scraper_config(cursor, existing_row_label['scraper_config_id'], datetime.utcnow())
     conn.commit()
     conn.close()
+    invalidate_scraper_config(existing_row_label['scraper_config_id'])
     return jsonify({'message': 'Row label deleted'})
 
 @bp.route('/scraper-config/<int:scraper_config_id>/tags', methods=['DELETE'])
@@ -179,8 +287,10 @@ def delete_all_tags(scraper_config_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM scraper_config_tags WHERE scraper_config_id = %s', (scraper_config_id,))
+    touch_scraper_config(cursor, scraper_config_id, datetime.utcnow())
     conn.commit()
     conn.close()
+    invalidate_scraper_config(scraper_config_id)
     return jsonify({'message': 'All tags deleted'})
 
 @bp.route('/scraper-config/<int:scraper_config_id>/row-labels', methods=['DELETE'])
@@ -188,8 +298,10 @@ def delete_all_row_labels(scraper_config_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM scraper_config_row_labels WHERE scraper_config_id = %s', (scraper_config_id,))
+    touch_scraper_config(cursor, scraper_config_id, datetime.utcnow())
     conn.commit()
     conn.close()
+    invalidate_scraper_config(scraper_config_id)
     return jsonify({'message': 'All row labels deleted'})
 
 # --- Scraper Config Tags Routes ---
@@ -233,17 +345,46 @@ def create_tag(scraper_config_id):
 
     conn = get_db_connection()
     cursor = conn.cursor()
+    if not scraper_config_exists(cursor, scraper_config_id):
+        conn.close()
+        return jsonify({'error': 'Scraper config not found'}), 404
 
-    for tag in tags:
-        cursor.execute(
-            'INSERT INTO scraper_config_tags (scraper_config_id, tag, created_on, last_updated_on) VALUES (%s, %s, %s, %s)',
-            (scraper_config_id, tag, created_on, last_updated_on)
-        )
+    insert_tags(cursor, scraper_config_id, tags, created_on)
+    touch_scraper_config(cursor, scraper_config_id, last_updated_on)
 
     conn.commit()
     conn.close()
+    invalidate_scraper_config(scraper_config_id)
     return jsonify({'message': 'tags created'}), 201
 
+@bp.route('/scraper-config/<int:scraper_config_id>/tags', methods=['PUT'])
+def replace_tags(scraper_config_id):
+    data = request.json
+    tags = data.get('tag', [])
+    if not isinstance(tags, list):
+        tags = [tags]
+
+    start = time.perf_counter()
+    last_updated_on = datetime.utcnow()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if not scraper_config_exists(cursor, scraper_config_id):
+        conn.close()
+        return jsonify({'error': 'Scraper config not found'}), 404
+
+    # Delete and re-insert in one transaction so readers never see a half-saved config
+    cursor.execute('DELETE FROM scraper_config_tags WHERE scraper_config_id = %s', (scraper_config_id,))
+    insert_tags(cursor, scraper_config_id, tags, last_updated_on)
+    touch_scraper_config(cursor, scraper_config_id, last_updated_on)
+    conn.commit()
+    conn.close()
+    invalidate_scraper_config(scraper_config_id)
+
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    logging.info(f'Replaced {len(tags)} tags for scraper config {scraper_config_id} in {elapsed_ms}ms')
+    return jsonify({'message': 'Tags replaced', 'count': len(tags), 'elapsed_ms': elapsed_ms})
+
 @bp.route('/scraper-config/tags/<int:tag_id>', methods=['PUT'])
 def update_tag(tag_id):
     data = request.json
@@ -253,7 +394,8 @@ def update_tag(tag_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM scraper_config_tags WHERE scraper_config_tag_id = %s', (tag_id,))
-    if cursor.fetchone() is None:
+    existing_tag = cursor.fetchone()
+    if existing_tag is None:
         conn.close()
         return jsonify({'error': 'tag not found'}), 404
 
@@ -261,8 +403,10 @@ def update_tag(tag_id):
         'UPDATE scraper_config_tags SET tag = %s, last_updated_on = %s WHERE scraper_config_tag_id = %s',
         (tag, last_updated_on, tag_id)
     )
+    touch_scraper_config(cursor, existing_tag['scraper_config_id'], last_updated_on)
     conn.commit()
     conn.close()
+    invalidate_scraper_config(existing_tag['scraper_config_id'])
     return jsonify({'message': 'Tag updated'})
 
 @bp.route('/scraper-config/tags/<int:tag_id>', methods=['DELETE'])
@@ -270,11 +414,14 @@ def delete_tag(tag_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM scraper_config_tags WHERE scraper_config_tag_id = %s', (tag_id,))
-    if cursor.fetchone() is None:
+    existing_tag = cursor.fetchone()
+    if existing_tag is None:
         conn.close()
         return jsonify({'error': 'tag not found'}), 404
 
     cursor.execute('DELETE FROM scraper_config_tags WHERE scraper_config_tag_id = %s', (tag_id,))
+    touch_scraper_config(cursor, existing_tag['scraper_config_id'], datetime.utcnow())
     conn.commit()
     conn.close()
+    invalidate_scraper_config(existing_tag['scraper_config_id'])
     return jsonify({'message': 'tag deleted'})
@@ -1,33 +1,132 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from datetime import datetime
 from db import get_db_connection
-from bs4 import BeautifulSoup, Tag
-import requests
+from fetch import fetch_page, page_cache
+from parsing import load_document, document_cache, get_backend, prettify_document, TrimTagNotFound, KNOWN_PARSER_BACKENDS
+from extraction import compile_preview_plan
+from streaming import iter_streamed_cells, prefetch_first
+from batch import load_batch_jobs, iter_batch
+from results import load_results, load_current_results, save_results, fetch_if_changed, page_upstream, stored_upstream, result_fingerprint
+from loader import definition_cache, definition_plan, definition_version, get_scraper_definition
+from listing import ListArgsError, parse_list_args, parse_datetime_arg, list_response, contains_pattern
+from discovery import discover_tags, discovery_args
+from metrics import stage_timer, observe_cells, sample_payload_logging
+from parse_pool import run_extract_cells, ParseJobError, PARSE_POOL_OFFLOAD
+from singleflight import flights
+from http_cache import make_etag, etag_header, not_modified, not_modified_response
+from export import export_format, export_columns, rows_to_columns, ExportUnavailable
+import os
 import json
 import logging
-import re
+import requests
 from collections import OrderedDict
+from itertools import chain
 
 bp = Blueprint('scraper_routes', __name__)
 
+
+# One JSON object per line, written as rows are produced
+def ndjson_response(rows):
+    def generate():
+        try:
+            for row in rows:
+                yield json.dumps(row) + '\n'
+        except Exception as e:
+            logging.error(f'NDJSON stream aborted: {str(e)}')
+            yield json.dumps({'error': str(e)}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+def store_scrape_results(scraper_id, rows, fingerprint, page):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        save_results(cursor, scraper_id, rows, fingerprint, page_upstream(page))
+        conn.commit()
+    except Exception as e:
+        # The scrape itself succeeded; the next call just won't be able to reuse it
+        logging.error(f'Failed to store results for scraper {scraper_id}: {str(e)}')
+    finally:
+        conn.close()
+    # The cached definition holds the previous fingerprint and validators
+    definition_cache.invalidate(scraper_id)
+
+
+# Seconds between scheduled runs; null or 0 leaves the scraper unscheduled
+def valid_scrape_interval(scrape_interval):
+    return scrape_interval is None or (isinstance(scrape_interval, int) and not isinstance(scrape_interval, bool) and scrape_interval >= 0)
+
+
+# null keeps the PARSER_BACKEND default; anything else has to name a backend the parser module knows
+def valid_parser_backend(parser_backend):
+    return parser_backend is None or parser_backend in KNOWN_PARSER_BACKENDS
+
+
+SCRAPER_FIELDS = (
+    'scraper_id', 'scraper_name', 'scraping_url', 'scraper_config_id', 'created_on', 'last_scraped_on',
+    'page_cache_ttl', 'parser_backend', 'scrape_interval', 'last_content_hash',
+    'upstream_etag', 'upstream_last_modified', 'upstream_content_hash'
+)
+
+
 @bp.route('/scrapers', methods=['GET'])
 def get_scrapers():
+    try:
+        after_id, limit, columns = parse_list_args(request.args, 'scraper_id', SCRAPER_FIELDS)
+        scraped_after = parse_datetime_arg(request.args, 'scraped_after')
+        scraped_before = parse_datetime_arg(request.args, 'scraped_before')
+    except ListArgsError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Keyset pagination on the primary key keeps every page an index range scan
+    conditions = []
+    params = []
+    if after_id is not None:
+        conditions.append('scraper_id > %s')
+        params.append(after_id)
+    if request.args.get('name'):
+        conditions.append("scraper_name ILIKE %s ESCAPE '\\'")
+        params.append(contains_pattern(request.args['name']))
+    if request.args.get('url'):
+        conditions.append("scraping_url ILIKE %s ESCAPE '\\'")
+        params.append(contains_pattern(request.args['url']))
+    if scraped_after is not None:
+        conditions.append('last_scraped_on >= %s')
+        params.append(scraped_after)
+    if scraped_before is not None:
+        conditions.append('last_scraped_on < %s')
+        params.append(scraped_before)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM scrapers')
+    cursor.execute(
+        f"SELECT {', '.join(columns)} FROM scrapers {where} ORDER BY scraper_id LIMIT %s",
+        (*params, limit + 1)
+    )
     scrapers = cursor.fetchall()
     conn.close()
-    return jsonify([dict(scraper) for scraper in scrapers])
+    return list_response(scrapers, limit, 'scraper_id')
 
 @bp.route('/scrapers', methods=['POST'])
 def create_scraper():
     data = request.json
     scraper_name = data.get('scraper_name')
     scraping_url = data.get('scraping_url')
+    page_cache_ttl = data.get('page_cache_ttl')
+    parser_backend = data.get('parser_backend')
+    scrape_interval = data.get('scrape_interval')
 
     if not scraper_name or not scraping_url:
         return jsonify({'error': 'scraper_name and scraping_url are required'}), 400
 
+    if not valid_scrape_interval(scrape_interval):
+        return jsonify({'error': 'scrape_interval must be a non-negative integer number of seconds'}), 400
+
+    if not valid_parser_backend(parser_backend):
+        return jsonify({'error': f'parser_backend must be one of {list(KNOWN_PARSER_BACKENDS)}'}), 400
+
     created_on = datetime.utcnow()
     last_scraped_on = None
 
@@ -36,18 +135,19 @@ def create_scraper():
 
     # Create new scraper_config record
     cursor.execute(
-        'INSERT INTO scraper_config (trim_input, group_row_count, created_on, last_updated_on) VALUES (?, ?, ?, ?)',
+        'INSERT INTO scraper_config (trim_input, group_row_count, created_on, last_updated_on) VALUES (%s, %s, %s, %s) RETURNING scraper_config_id',
         (None, None, created_on, None)
     )
-    scraper_config_id = cursor.lastrowid
+    scraper_config_id = cursor.fetchone()['scraper_config_id']
 
     # Create new scraper record with generated scraper_config_id
     cursor.execute(
-        'INSERT INTO scrapers (scraper_name, scraping_url, scraper_config_id, created_on, last_scraped_on) VALUES (?, ?, ?, ?, ?)',
-        (scraper_name, scraping_url, scraper_config_id, created_on, last_scraped_on)
+        '''INSERT INTO scrapers (scraper_name, scraping_url, scraper_config_id, created_on, last_scraped_on, page_cache_ttl, parser_backend, scrape_interval)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING scraper_id''',
+        (scraper_name, scraping_url, scraper_config_id, created_on, last_scraped_on, page_cache_ttl, parser_backend, scrape_interval)
     )
+    scraper_id = cursor.fetchone()['scraper_id']
     conn.commit()
-    scraper_id = cursor.lastrowid
     conn.close()
 
     return jsonify({'message': 'Scraper created', 'scraper_id': scraper_id, 'scraper_config_id': scraper_config_id}), 201
@@ -63,10 +163,16 @@ def update_scraper():
     if not scraper_id:
         return jsonify({'error': 'scraper_id is required'}), 400
 
+    if not valid_parser_backend(data.get('parser_backend')):
+        return jsonify({'error': f'parser_backend must be one of {list(KNOWN_PARSER_BACKENDS)}'}), 400
+
+    if not valid_scrape_interval(data.get('scrape_interval')):
+        return jsonify({'error': 'scrape_interval must be a non-negative integer number of seconds'}), 400
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT * FROM scrapers WHERE scraper_id = ?', (scraper_id,))
+    cursor.execute('SELECT * FROM scrapers WHERE scraper_id = %s', (scraper_id,))
     existing_scraper = cursor.fetchone()
     if existing_scraper is None:
         conn.close()
@@ -76,12 +182,18 @@ def update_scraper():
     if not scraper_config_id:
         scraper_config_id = existing_scraper['scraper_config_id']
 
+    # Keep the existing page cache TTL, parser backend and schedule unless the client sends new ones
+    page_cache_ttl = data.get('page_cache_ttl', existing_scraper.get('page_cache_ttl'))
+    parser_backend = data.get('parser_backend', existing_scraper.get('parser_backend'))
+    scrape_interval = data.get('scrape_interval', existing_scraper.get('scrape_interval'))
+
     cursor.execute(
-        'UPDATE scrapers SET scraper_name = ?, scraping_url = ?, scraper_config_id = ? WHERE scraper_id = ?',
-        (scraper_name, scraping_url, scraper_config_id, scraper_id)
+        'UPDATE scrapers SET scraper_name = %s, scraping_url = %s, scraper_config_id = %s, page_cache_ttl = %s, parser_backend = %s, scrape_interval = %s WHERE scraper_id = %s',
+        (scraper_name, scraping_url, scraper_config_id, page_cache_ttl, parser_backend, scrape_interval, scraper_id)
     )
     conn.commit()
     conn.close()
+    definition_cache.invalidate(scraper_id)
 
     return jsonify({'message': 'Scraper updated'})
 
@@ -96,14 +208,16 @@ def delete_scraper():
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT * FROM scrapers WHERE scraper_id = ?', (scraper_id,))
+    cursor.execute('SELECT * FROM scrapers WHERE scraper_id = %s', (scraper_id,))
     if cursor.fetchone() is None:
         conn.close()
         return jsonify({'error': 'Scraper not found'}), 404
 
-    cursor.execute('DELETE FROM scrapers WHERE scraper_id = ?', (scraper_id,))
+    # Stored results and jobs go with it through their ON DELETE CASCADE keys
+    cursor.execute('DELETE FROM scrapers WHERE scraper_id = %s', (scraper_id,))
     conn.commit()
     conn.close()
+    definition_cache.invalidate(scraper_id)
 
     return jsonify({'message': 'Scraper deleted'})
 
@@ -112,7 +226,7 @@ def get_scraper(scraper_id):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT * FROM scrapers WHERE scraper_id = ?', (scraper_id,))
+    cursor.execute('SELECT * FROM scrapers WHERE scraper_id = %s', (scraper_id,))
     scraper = cursor.fetchone()
     conn.close()
 
@@ -121,122 +235,229 @@ def get_scraper(scraper_id):
 
     return jsonify(dict(scraper))
 
-@bp.route('/scrape/<int:scraper_id>', methods=['GET'])
-def scrape(scraper_id):
+@bp.route('/scrapers/<int:scraper_id>/results', methods=['GET'])
+def get_scraper_results(scraper_id):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Get scraper by id
-    cursor.execute('SELECT * FROM scrapers WHERE scraper_id = ?', (scraper_id,))
+    cursor.execute('SELECT last_scraped_on FROM scrapers WHERE scraper_id = %s', (scraper_id,))
     scraper = cursor.fetchone()
     if scraper is None:
         conn.close()
         return jsonify({'error': 'Scraper not found'}), 404
 
-    scraper_config_id = scraper['scraper_config_id']
+    # Stored rows from the last scheduled run; no live fetch
+    rows, last_updated_on = load_results(cursor, scraper_id)
+    conn.close()
 
-    # Get scraper config
-    cursor.execute('SELECT * FROM scraper_config WHERE scraper_config_id = ?', (scraper_config_id,))
-    config = cursor.fetchone()
-    if config is None:
-        conn.close()
+    return jsonify({
+        'scraper_id': scraper_id,
+        'last_scraped_on': scraper['last_scraped_on'],
+        'last_updated_on': last_updated_on,
+        'data': rows
+    })
+
+# Change-detection state the loader needs but clients have no use for
+INTERNAL_SCRAPER_FIELDS = ('last_content_hash', 'upstream_etag', 'upstream_last_modified', 'upstream_content_hash')
+
+
+# row_to_json/json_agg hand nested timestamps back as ISO strings; parse them so jsonify formats
+# them like the top-level ones
+def parse_nested_dates(record):
+    return {key: datetime.fromisoformat(value) if key.endswith('_on') and isinstance(value, str) else value
+            for key, value in record.items()}
+
+
+@bp.route('/scrapers/<int:scraper_id>/full', methods=['GET'])
+def get_scraper_full(scraper_id):
+    definition = get_scraper_definition(scraper_id)
+    if definition is None:
+        return jsonify({'error': 'Scraper not found'}), 404
+    # The cached definition is shared, so build a copy instead of editing it
+    scraper = {key: value for key, value in definition.items() if key not in INTERNAL_SCRAPER_FIELDS}
+    if scraper['config'] is not None:
+        scraper['config'] = parse_nested_dates(scraper['config'])
+    scraper['tags'] = [parse_nested_dates(tag) for tag in scraper['tags']]
+    scraper['row_labels'] = [parse_nested_dates(label) for label in scraper['row_labels']]
+    return jsonify(scraper)
+
+# Query parameters as a hashable key; order and repeats are normalized
+def args_key(args):
+    return tuple(sorted(args.items(multi=True)))
+
+
+@bp.route('/scrape/<int:scraper_id>', methods=['GET'])
+def scrape(scraper_id):
+    try:
+        export_format(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ExportUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+
+    # Scraper, config, tags and row labels come from one query, and from memory once cached
+    scraper = get_scraper_definition(scraper_id)
+    if scraper is None:
+        return jsonify({'error': 'Scraper not found'}), 404
+    if scraper['config'] is None:
         return jsonify({'error': 'Scraper config not found'}), 404
 
-    trim_tag = config['trim_input']
-    group_row_count = config['group_row_count']
+    # Reuse the compiled plan unless the config changed since it was built
+    plan = definition_plan(scraper)
 
-    # Get scraper URL
-    scraping_url = scraper['scraping_url']
+    # A streamed body can't be shared, so only buffered scrapes are coalesced
+    if request.args.get('stream') == 'ndjson':
+        return run_scrape(scraper_id, scraper, plan, request.args)
+    # Callers revalidating the same ETag share a 304 as well
+    key = (scraper_id, definition_version(scraper), args_key(request.args), request.headers.get('If-None-Match'))
+    return flights.do('scrape', key, lambda: run_scrape(scraper_id, scraper, plan, request.args))
 
-    # Get row labels
-    cursor.execute('SELECT row_label FROM scraper_config_row_labels WHERE scraper_config_id = ? ORDER BY row_order', (scraper_config_id,))
-    row_labels = [row['row_label'] for row in cursor.fetchall()]
 
-    # Get tags
-    cursor.execute('SELECT tag FROM scraper_config_tags WHERE scraper_config_id = ?', (scraper_config_id,))
-    tags = [row['tag'] for row in cursor.fetchall()]
+def export_response(columns, file_format, etag):
+    with stage_timer('export'):
+        body, headers = export_columns(columns, file_format)
+    return body, 200, {**headers, **etag_header(etag)}
 
-    conn.close()
 
-    # Strip angle brackets from tags
-    tags = [tag.strip('<>') for tag in tags]
+# Returns plain bodies rather than responses so coalesced callers can share the result
+def run_scrape(scraper_id, scraper, plan, args):
+    scraping_url = scraper['scraping_url']
 
     debug_info = {
-        'trim_tag': trim_tag,
-        'group_row_count': group_row_count,
-        'row_labels': row_labels,
-        'tags': tags
+        'trim_tag': plan.trim_tag,
+        'group_row_count': plan.group_row_count,
+        'row_labels': plan.row_labels,
+        'tags': plan.tags
     }
 
+    file_format = args.get('format', 'json')
+    log_payload = sample_payload_logging()
+    if log_payload:
+        logging.debug(f'Extracting text using tags: {plan.tags}')
+
+    # Stream mode parses before the whole page is in, so it has no content hash to build an ETag from
+    page = None
+    etag = None
+    stored_fingerprint = scraper.get('last_content_hash')
+    if args.get('mode') == 'stream':
+        # Parse the body as it arrives and stop reading once the trim element closes
+        try:
+            cells = prefetch_first(iter_streamed_cells(scraping_url, plan.tag_names, plan.trim_tag))
+        except TrimTagNotFound:
+            return {'error': 'Trim tag not found in page'}, 404
+        except requests.Timeout as e:
+            return {'error': f'Timed out fetching URL: {str(e)}'}, 504
+        except Exception as e:
+            return {'error': f'Failed to fetch URL: {str(e)}'}, 500
+    else:
+        # Buffered responses are stored, so later calls can return them while the page and config are unchanged
+        conditional = args.get('stream') != 'ndjson' and args.get('refresh') != '1'
+        try:
+            page, fingerprint = fetch_if_changed(scraping_url, scraper.get('page_cache_ttl'),
+                                                 scraper.get('last_content_hash') if conditional else None,
+                                                 stored_upstream(scraper), plan.version)
+        except requests.Timeout as e:
+            return {'error': f'Timed out fetching URL: {str(e)}'}, 504
+        except Exception as e:
+            return {'error': f'Failed to fetch URL: {str(e)}'}, 500
+
+        # Same page content, config, query and cached flag means the same body, so the client's copy is still good
+        etag = make_etag(fingerprint, definition_version(scraper), args_key(args), page is None)
+        if not_modified(etag):
+            return not_modified_response(etag)
+
+        if page is None:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            grouped_data, stored_fingerprint = load_current_results(cursor, scraper_id)
+            conn.close()
+            if stored_fingerprint == fingerprint:
+                if file_format != 'json':
+                    return export_response(rows_to_columns(grouped_data), file_format, etag)
+                return {'data': grouped_data, 'debug_info': debug_info, 'cached': True}, 200, etag_header(etag)
+
+            # This worker's cached definition is behind: the stored rows now belong to other content
+            try:
+                page = fetch_page(scraping_url, ttl=scraper.get('page_cache_ttl'))
+            except requests.Timeout as e:
+                return {'error': f'Timed out fetching URL: {str(e)}'}, 504
+            except Exception as e:
+                return {'error': f'Failed to fetch URL: {str(e)}'}, 500
+            fingerprint = result_fingerprint(page.content_hash, plan.version)
+            etag = make_etag(fingerprint, definition_version(scraper), args_key(args), False)
+
+        if PARSE_POOL_OFFLOAD:
+            # Parse, trim and extract in the pool so this worker can serve other requests meanwhile
+            try:
+                with stage_timer('parse_pool'):
+                    cells = run_extract_cells(page.text, scraper.get('parser_backend'), plan)
+            except TrimTagNotFound:
+                return {'error': 'Trim tag not found in page'}, 404
+            except ParseJobError as e:
+                logging.error(f'Parsing failed for scraper {scraper_id}: {str(e)}')
+                return {'error': str(e), 'code': e.code}, e.status
+        else:
+            backend = get_backend(scraper.get('parser_backend'))
+            try:
+                soup = load_document(page, plan.trim_tag, backend)
+            except TrimTagNotFound:
+                return {'error': 'Trim tag not found in page'}, 404
+
+            cells = plan.iter_cells(backend, soup)
+
+    if args.get('stream') == 'ndjson':
+        return ndjson_response(plan.iter_rows(cells)), 200, etag_header(etag)
+
     try:
-        response = requests.get(scraping_url)
-        response.raise_for_status()
+        # In stream mode this also covers reading the rest of the body
+        with stage_timer('extract'):
+            cells = list(cells)
+    except requests.Timeout as e:
+        return {'error': f'Timed out fetching URL: {str(e)}'}, 504
     except Exception as e:
-        return jsonify({'error': f'Failed to fetch URL: {str(e)}'}), 500
+        return {'error': f'Failed to fetch URL: {str(e)}'}, 500
+    observe_cells('scrape', len(cells))
+    if log_payload:
+        logging.debug(f'Extracted cells: {cells}')
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    if trim_tag:
-        def parse_trim_input(trim_input):
-            tag_match = re.match(r'<(\w+)([^>]*)>', trim_input)
-            if not tag_match:
-                return None, {}
-            tag_name = tag_match.group(1)
-            attr_string = tag_match.group(2).strip()
-            attrs = {}
-            if attr_string:
-                class_match = re.search(r'class=["\']([^"\']+)["\']', attr_string)
-                if class_match:
-                    attrs['class'] = class_match.group(1).split()
-            return tag_name, attrs
-
-        tag_name, attrs = parse_trim_input(trim_tag)
-        if tag_name:
-            trimmed_soup = soup.find(tag_name, attrs=attrs)
-            if trimmed_soup:
-                soup = trimmed_soup
-            else:
-                return jsonify({'error': 'Trim tag not found in page'}), 404
-
-    def extract_text_sequentially(parent, tag_names):
-        result = []
-        for child in parent.descendants:
-            if child.name in tag_names and isinstance(child, Tag):
-                text = child.get_text(strip=True)
-                if text:
-                    result.append(text)
-        return result
-
-    logging.info(f'Extracting text using tags: {tags}')
-    cells = extract_text_sequentially(soup, tags)
-    logging.info(f'Extracted cells: {cells}')
-
-    if not group_row_count or group_row_count <= 0:
-        group_row_count = len(row_labels) if row_labels else len(cells)
-    if group_row_count == 0:
-        group_row_count = 1
-
-    if row_labels:
-        effective_row_labels = row_labels
-    else:
-        # Generate keys from last tag name in each tag path
-        effective_row_labels = []
-        for tag_path in tags:
-            tag_names = tag_path.strip('<>').split('><')
-            effective_row_labels.append(tag_names[-1] if tag_names else tag_path)
+    changed = page is not None and fingerprint != stored_fingerprint
+    if file_format != 'json':
+        # Cells go straight into column buffers; row dicts are only built when the results need storing
+        with stage_timer('group'):
+            columns = plan.columns(cells)
+        if changed:
+            store_scrape_results(scraper_id, plan.group(cells), fingerprint, page)
+        return export_response(columns, file_format, etag)
+
+    with stage_timer('group'):
+        grouped_data = plan.group(cells)
 
-    grouped_data = []
-    for i in range(0, len(cells), group_row_count):
-        group = cells[i:i+group_row_count]
-        # Include last group even if smaller than group_row_count
-        if len(group) == 0:
-            break
-        item = {effective_row_labels[j]: group[j] for j in range(min(len(effective_row_labels), len(group)))}
-        grouped_data.append(item)
+    if log_payload:
+        logging.debug(f'Grouped data: {grouped_data}')
 
-    logging.info(f'Grouped data: {grouped_data}')
+    if changed:
+        store_scrape_results(scraper_id, grouped_data, fingerprint, page)
+
+    return {'data': grouped_data, 'debug_info': debug_info, 'cached': False}, 200, etag_header(etag)
+
+
+@bp.route('/scrape/batch', methods=['POST'])
+def scrape_batch():
+    data = request.get_json(silent=True) or {}
+    scraper_ids = data.get('scraper_ids')
+    if scraper_ids != 'all':
+        if not isinstance(scraper_ids, list) or not scraper_ids or not all(isinstance(i, int) for i in scraper_ids):
+            return jsonify({'error': 'scraper_ids must be a non-empty list of ids or "all"'}), 400
+        scraper_ids = list(OrderedDict.fromkeys(scraper_ids))
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    jobs, errors = load_batch_jobs(cursor, None if scraper_ids == 'all' else scraper_ids)
+    conn.close()
 
-    return jsonify({'data': grouped_data, 'debug_info': debug_info})
+    logging.info(f'Running batch scrape of {len(jobs)} scrapers')
+    results = ({key: value for key, value in result.items() if key not in ('fingerprint', 'upstream')} for result in iter_batch(jobs))
+    return ndjson_response(chain(errors, results))
 
 
 @bp.route('/raw/<int:scraper_id>', methods=['GET'])
@@ -244,201 +465,252 @@ def raw_scrape(scraper_id):
     output_format = request.args.get('output_format')
     if output_format not in ['html', 'json']:
         return jsonify({'error': 'Invalid or missing output_format parameter'}), 400
+    try:
+        file_format = export_format(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ExportUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+    if file_format != 'json' and output_format != 'json':
+        return jsonify({'error': 'format applies only to output_format=json'}), 400
+
+    scraper = get_scraper_definition(scraper_id)
+    if scraper is None:
+        logging.error(f'Scraper with id {scraper_id} not found')
+        return jsonify({'error': 'Scraper not found'}), 404
 
-    trim_tag = request.args.get('trim_tag')
-    group_row_count = request.args.get('group_row_count', type=int)
+    if request.args.get('stream') == 'ndjson':
+        return run_raw_scrape(scraper, request.args)
+    key = (scraper_id, definition_version(scraper), args_key(request.args), request.headers.get('If-None-Match'))
+    return flights.do('raw', key, lambda: run_raw_scrape(scraper, request.args))
 
-    # Accept tags and row_labels as optional array parameters
-    tags = request.args.getlist('tags') + request.args.getlist('tags[]')  # list of strings
-    row_labels = request.args.getlist('row_labels') + request.args.getlist('row_labels[]')  # list of strings
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def run_raw_scrape(scraper, args):
+    output_format = args.get('output_format')
+    trim_tag = args.get('trim_tag')
+    group_row_count = args.get('group_row_count', type=int)
 
-    # Get scraper by id
-    cursor.execute('SELECT * FROM scrapers WHERE scraper_id = ?', (scraper_id,))
-    scraper = cursor.fetchone()
-    if scraper is None:
-        conn.close()
-        logging.error(f'Scraper with id {scraper_id} not found')
-        return jsonify({'error': 'Scraper not found'}), 404
+    # Accept tags and row_labels as optional array parameters
+    tags = args.getlist('tags') + args.getlist('tags[]')  # list of strings
+    row_labels = args.getlist('row_labels') + args.getlist('row_labels[]')  # list of strings
 
     scraping_url = scraper['scraping_url']
-    conn.close()
 
     try:
-        response = requests.get(scraping_url)
-        response.raise_for_status()
+        page = fetch_page(scraping_url, ttl=scraper.get('page_cache_ttl'))
+    except requests.Timeout as e:
+        logging.error(f'Timed out fetching URL {scraping_url}: {str(e)}')
+        return {'error': f'Timed out fetching URL: {str(e)}'}, 504
     except Exception as e:
         logging.error(f'Failed to fetch URL {scraping_url}: {str(e)}')
-        return jsonify({'error': f'Failed to fetch URL: {str(e)}'}), 500
+        return {'error': f'Failed to fetch URL: {str(e)}'}, 500
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    if trim_tag:
-        def parse_trim_input(trim_input):
-            tag_match = re.match(r'<(\w+)([^>]*)>', trim_input)
-            if not tag_match:
-                return None, {}
-            tag_name = tag_match.group(1)
-            attr_string = tag_match.group(2).strip()
-            attrs = {}
-            if attr_string:
-                class_match = re.search(r'class=["\']([^"\']+)["\']', attr_string)
-                if class_match:
-                    attrs['class'] = class_match.group(1).split()
-            return tag_name, attrs
-
-        tag_name, attrs = parse_trim_input(trim_tag)
-        if tag_name:
-            trimmed_soup = soup.find(tag_name, attrs=attrs)
-            if trimmed_soup:
-                soup = trimmed_soup
-                logging.info(f'Trimmed soup HTML: {str(soup)[:500]}')
-            else:
-                logging.error(f'Trim tag {trim_tag} not found in page')
-                return jsonify({'error': 'Trim tag not found in page'}), 404
-
-    if output_format == 'html':
-        return soup.prettify(), 200, {'Content-Type': 'text/html; charset=utf-8'}
-
-    # Helper function to traverse nested tags and find all matching elements
-    def traverse_nested_tags_all(soup_obj, nested_tag_path):
-        tags = nested_tag_path.strip('<>').split('><')
-        logging.info(f'Traversing nested tags: {tags}')
-
-        # If first tag matches soup_obj tag, skip it
-        if tags and soup_obj.name == tags[0]:
-            tags = tags[1:]
-
-        current_elements = [soup_obj]
-        for tag in tags:
-            next_elements = []
-            for elem in current_elements:
-                found = elem.find_all(tag) if elem else []
-                logging.info(f'Found {len(found)} elements for tag "{tag}"')
-                next_elements.extend(found)
-            current_elements = next_elements
-            if not current_elements:
-                logging.info(f'No elements found for tag "{tag}", stopping traversal')
-                break
-        return current_elements
-
-    # Extract text sequentially from nested tag paths, collecting all matching elements
-    def extract_text_sequentially_nested(parent, nested_tag_paths):
-        result = []
-        for nested_path in nested_tag_paths:
-            elements = traverse_nested_tags_all(parent, nested_path)
-            for element in elements:
-                text = element.get_text(strip=True)
-                if text:
-                    result.append(text)
-        return result
+    # Checked before parsing so an unchanged page costs only the fetch, which is usually a page cache hit
+    etag = make_etag(page.content_hash, definition_version(scraper), args_key(args))
+    if not_modified(etag):
+        return not_modified_response(etag)
 
+    log_payload = sample_payload_logging()
+    backend = get_backend(scraper.get('parser_backend'))
     # Strip angle brackets from tags
     tags = [tag.strip() for tag in tags]
+    plan = compile_preview_plan(tuple(tags), tuple(row_labels), trim_tag, group_row_count)
+
+    # Streams and HTML output need the tree in this process; the rest can be extracted in the pool
+    offload = PARSE_POOL_OFFLOAD and output_format == 'json' and args.get('stream') != 'ndjson'
+    if offload:
+        try:
+            with stage_timer('parse_pool'):
+                cells = run_extract_cells(page.text, backend.name, plan)
+        except TrimTagNotFound:
+            logging.error(f'Trim tag {trim_tag} not found in page')
+            return {'error': 'Trim tag not found in page'}, 404
+        except ParseJobError as e:
+            logging.error(f'Parsing failed for {scraping_url}: {str(e)}')
+            return {'error': str(e), 'code': e.code}, e.status
+    else:
+        try:
+            soup = load_document(page, trim_tag, backend)
+        except TrimTagNotFound:
+            logging.error(f'Trim tag {trim_tag} not found in page')
+            return {'error': 'Trim tag not found in page'}, 404
+
+        # Serializing the trimmed tree just to log it is expensive on big pages
+        if trim_tag and log_payload:
+            logging.debug(f'Trimmed soup HTML: {str(soup)[:500]}')
+
+        if output_format == 'html':
+            return prettify_document(page, soup, trim_tag, backend), 200, {'Content-Type': 'text/html; charset=utf-8', **etag_header(etag)}
+
+    if log_payload:
+        logging.debug(f'Raw endpoint called with tags: {tags}')
+        logging.debug(f'Raw endpoint called with row_labels: {row_labels}')
+        logging.debug(f'Raw endpoint called with group_row_count: {group_row_count}')
+
+    if args.get('stream') == 'ndjson':
+        return ndjson_response(plan.iter_rows(plan.iter_cells(backend, soup))), 200, etag_header(etag)
+
+    if not offload:
+        with stage_timer('extract'):
+            cells = plan.extract(backend, soup)
+    observe_cells('raw', len(cells))
+
+    if log_payload:
+        logging.debug(f'Extracted cells: {cells}')
+
+    file_format = args.get('format', 'json')
+    if file_format != 'json':
+        with stage_timer('group'):
+            columns = plan.columns(cells)
+        return export_response(columns, file_format, etag)
+
+    with stage_timer('group'):
+        grouped_data = plan.group(cells)
+
+    if log_payload:
+        logging.debug(f'Grouped data: {grouped_data}')
+
+    return {'data': grouped_data}, 200, etag_header(etag)
+
+
+PREVIEW_SECTIONS = ('json', 'html', 'tags')
+# Largest slice of prettified HTML returned per preview request
+PREVIEW_HTML_PAGE_CHARS = int(os.environ.get('PREVIEW_HTML_PAGE_CHARS', 100000))
 
-    logging.info(f'Raw endpoint called with tags: {tags}')
-    logging.info(f'Raw endpoint called with row_labels: {row_labels}')
-    logging.info(f'Raw endpoint called with group_row_count: {group_row_count}')
 
-    cells = extract_text_sequentially_nested(soup, tags)
+@bp.route('/preview/<int:scraper_id>', methods=['GET'])
+def preview(scraper_id):
+    sections = [section.strip() for section in request.args.get('sections', ','.join(PREVIEW_SECTIONS)).split(',') if section.strip()]
+    if not sections or any(section not in PREVIEW_SECTIONS for section in sections):
+        return jsonify({'error': f'sections must be a comma separated subset of {list(PREVIEW_SECTIONS)}'}), 400
 
-    logging.info(f'Extracted cells: {cells}')
+    trim_tag = request.args.get('trim_tag')
+    group_row_count = request.args.get('group_row_count', type=int)
+    tags = [tag.strip() for tag in request.args.getlist('tags') + request.args.getlist('tags[]')]
+    row_labels = request.args.getlist('row_labels') + request.args.getlist('row_labels[]')
+    html_offset = max(request.args.get('html_offset', 0, type=int), 0)
+    html_limit = min(max(request.args.get('html_limit', PREVIEW_HTML_PAGE_CHARS, type=int), 1), PREVIEW_HTML_PAGE_CHARS)
+    try:
+        discovery = discovery_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    if not group_row_count or group_row_count <= 0:
-        group_row_count = len(row_labels) if row_labels else len(cells)
-    if group_row_count == 0:
-        group_row_count = 1
+    scraper = get_scraper_definition(scraper_id)
+    if scraper is None:
+        return jsonify({'error': 'Scraper not found'}), 404
 
-    effective_row_labels = row_labels if row_labels else tags
+    scraping_url = scraper['scraping_url']
 
-    grouped_data = []
-    for i in range(0, len(cells), group_row_count):
-        group = cells[i:i+group_row_count]
-        if len(group) < group_row_count:
-            break
-        item = {effective_row_labels[j]: group[j] for j in range(min(len(effective_row_labels), len(group)))}
-        grouped_data.append(item)
+    # One fetch and one parse serve every requested section
+    try:
+        page = fetch_page(scraping_url, ttl=scraper.get('page_cache_ttl'))
+    except requests.Timeout as e:
+        return jsonify({'error': f'Timed out fetching URL: {str(e)}'}), 504
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch URL: {str(e)}'}), 500
 
-    logging.info(f'Grouped data: {grouped_data}')
+    etag = make_etag(page.content_hash, definition_version(scraper), args_key(request.args))
+    if not_modified(etag):
+        return not_modified_response(etag)
 
-    return jsonify({'data': grouped_data})
+    backend = get_backend(scraper.get('parser_backend'))
+    try:
+        soup = load_document(page, trim_tag, backend)
+    except TrimTagNotFound:
+        return jsonify({'error': 'Trim tag not found in page'}), 404
+
+    result = {}
+    if 'json' in sections:
+        plan = compile_preview_plan(tuple(tags), tuple(row_labels), trim_tag, group_row_count)
+        with stage_timer('extract'):
+            cells = plan.extract(backend, soup)
+        observe_cells('preview', len(cells))
+        with stage_timer('group'):
+            result['json'] = {'data': plan.group(cells)}
+
+    if 'html' in sections:
+        # Rendered once per document and cached; each request returns one slice
+        html = prettify_document(page, soup, trim_tag, backend)
+        content = html[html_offset:html_offset + html_limit]
+        end = html_offset + len(content)
+        result['html'] = {
+            'content': content,
+            'offset': html_offset,
+            'total_length': len(html),
+            'next_offset': end if end < len(html) else None
+        }
+
+    if 'tags' in sections:
+        result['tags'] = discover_tags(backend, soup, **discovery)
+
+    return jsonify(result), 200, etag_header(etag)
 
 
 @bp.route('/raw/<int:scraper_id>/tags', methods=['GET'])
 def raw_list_tags(scraper_id):
     trim_tag = request.args.get('trim_tag')
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        discovery = discovery_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # Fetch the scraping URL for the scraper
-    cursor.execute('SELECT scraping_url FROM scrapers WHERE scraper_id = ?', (scraper_id,))
-    scraper = cursor.fetchone()
+    scraper = get_scraper_definition(scraper_id)
     if scraper is None:
-        conn.close()
         return jsonify({'error': 'Scraper not found'}), 404
 
     scraping_url = scraper['scraping_url']
 
     try:
-        response = requests.get(scraping_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        if trim_tag:
-            def parse_trim_input(trim_input):
-                tag_match = re.match(r'<(\w+)([^>]*)>', trim_input)
-                if not tag_match:
-                    return None, {}
-                tag_name = tag_match.group(1)
-                attr_string = tag_match.group(2).strip()
-                attrs = {}
-                if attr_string:
-                    class_match = re.search(r'class=["\']([^"\']+)["\']', attr_string)
-                    if class_match:
-                        attrs['class'] = class_match.group(1).split()
-                return tag_name, attrs
-
-            tag_name, attrs = parse_trim_input(trim_tag)
-            if tag_name:
-                trimmed_soup = soup.find(tag_name, attrs=attrs)
-                if trimmed_soup:
-                    soup = trimmed_soup
-                else:
-                    return jsonify({'error': 'Trim tag not found in page'}), 404
+        page = fetch_page(scraping_url, ttl=scraper.get('page_cache_ttl'))
+        etag = make_etag(page.content_hash, definition_version(scraper), args_key(request.args))
+        if not_modified(etag):
+            return not_modified_response(etag)
+
+        backend = get_backend(scraper.get('parser_backend'))
+        soup = load_document(page, trim_tag, backend)
 
         # Extract tags and descendent tags with counts and example output
-        tag_info = {}
-
-        def add_tag_info(tag_path, element):
-            if tag_path not in tag_info:
-                tag_info[tag_path] = {
-                    'tag': tag_path,
-                    'count': 0,
-                    'example_output': ''
-                }
-            tag_info[tag_path]['count'] += 1
-            if not tag_info[tag_path]['example_output']:
-                tag_info[tag_path]['example_output'] = element.get_text(strip=True)
-
-        def traverse(element, path=''):
-            if not hasattr(element, 'name') or element.name is None:
-                return
-            current_path = f"{path}<{element.name}>"
-            add_tag_info(current_path, element)
-            for child in element.children:
-                traverse(child, current_path)
-
-        traverse(soup)
-
-        tags_list = list(tag_info.values())
+        discovered = discover_tags(backend, soup, **discovery)
 
+    except TrimTagNotFound:
+        return jsonify({'error': 'Trim tag not found in page'}), 404
+    except requests.Timeout as e:
+        return jsonify({'error': f'Timed out fetching URL: {str(e)}'}), 504
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Failed to fetch URL: {str(e)}'}), 500
 
-    conn.close()
+    return jsonify(discovered), 200, etag_header(etag)
+
+
+@bp.route('/scraper-cache', methods=['GET'])
+def scraper_cache_stats():
+    return jsonify(definition_cache.stats())
+
+
+@bp.route('/scraper-cache', methods=['DELETE'])
+def clear_scraper_cache():
+    definition_cache.clear()
+    return jsonify({'message': 'Scraper cache cleared'})
+
+
+@bp.route('/page-cache', methods=['GET'])
+def page_cache_stats():
+    return jsonify(page_cache.stats())
+
+
+@bp.route('/page-cache', methods=['DELETE'])
+def clear_page_cache():
+    page_cache.clear()
+    return jsonify({'message': 'Page cache cleared'})
+
+
+@bp.route('/document-cache', methods=['GET'])
+def document_cache_stats():
+    return jsonify(document_cache.stats())
+
 
-    return jsonify({'tags': tags_list})
+@bp.route('/document-cache', methods=['DELETE'])
+def clear_document_cache():
+    document_cache.clear()
+    return jsonify({'message': 'Document cache cleared'})
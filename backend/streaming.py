@@ -0,0 +1,200 @@
+from html.parser import HTMLParser
+from itertools import chain
+
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+from bs4.dammit import EntitySubstitution
+
+from fetch import stream_page
+from parsing import parse_trim_input, TrimTagNotFound
+
+# Tree-building rules of BeautifulSoup's html.parser builder, so cells match the parsed path
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer'
+])
+STRING_CONTAINERS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+
+class _Collector:
+    __slots__ = ('slot', 'accepts', 'parts')
+
+    def __init__(self, slot, accepts):
+        self.slot = slot
+        self.accepts = accepts
+        self.parts = []
+
+
+class StreamingExtractor(HTMLParser):
+    def __init__(self, tag_names, trim_tag=None):
+        super().__init__(convert_charrefs=False)
+        self.tag_names = frozenset(tag_names)
+        self.trim_name, trim_attrs = parse_trim_input(trim_tag) if trim_tag else (None, {})
+        self.trim_classes = set(trim_attrs.get('class') or [])
+
+        # Without a trim tag the whole document is the root
+        self.found = self.trim_name is None
+        self.root_depth = 0 if self.found else None
+        self.done = False
+
+        # Open elements as (name, collector or None)
+        self.stack = []
+        self.containers = []
+        self.collectors = []
+        self.already_closed = []
+        self.slots = []
+        self.emitted = 0
+        self._text = []
+
+    def _is_trim_element(self, tag, attrs):
+        if tag != self.trim_name:
+            return False
+        if not self.trim_classes:
+            return True
+        classes = set((dict(attrs).get('class') or '').split())
+        return bool(self.trim_classes & classes)
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._flush_text()
+        if self.done:
+            return
+
+        collector = None
+        if not self.found and self._is_trim_element(tag, attrs):
+            self.found = True
+            self.root_depth = len(self.stack) + 1
+        elif self.found and tag in self.tag_names:
+            # get_text() on script/style/... keeps only their own strings; other tags skip those
+            collector = _Collector(len(self.slots), (tag,) if tag in STRING_CONTAINERS else (None, 'cdata'))
+            self.slots.append(None)
+            self.collectors.append(collector)
+
+        self.stack.append((tag, collector))
+        if tag in STRING_CONTAINERS:
+            self.containers.append(tag)
+
+        # Void elements close immediately; a later explicit end tag for them is ignored
+        if tag in VOID_ELEMENTS and handle_empty_element:
+            self._end(tag)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+        self._end(tag)
+
+    def _end(self, tag):
+        self._flush_text()
+        if self.done:
+            return
+
+        # Like BeautifulSoup, close the most recent open element of that name and everything inside it
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) > index and not self.done:
+            self._pop()
+
+    def _pop(self):
+        tag, collector = self.stack.pop()
+        if collector is not None:
+            self.collectors.pop()
+            self.slots[collector.slot] = ''.join(collector.parts)
+        if tag in STRING_CONTAINERS:
+            self.containers.pop()
+        if self.trim_name is not None and self.root_depth is not None and len(self.stack) < self.root_depth:
+            self.done = True
+
+    def handle_data(self, data):
+        if not self.done:
+            self._text.append(data)
+
+    def handle_charref(self, name):
+        dereferenced, _, extra_data = BeautifulSoupHTMLParser._dereference_numeric_character_reference(name)
+        self.handle_data(dereferenced)
+        self.handle_data(extra_data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f'&{name}')
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def handle_decl(self, decl):
+        self._flush_text()
+
+    def handle_pi(self, data):
+        self._flush_text()
+
+    def unknown_decl(self, data):
+        self._flush_text()
+        if data.upper().startswith('CDATA['):
+            self._add_string(data[len('CDATA['):], 'cdata')
+
+    def _flush_text(self):
+        if self._text:
+            text = ''.join(self._text)
+            self._text = []
+            self._add_string(text, self.containers[-1] if self.containers else None)
+
+    def _add_string(self, text, kind):
+        if not self.collectors:
+            return
+        text = text.strip()
+        if not text:
+            return
+        for collector in self.collectors:
+            if kind in collector.accepts:
+                collector.parts.append(text)
+
+    def finish(self):
+        self.close()
+        self._flush_text()
+        while self.stack and not self.done:
+            self._pop()
+
+    # Cells whose text is complete, in document order of their start tags
+    def drain(self):
+        ready = []
+        while self.emitted < len(self.slots) and self.slots[self.emitted] is not None:
+            text = self.slots[self.emitted]
+            if text:
+                ready.append(text)
+            self.emitted += 1
+        return ready
+
+
+def iter_streamed_cells(url, tag_names, trim_tag=None):
+    extractor = StreamingExtractor(tag_names, trim_tag)
+    with stream_page(url) as chunks:
+        for chunk in chunks:
+            extractor.feed(chunk)
+            yield from extractor.drain()
+            if extractor.done:
+                # Stop reading the socket as soon as the trim element is closed
+                break
+    if not extractor.done:
+        extractor.finish()
+    yield from extractor.drain()
+    if not extractor.found:
+        raise TrimTagNotFound(trim_tag)
+
+
+_EXHAUSTED = object()
+
+
+# Pull the first item eagerly so fetch and trim errors surface before a response starts
+def prefetch_first(iterator):
+    iterator = iter(iterator)
+    first = next(iterator, _EXHAUSTED)
+    if first is _EXHAUSTED:
+        return iter(())
+    return chain((first,), iterator)
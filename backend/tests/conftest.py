@@ -0,0 +1,103 @@
+import os
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+
+# TEST_DATABASE_URL points at a disposable database; without it a throwaway server is started with pgserver
+@pytest.fixture(scope='session')
+def postgres():
+    url = os.environ.get('TEST_DATABASE_URL')
+    server = None
+    if not url:
+        try:
+            import pgserver
+        except ImportError:
+            pytest.skip('set TEST_DATABASE_URL or install pgserver to run the database tests')
+        server = pgserver.get_server(tempfile.mkdtemp(), cleanup_mode='delete')
+        url = server.get_uri()
+
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    db.RDS_HOST = query.get('host', [parts.hostname])[0]
+    db.RDS_PORT = parts.port or 5432
+    db.RDS_DBNAME = parts.path.lstrip('/')
+    db.RDS_USER = parts.username
+    db.RDS_PASSWORD = parts.password or None
+    yield url
+    db.db_pool.closeall()
+    if server is not None:
+        server.cleanup()
+
+
+# Every test starts from an empty schema built by the migrations
+@pytest.fixture
+def database(postgres):
+    from loader import definition_cache
+    from fetch import page_cache
+    from parsing import document_cache
+
+    db.db_pool.closeall()
+    db.reset_db()
+    definition_cache.clear()
+    page_cache.clear()
+    document_cache.clear()
+    yield
+    db.db_pool.closeall()
+
+
+@pytest.fixture
+def client(database):
+    from application import app
+
+    return app.test_client()
+
+
+class PageServer:
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(self.path)
+                body = server.pages.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self._server.server_port}{path}'
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def pages():
+    server = PageServer()
+    yield server
+    server.close()
@@ -0,0 +1,43 @@
+import os
+import time
+import signal
+
+from parse_pool import _with_deadline
+
+# Jobs for the parse pool tests. They live in an importable module, not the test file,
+# so spawned pool processes can unpickle them without re-running the tests.
+
+
+def _spin():
+    while True:
+        pass
+
+
+def spin(text, backend_name, plan, timeout):
+    return _with_deadline(timeout, _spin)
+
+
+def _allocate():
+    return len(bytearray(4 * 1024 * 1024 * 1024))
+
+
+def allocate(text, backend_name, plan, timeout):
+    return _with_deadline(timeout, _allocate)
+
+
+# Stands in for a parse stuck in C code, which never sees the alarm
+def _ignore_alarm():
+    signal.signal(signal.SIGALRM, signal.SIG_IGN)
+    time.sleep(30)
+
+
+def ignore_alarm(text, backend_name, plan, timeout):
+    return _with_deadline(timeout, _ignore_alarm)
+
+
+def crash(text, backend_name, plan, timeout):
+    os._exit(1)
+
+
+def echo(text, backend_name, plan, timeout):
+    return _with_deadline(timeout, str.upper, text)
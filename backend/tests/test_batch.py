@@ -0,0 +1,93 @@
+import json
+import time
+import threading
+
+from batch import BatchJob, HostLimiter, iter_batch
+from extraction import compile_plan
+
+
+def job(scraper_id, url, tags=('<td>',), trim_tag=None):
+    return BatchJob(scraper_id, url, compile_plan(list(tags), [], trim_tag, None, version='v1'))
+
+
+def test_results_are_reported_per_job(database, pages):
+    pages.pages['/good'] = '<table><tr><td>a</td></tr></table>'
+    pages.pages['/untrimmed'] = '<table><tr><td>b</td></tr></table>'
+    jobs = [
+        job(1, pages.url('/good')),
+        job(2, pages.url('/missing')),
+        job(3, pages.url('/untrimmed'), trim_tag='<section>')
+    ]
+
+    results = {result['scraper_id']: result for result in iter_batch(jobs)}
+
+    assert results[1]['status'] == 200
+    assert results[1]['data'] == [{'td': 'a'}]
+    assert results[2]['status'] == 500
+    assert '404' in results[2]['error']
+    assert results[3] == {'scraper_id': 3, 'status': 404, 'error': 'Trim tag not found in page'}
+
+
+def test_host_limiter_spaces_requests_to_one_host():
+    limiter = HostLimiter(limit=4, min_interval=0.1)
+    starts = []
+
+    def run(url):
+        with limiter.slot(url):
+            starts.append((url, time.monotonic()))
+
+    threads = [threading.Thread(target=run, args=('http://a.example/page',)) for _ in range(4)]
+    threads.append(threading.Thread(target=run, args=('http://b.example/page',)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    host_a = sorted(start for url, start in starts if 'a.example' in url)
+    gaps = [later - earlier for earlier, later in zip(host_a, host_a[1:])]
+    assert len(gaps) == 3
+    assert all(gap >= 0.09 for gap in gaps)
+    # Other hosts don't wait behind it
+    host_b = [start for url, start in starts if 'b.example' in url][0]
+    assert host_b - host_a[0] < 0.09
+
+
+def test_host_limiter_caps_concurrency_per_host():
+    limiter = HostLimiter(limit=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def run():
+        with limiter.slot('http://a.example/page'):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=run) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert max(peak) == 2
+
+
+def test_batch_route_streams_a_record_per_scraper(client, pages):
+    pages.pages['/good'] = '<table><tr><td>a</td></tr></table>'
+    ids = []
+    for path in ('/good', '/missing'):
+        created = client.post('/scrapers', json={'scraper_name': path, 'scraping_url': pages.url(path)}).get_json()
+        client.put(f"/scraper-config/{created['scraper_config_id']}/tags", json={'tag': ['<td>']})
+        ids.append(created['scraper_id'])
+
+    response = client.post('/scrape/batch', json={'scraper_ids': ids + [999]})
+    assert response.mimetype == 'application/x-ndjson'
+    records = {record['scraper_id']: record for record in map(json.loads, response.get_data(as_text=True).splitlines())}
+    assert records[ids[0]] == {'scraper_id': ids[0], 'status': 200, 'data': [{'td': 'a'}]}
+    assert records[ids[1]]['status'] == 500
+    assert records[999] == {'scraper_id': 999, 'status': 404, 'error': 'Scraper not found'}
+
+    assert client.post('/scrape/batch', json={'scraper_ids': []}).status_code == 400
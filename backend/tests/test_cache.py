@@ -0,0 +1,41 @@
+from cache import SizedLRUCache
+
+
+def test_lru_evicts_least_recently_used_by_size():
+    cache = SizedLRUCache(10)
+    cache.put('a', 1, 4)
+    cache.put('b', 2, 4)
+    assert cache.get('a') == 1
+    cache.put('c', 3, 4)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.bytes == 8
+    assert cache.evictions == 1
+
+
+def test_lru_replaces_and_skips_oversized_entries():
+    cache = SizedLRUCache(10)
+    cache.put('a', 1, 4)
+    cache.put('a', 2, 6)
+    assert cache.get('a') == 2
+    assert cache.bytes == 6
+
+    cache.put('a', 3, 11)
+    assert cache.get('a') is None
+    assert cache.bytes == 0
+    assert len(cache) == 0
+
+
+def test_lru_remove_and_clear():
+    cache = SizedLRUCache(10)
+    cache.put('a', 1, 2)
+    cache.put('b', 2, 3)
+    cache.remove('a')
+    cache.remove('missing')
+    assert len(cache) == 1
+    assert cache.bytes == 3
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.bytes == 0
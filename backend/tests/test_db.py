@@ -0,0 +1,83 @@
+import psycopg2
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+import db
+from db import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(database):
+    pool = ConnectionPool(minconn=1, maxconn=2, timeout=0.2, health_check_interval=0)
+    yield pool
+    pool.closeall()
+
+
+def backend_pid(conn):
+    cursor = conn.cursor()
+    cursor.execute('SELECT pg_backend_pid() AS pid')
+    pid = cursor.fetchone()['pid']
+    conn.rollback()
+    return pid
+
+
+def test_checkout_times_out_when_the_pool_is_exhausted(pool):
+    first = pool.checkout()
+    second = pool.checkout()
+    with pytest.raises(PoolTimeout):
+        pool.checkout()
+    assert pool.stats()['timeouts'] == 1
+    assert pool.stats()['in_use'] == 2
+
+    first.close()
+    # close() is idempotent and hands the slot back once
+    first.close()
+    third = pool.checkout()
+    assert pool.stats()['in_use'] == 2
+    with pytest.raises(psycopg2.InterfaceError):
+        first.cursor()
+    second.close()
+    third.close()
+    assert pool.stats()['in_use'] == 0
+
+
+def test_dead_connection_is_discarded_and_replaced(pool):
+    conn = pool.checkout()
+    dead_pid = backend_pid(conn)
+    conn.close()
+
+    admin = db.connect()
+    admin.autocommit = True
+    admin.cursor().execute('SELECT pg_terminate_backend(%s)', (dead_pid,))
+    admin.close()
+
+    conn = pool.checkout()
+    assert backend_pid(conn) != dead_pid
+    assert pool.stats()['discarded'] == 1
+    conn.close()
+
+
+def test_open_transaction_is_rolled_back_on_release(pool):
+    conn = pool.checkout()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO scraper_config (created_on) VALUES (now())")
+    raw = conn._conn
+    conn.close()
+
+    assert raw.info.transaction_status == TRANSACTION_STATUS_IDLE
+    conn = pool.checkout()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) AS count FROM scraper_config')
+    assert cursor.fetchone()['count'] == 0
+    conn.close()
+
+
+def test_pool_timeout_is_a_503(client, monkeypatch):
+    def checkout():
+        raise PoolTimeout('No database connection available within 10s')
+
+    monkeypatch.setattr(db.db_pool, 'checkout', checkout)
+    response = client.get('/scrapers')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(db.DB_POOL_RETRY_AFTER)
+    assert 'error' in response.get_json()
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from discovery import (discover_tags, discovery_args, TAG_DISCOVERY_MAX_DEPTH, TAG_DISCOVERY_MAX_NODES,
+                       TAG_DISCOVERY_EXAMPLE_CHARS)
+from parsing import PARSER_BACKENDS, get_backend
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+FIXTURES = ['small.html', 'listing.html', 'nested.html', 'deep.html']
+BS4_BACKENDS = [name for name in ('html.parser', 'lxml') if name in PARSER_BACKENDS]
+
+HTML = '''
+<div><p>first <b>bold</b></p><p></p><p>third</p>
+<ul><li><span></span></li><li><span>late text</span></li></ul>
+<script>var x = 1;</script></div>
+'''
+
+
+# The recursive walk /raw/<id>/tags used before discovery.py
+def baseline_tags(element):
+    tag_info = {}
+
+    def add_tag_info(tag_path, element):
+        if tag_path not in tag_info:
+            tag_info[tag_path] = {'tag': tag_path, 'count': 0, 'example_output': ''}
+        tag_info[tag_path]['count'] += 1
+        if not tag_info[tag_path]['example_output']:
+            tag_info[tag_path]['example_output'] = element.get_text(strip=True)
+
+    def traverse(element, path=''):
+        if not hasattr(element, 'name') or element.name is None:
+            return
+        current_path = f'{path}<{element.name}>'
+        add_tag_info(current_path, element)
+        for child in element.children:
+            traverse(child, current_path)
+
+    traverse(element)
+    return list(tag_info.values())
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def truncated_examples(tags, example_chars):
+    return [{**tag, 'example_output': tag['example_output'][:example_chars]} for tag in tags]
+
+
+@pytest.mark.parametrize('backend_name', BS4_BACKENDS)
+@pytest.mark.parametrize('document', FIXTURES + ['inline'])
+def test_matches_the_baseline_walk(backend_name, document):
+    backend = get_backend(backend_name)
+    root = backend.parse(HTML if document == 'inline' else read_fixture(document))
+
+    # deep.html goes past the default depth budget; parity is only promised within the budgets
+    result = discover_tags(backend, root, max_depth=10000)
+    assert result['tags'] == truncated_examples(baseline_tags(root), TAG_DISCOVERY_EXAMPLE_CHARS)
+    assert result['truncated'] is False
+    assert result['nodes_visited'] == sum(tag['count'] for tag in result['tags'])
+
+
+@pytest.mark.parametrize('backend_name', sorted(PARSER_BACKENDS))
+def test_backends_agree_on_a_simple_document(backend_name):
+    backend = get_backend(backend_name)
+    expected = discover_tags(get_backend('html.parser'), get_backend('html.parser').parse(HTML))
+    # lxml and selectolax add html/body wrappers; compare the paths below the div
+    tags = discover_tags(backend, backend.find(backend.parse(HTML), 'div', {}))['tags']
+    div_tags = [tag for tag in expected['tags'] if tag['tag'].startswith('<[document]><div>')]
+    assert [(tag['tag'].split('<div>', 1)[1], tag['count'], tag['example_output']) for tag in tags[1:]] == \
+        [(tag['tag'].split('<div>', 1)[1], tag['count'], tag['example_output']) for tag in div_tags[1:]]
+
+
+def test_examples_skip_empty_elements_and_are_cut():
+    backend = get_backend('html.parser')
+    tags = {tag['tag']: tag for tag in discover_tags(backend, backend.parse(HTML), example_chars=4)['tags']}
+    assert tags['<[document]><div><p>'] == {'tag': '<[document]><div><p>', 'count': 3, 'example_output': 'firs'}
+    assert tags['<[document]><div><ul><li><span>']['example_output'] == 'late'
+
+
+def test_frequency_order_is_stable():
+    backend = get_backend('html.parser')
+    tags = discover_tags(backend, backend.parse(HTML), order='frequency')['tags']
+    counts = [tag['count'] for tag in tags]
+    assert counts == sorted(counts, reverse=True)
+    assert [tag['tag'] for tag in tags[:2]] == ['<[document]><div><p>', '<[document]><div><ul><li>']
+
+
+def test_depth_budget_truncates():
+    backend = get_backend('html.parser')
+    root = backend.parse(read_fixture('deep.html'))
+    full = discover_tags(backend, root)
+    shallow = discover_tags(backend, root, max_depth=3)
+
+    assert all(tag['tag'].count('<') <= 4 for tag in shallow['tags'])
+    assert shallow['tags'] == [tag for tag in full['tags'] if tag['tag'].count('<') <= 4]
+    assert shallow['truncated'] is True
+    assert discover_tags(backend, backend.parse('<p>a</p>'), max_depth=1)['truncated'] is False
+
+
+def test_node_budget_truncates():
+    backend = get_backend('html.parser')
+    root = backend.parse(read_fixture('listing.html'))
+    result = discover_tags(backend, root, max_nodes=50)
+    assert result['nodes_visited'] == 50
+    assert result['truncated'] is True
+    assert sum(tag['count'] for tag in result['tags']) == 50
+
+
+def test_discovery_args_clamp_to_the_configured_budgets():
+    args = discovery_args(MultiDict({'max_depth': '100000', 'max_nodes': '100000000', 'example_chars': '100000'}))
+    assert args == {
+        'max_depth': TAG_DISCOVERY_MAX_DEPTH,
+        'max_nodes': TAG_DISCOVERY_MAX_NODES,
+        'example_chars': TAG_DISCOVERY_EXAMPLE_CHARS,
+        'order': 'document'
+    }
+
+    args = discovery_args(MultiDict({'max_depth': '0', 'max_nodes': '-5', 'example_chars': '-1', 'order': 'frequency'}))
+    assert args == {'max_depth': 1, 'max_nodes': 1, 'example_chars': 0, 'order': 'frequency'}
+
+    assert discovery_args(MultiDict({'max_depth': '5', 'max_nodes': 'many'}))['max_nodes'] == TAG_DISCOVERY_MAX_NODES
+    with pytest.raises(ValueError):
+        discovery_args(MultiDict({'order': 'random'}))
+
+
+def test_tags_route_applies_the_clamps(client, pages):
+    pages.pages['/deep'] = read_fixture('deep.html')
+    scraper_id = client.post('/scrapers', json={'scraper_name': 'deep', 'scraping_url': pages.url('/deep')}).get_json()['scraper_id']
+
+    body = client.get(f'/raw/{scraper_id}/tags?max_nodes=10&max_depth=1000').get_json()
+    assert body['nodes_visited'] == 10
+    assert body['truncated'] is True
+    assert client.get(f'/raw/{scraper_id}/tags?order=random').status_code == 400
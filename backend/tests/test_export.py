@@ -0,0 +1,76 @@
+import csv
+import io
+
+import pytest
+
+import export
+from export import ExportUnavailable, export_columns, export_format, rows_to_columns
+
+COLUMNS = {'name': ['apple', 'pear', 'plum'], 'price': ['1.00', '2.50', None]}
+
+
+def test_export_format_validation():
+    assert export_format({}) == 'json'
+    assert export_format({'format': 'csv'}) == 'csv'
+    assert export_format({'format': 'json', 'stream': 'ndjson'}) == 'json'
+    with pytest.raises(ValueError):
+        export_format({'format': 'xml'})
+    with pytest.raises(ValueError):
+        export_format({'format': 'csv', 'stream': 'ndjson'})
+
+
+def test_arrow_formats_need_pyarrow(monkeypatch):
+    monkeypatch.setattr(export, 'pyarrow', None)
+    assert export_format({'format': 'csv'}) == 'csv'
+    with pytest.raises(ExportUnavailable):
+        export_format({'format': 'parquet'})
+
+
+def test_rows_to_columns_keeps_first_seen_label_order():
+    rows = [{'name': 'apple', 'price': '1.00'}, {'name': 'pear', 'stock': '3'}]
+    assert rows_to_columns(rows) == {
+        'name': ['apple', 'pear'], 'price': ['1.00', None], 'stock': [None, '3']
+    }
+    assert rows_to_columns([]) == {}
+
+
+def test_csv_export():
+    body, headers = export_columns(COLUMNS, 'csv')
+    assert headers['Content-Type'].startswith('text/csv')
+    assert list(csv.reader(io.StringIO(body.decode('utf-8')))) == [
+        ['name', 'price'], ['apple', '1.00'], ['pear', '2.50'], ['plum', '']
+    ]
+
+
+@pytest.mark.parametrize('file_format', ['arrow', 'parquet'])
+def test_arrow_exports_round_trip(file_format):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    body, headers = export_columns(COLUMNS, file_format)
+    assert headers['Content-Type'] == export.EXPORT_MIMETYPES[file_format]
+    if file_format == 'arrow':
+        table = pyarrow.ipc.open_stream(body).read_all()
+    else:
+        table = pyarrow.parquet.read_table(pyarrow.BufferReader(body))
+    assert table.to_pydict() == COLUMNS
+    assert all(field.type == pyarrow.string() for field in table.schema)
+
+
+def test_scrape_export_matches_the_json_rows(client, pages):
+    pages.pages['/table'] = '<table>' + ''.join(f'<tr><td>name {i}</td><td>{i}.00</td></tr>' for i in range(5)) + '<tr><td>last</td></tr></table>'
+    created = client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': pages.url('/table')}).get_json()
+    client.put(f"/scraper-config/{created['scraper_config_id']}/tags", json={'tag': ['<td>']})
+    client.put(f"/scraper-config/{created['scraper_config_id']}/row-labels", json={'row_label': ['name', 'price']})
+
+    rows = client.get(f"/scrape/{created['scraper_id']}").get_json()['data']
+    response = client.get(f"/scrape/{created['scraper_id']}?format=csv")
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    exported = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert exported == [{'name': row['name'], 'price': row.get('price', '')} for row in rows]
+    assert len(rows) == 6
+
+    assert client.get(f"/scrape/{created['scraper_id']}?format=csv&stream=ndjson").status_code == 400
+    assert client.get(f"/scrape/{created['scraper_id']}?format=xml").status_code == 400
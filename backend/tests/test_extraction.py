@@ -0,0 +1,85 @@
+import pytest
+
+from extraction import ExtractionPlan, compile_plan
+from parsing import PARSER_BACKENDS, get_backend
+
+HTML = '''
+<html><body>
+<div class="main">
+  <table>
+    <tr><th>Name</th><th>Price</th></tr>
+    <tr><td>apple <b>red</b></td><td>1.00</td></tr>
+    <tr><td>pear</td><td>2.&amp;50<br>each</td></tr>
+    <tr><td><script>skip()</script>plum</td><td></td></tr>
+  </table>
+  <ul><li>one<li>two</ul>
+</div>
+<p>outside</p>
+</body></html>
+'''
+
+BACKENDS = sorted(PARSER_BACKENDS)
+
+
+def test_row_labels_default_to_the_last_tag_of_each_path():
+    assert ExtractionPlan(['tr><td', 'th'], [], None, None).effective_row_labels == ['td', 'th']
+    assert ExtractionPlan(['tr><td'], [], None, None, nested=True).effective_row_labels == ['tr><td']
+    assert ExtractionPlan(['td'], ['a', 'b'], None, None).effective_row_labels == ['a', 'b']
+
+
+@pytest.mark.parametrize('backend_name', BACKENDS)
+@pytest.mark.parametrize('tags', [
+    ['td'],
+    ['tr><td'],
+    ['table><tr><th', 'td'],
+    ['html><body><div', 'li'],
+    ['tr', 'tr><td', 'td><b'],
+    ['div><p'],
+])
+def test_find_nested_matches_level_by_level_traversal(backend_name, tags):
+    backend = get_backend(backend_name)
+    root = backend.parse(HTML)
+    plan = ExtractionPlan(tags, [], None, None, nested=True)
+
+    expected = [backend.traverse_nested_tags_all(root, tag) for tag in tags]
+    found = plan.find_nested(backend, root)
+    assert [[backend.text(e) for e in elements] for elements in found] == \
+        [[backend.text(e) for e in elements] for elements in expected]
+    assert plan.extract(backend, root) == backend.extract_text_sequentially_nested(root, tags)
+
+
+def test_iter_rows_groups_cells_and_keeps_the_partial_row():
+    plan = ExtractionPlan(['td'], ['name', 'price'], None, None)
+    assert plan.group(['a', '1', 'b', '2', 'c']) == [
+        {'name': 'a', 'price': '1'}, {'name': 'b', 'price': '2'}, {'name': 'c'}
+    ]
+    assert ExtractionPlan(['td'], ['name', 'price'], None, None, nested=True).group(['a', '1', 'b']) == [
+        {'name': 'a', 'price': '1'}
+    ]
+
+
+def test_iter_rows_without_labels_or_row_size_builds_one_row():
+    plan = ExtractionPlan(['td', 'th'], [], None, 0)
+    assert plan.group(iter(['a', 'b', 'c'])) == [{'td': 'a', 'th': 'b'}]
+
+
+@pytest.mark.parametrize('plan, cells', [
+    (ExtractionPlan(['td'], ['name', 'price'], None, None), ['a', '1', 'b', '2', 'c']),
+    (ExtractionPlan(['td'], ['name', 'price', 'stock'], None, 2), ['a', '1', 'b']),
+    (ExtractionPlan(['td'], ['x', 'y', 'x'], None, None), ['a', 'b', 'c', 'd', 'e']),
+    (ExtractionPlan(['td'], ['x', 'y', 'x'], None, None), ['a', 'b', 'c', 'd']),
+    (ExtractionPlan(['td', 'th'], [], None, None), ['a', 'b', 'c']),
+    (ExtractionPlan(['td'], [], None, None, nested=True), []),
+])
+def test_columns_match_iter_rows(plan, cells):
+    rows = plan.group(cells)
+    columns = plan.columns(cells)
+    assert all(len(values) == len(rows) for values in columns.values())
+    assert [{label: values[i] for label, values in columns.items() if values[i] is not None or label in row}
+            for i, row in enumerate(rows)] == rows
+
+
+def test_compile_plan_strips_angle_brackets():
+    plan = compile_plan(['<td>', '<th>'], [], None, None)
+    assert plan.tags == ['td', 'th']
+    assert plan.tag_names == frozenset(['td', 'th'])
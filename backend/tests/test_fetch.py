@@ -0,0 +1,60 @@
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+import fetch
+from fetch import HostBusy, fetch_page, host_connection, stream_page
+
+
+@pytest.fixture
+def one_connection_per_host(monkeypatch):
+    monkeypatch.setattr(fetch, 'FETCH_MAX_CONNECTIONS_PER_HOST', 1)
+    monkeypatch.setattr(fetch, 'FETCH_POOL_TIMEOUT', 0.2)
+    monkeypatch.setattr(fetch, '_host_semaphores', {})
+    fetch.page_cache.clear()
+
+
+def host_busy_errors():
+    return REGISTRY.get_sample_value('fetch_errors_total', {'host': '127.0.0.1', 'reason': 'host_busy'}) or 0
+
+
+def test_busy_host_fails_fast_and_is_counted(pages, one_connection_per_host):
+    pages.pages['/page'] = '<p>hello</p>'
+    url = pages.url('/page')
+    before = host_busy_errors()
+
+    with host_connection(url):
+        start = time.monotonic()
+        with pytest.raises(HostBusy):
+            fetch_page(url)
+        with pytest.raises(HostBusy):
+            with stream_page(url):
+                pass
+        assert time.monotonic() - start < 2
+
+    assert host_busy_errors() == before + 2
+    assert pages.requests == []
+    assert fetch_page(url).text == '<p>hello</p>'
+
+
+def test_streamed_body_holds_the_connection_until_closed(pages, one_connection_per_host):
+    pages.pages['/page'] = '<p>hello</p>'
+    url = pages.url('/page')
+
+    with stream_page(url) as chunks:
+        assert ''.join(chunks) == '<p>hello</p>'
+        with pytest.raises(HostBusy):
+            fetch_page(url)
+    assert fetch_page(url).text == '<p>hello</p>'
+
+
+def test_busy_host_returns_504(client, pages, one_connection_per_host):
+    pages.pages['/page'] = '<table><tr><td>a</td></tr></table>'
+    url = pages.url('/page')
+    scraper_id = client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': url}).get_json()['scraper_id']
+
+    with host_connection(url):
+        response = client.get(f'/raw/{scraper_id}?output_format=json&tags=td')
+    assert response.status_code == 504
+    assert client.get(f'/raw/{scraper_id}?output_format=json&tags=td').status_code == 200
@@ -0,0 +1,96 @@
+import gzip
+
+import pytest
+
+TABLE = '<table>' + ''.join(f'<tr><td>name {i}</td><td>{i}.00</td></tr>' for i in range(100)) + '</table>'
+
+
+@pytest.fixture
+def scraper_id(client, pages):
+    pages.pages['/table'] = TABLE
+    created = client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': pages.url('/table')}).get_json()
+    client.put(f"/scraper-config/{created['scraper_config_id']}", json={'group_row_count': 2})
+    client.put(f"/scraper-config/{created['scraper_config_id']}/tags", json={'tag': ['<td>']})
+    return created['scraper_id']
+
+
+def test_scrape_etag_changes_with_the_body(client, scraper_id):
+    fresh = client.get(f'/scrape/{scraper_id}')
+    cached = client.get(f'/scrape/{scraper_id}')
+    assert fresh.get_json()['cached'] is False
+    assert cached.get_json()['cached'] is True
+    assert fresh.get_json()['data'] == cached.get_json()['data']
+    # A strong validator must never name two different bodies
+    assert fresh.headers['ETag'] != cached.headers['ETag']
+
+    revalidated = client.get(f'/scrape/{scraper_id}', headers={'If-None-Match': cached.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == cached.headers['ETag']
+
+
+def test_scrape_304_skips_extraction(client, scraper_id, monkeypatch):
+    import scraper_routes
+
+    etag = client.get(f'/scrape/{scraper_id}?refresh=1').headers['ETag']
+    monkeypatch.setattr(scraper_routes, 'load_document', lambda *args: pytest.fail('page was parsed'))
+    assert client.get(f'/scrape/{scraper_id}?refresh=1', headers={'If-None-Match': etag}).status_code == 304
+
+
+@pytest.fixture
+def app():
+    from flask import Flask, jsonify
+
+    from http_cache import compress_response, conditional
+
+    app = Flask(__name__)
+    app.after_request(compress_response)
+
+    @app.route('/items')
+    def items():
+        return conditional(jsonify([{'name': f'item {i}'} for i in range(200)]))
+
+    @app.route('/small')
+    def small():
+        return conditional(jsonify({'name': 'item'}))
+
+    return app
+
+
+def test_conditional_uses_the_body_hash(app):
+    client = app.test_client()
+    first = client.get('/items')
+    assert first.headers['ETag'] == client.get('/items').headers['ETag']
+
+    revalidated = client.get('/items', headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+
+def test_compressed_responses_get_their_own_etag(app):
+    client = app.test_client()
+    plain = client.get('/items')
+    compressed = client.get('/items', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+
+    # Either tag revalidates, whatever encoding the client asks for next
+    for etag in (plain.headers['ETag'], compressed.headers['ETag']):
+        assert client.get('/items', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 304
+
+
+def test_brotli_is_preferred_when_available(app):
+    from http_cache import CONTENT_ENCODINGS
+
+    response = app.test_client().get('/items', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == CONTENT_ENCODINGS[0]
+
+
+def test_small_bodies_are_not_compressed(app):
+    response = app.test_client().get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == {'name': 'item'}
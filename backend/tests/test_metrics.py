@@ -0,0 +1,44 @@
+import logging
+
+from flask import Flask, Response
+
+import metrics
+from metrics import observe_response
+
+
+def test_streamed_responses_are_not_buffered_for_the_size_histogram():
+    consumed = []
+
+    def generate():
+        for chunk in ('a\n', 'b\n'):
+            consumed.append(chunk)
+            yield chunk
+
+    with Flask(__name__).test_request_context():
+        response = Response(generate(), mimetype='application/x-ndjson')
+        observe_response('stream_test', response)
+        assert consumed == []
+        assert response.is_streamed
+
+        observe_response('stream_test', Response('abc'))
+    assert metrics.REGISTRY.get_sample_value('http_response_bytes_count', {'endpoint': 'stream_test'}) == 1
+
+
+def test_payloads_are_only_sampled_when_debug_logging_is_on(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, 'PAYLOAD_LOG_SAMPLE_RATE', 1.0)
+    caplog.set_level(logging.INFO)
+    assert not metrics.sample_payload_logging()
+
+    caplog.set_level(logging.DEBUG)
+    assert metrics.sample_payload_logging()
+
+
+def test_sampled_raw_payloads_are_logged_at_debug(client, pages, monkeypatch, caplog):
+    pages.pages['/table'] = '<table><tr><td>a</td><td>b</td></tr></table>'
+    scraper_id = client.post('/scrapers', json={'scraper_name': 'table', 'scraping_url': pages.url('/table')}).get_json()['scraper_id']
+    monkeypatch.setattr(metrics, 'PAYLOAD_LOG_SAMPLE_RATE', 1.0)
+    caplog.set_level(logging.DEBUG)
+
+    assert client.get(f'/raw/{scraper_id}?output_format=json&tags=td').status_code == 200
+    payloads = [record for record in caplog.records if record.getMessage().startswith('Extracted cells')]
+    assert payloads and all(record.levelno == logging.DEBUG for record in payloads)
@@ -0,0 +1,147 @@
+import pytest
+
+import db
+from migrations import migrate, pending_migrations, LATEST_VERSION
+
+TABLES = ('scrape_results', 'scrape_jobs', 'scraper_config_tags', 'scraper_config_row_labels',
+          'scrapers', 'scraper_config', 'schema_migrations')
+
+# Schema as created by the drop-and-recreate init_db that predates the migrations
+BASELINE_SCHEMA = [
+    '''
+    CREATE TABLE scrapers (
+        scraper_id SERIAL PRIMARY KEY,
+        scraper_name TEXT NOT NULL,
+        scraping_url TEXT NOT NULL,
+        scraper_config_id INTEGER NOT NULL,
+        created_on TIMESTAMP NOT NULL,
+        last_scraped_on TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE scraper_config (
+        scraper_config_id SERIAL PRIMARY KEY,
+        config_name TEXT NOT NULL,
+        created_on TIMESTAMP NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE scraper_config_row_labels (
+        row_label_id SERIAL PRIMARY KEY,
+        scraper_config_id INTEGER NOT NULL,
+        label TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE scraper_config_tags (
+        tag_id SERIAL PRIMARY KEY,
+        scraper_config_id INTEGER NOT NULL,
+        tag TEXT NOT NULL
+    )
+    '''
+]
+
+
+@pytest.fixture
+def conn(postgres):
+    db.db_pool.closeall()
+    conn = db.connect()
+    cursor = conn.cursor()
+    for table in TABLES:
+        cursor.execute(f'DROP TABLE IF EXISTS {table} CASCADE')
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def columns(cursor, table):
+    cursor.execute(
+        'SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = %s',
+        (table,)
+    )
+    return {row['column_name'] for row in cursor.fetchall()}
+
+
+def constraints(cursor):
+    cursor.execute("SELECT conname FROM pg_constraint WHERE contype = 'f'")
+    return {row['conname'] for row in cursor.fetchall()}
+
+
+def test_fresh_database(conn):
+    migrate(conn)
+    cursor = conn.cursor()
+
+    assert pending_migrations(conn) == []
+    cursor.execute('SELECT MAX(version) AS version FROM schema_migrations')
+    assert cursor.fetchone()['version'] == LATEST_VERSION
+    assert {'scraper_config_row_label_id', 'row_order', 'row_label'} <= columns(cursor, 'scraper_config_row_labels')
+    assert len(constraints(cursor)) == 4
+
+    # Running again is a no-op
+    migrate(conn)
+    assert pending_migrations(conn) == []
+
+
+def test_upgrade_from_baseline_schema(conn):
+    cursor = conn.cursor()
+    for statement in BASELINE_SCHEMA:
+        cursor.execute(statement)
+    cursor.execute("INSERT INTO scraper_config (config_name, created_on) VALUES ('prices', now())")
+    cursor.execute(
+        "INSERT INTO scrapers (scraper_name, scraping_url, scraper_config_id, created_on) VALUES ('prices', 'http://example.com', 1, now())"
+    )
+    for label in ('name', 'price', 'stock'):
+        cursor.execute('INSERT INTO scraper_config_row_labels (scraper_config_id, label) VALUES (1, %s)', (label,))
+    cursor.execute("INSERT INTO scraper_config_tags (scraper_config_id, tag) VALUES (1, '<td>')")
+    # An orphan left behind by an old delete; NOT VALID keys must not reject it
+    cursor.execute("INSERT INTO scraper_config_tags (scraper_config_id, tag) VALUES (99, '<th>')")
+    conn.commit()
+
+    migrate(conn)
+
+    assert pending_migrations(conn) == []
+    assert 'label' not in columns(cursor, 'scraper_config_row_labels')
+    assert 'tag_id' not in columns(cursor, 'scraper_config_tags')
+    cursor.execute('SELECT row_label, row_order FROM scraper_config_row_labels ORDER BY scraper_config_row_label_id')
+    assert [(row['row_label'], row['row_order']) for row in cursor.fetchall()] == [('name', 0), ('price', 1), ('stock', 2)]
+    cursor.execute('SELECT tag FROM scraper_config_tags ORDER BY scraper_config_tag_id')
+    assert [row['tag'] for row in cursor.fetchall()] == ['<td>', '<th>']
+    assert len(constraints(cursor)) == 4
+
+    # Renamed serial columns keep their sequences, and config_name is no longer required
+    cursor.execute('INSERT INTO scraper_config (created_on) VALUES (now()) RETURNING scraper_config_id')
+    assert cursor.fetchone()['scraper_config_id'] == 2
+    cursor.execute(
+        "INSERT INTO scraper_config_row_labels (scraper_config_id, row_order, row_label, created_on) VALUES (2, 0, 'a', now()) RETURNING scraper_config_row_label_id"
+    )
+    assert cursor.fetchone()['scraper_config_row_label_id'] == 4
+    conn.commit()
+
+    # Deleting the config cascades to its labels and tags
+    cursor.execute('DELETE FROM scraper_config WHERE scraper_config_id = 1')
+    cursor.execute('SELECT COUNT(*) AS count FROM scraper_config_row_labels WHERE scraper_config_id = 1')
+    assert cursor.fetchone()['count'] == 0
+    conn.commit()
+
+    migrate(conn)
+    assert pending_migrations(conn) == []
+
+
+def test_upgrade_from_an_intermediate_version(conn):
+    migrate(conn, target=7)
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO scraper_config (created_on) VALUES (now())')
+    cursor.execute(
+        "INSERT INTO scrapers (scraper_name, scraping_url, scraper_config_id, created_on) VALUES ('prices', 'http://example.com', 1, now())"
+    )
+    for _ in range(2):
+        cursor.execute(
+            "INSERT INTO scrape_jobs (scraper_id, status, triggered_by, enqueued_on) VALUES (1, 'pending', 'schedule', now())"
+        )
+    conn.commit()
+    assert pending_migrations(conn) == [(8, 'one open job per scraper')]
+
+    migrate(conn)
+
+    cursor.execute('SELECT job_id, status FROM scrape_jobs ORDER BY job_id')
+    assert [row['status'] for row in cursor.fetchall()] == ['pending', 'failed']
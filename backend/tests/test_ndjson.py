@@ -0,0 +1,90 @@
+import json
+import time
+
+import pytest
+
+import fetch
+from fetch import host_connection
+
+ROWS = 2000
+PAGE = '<table>' + ''.join(f'<tr><td>name {i}</td><td>{i}.00</td></tr>' for i in range(ROWS)) + '</table>'
+
+
+@pytest.fixture
+def scraper_id(client, pages):
+    pages.pages['/table'] = PAGE
+    created = client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': pages.url('/table')}).get_json()
+    client.put(f"/scraper-config/{created['scraper_config_id']}/tags", json={'tag': ['<td>']})
+    client.put(f"/scraper-config/{created['scraper_config_id']}/row-labels", json={'row_label': ['name', 'price']})
+    return created['scraper_id']
+
+
+def records(response):
+    body = response.get_data(as_text=True)
+    assert body.endswith('\n')
+    return [json.loads(line) for line in body.split('\n')[:-1]]
+
+
+@pytest.mark.parametrize('mode', ['', '&mode=stream'])
+def test_scrape_ndjson_framing(client, scraper_id, mode):
+    response = client.get(f'/scrape/{scraper_id}?stream=ndjson{mode}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = records(response)
+    assert len(rows) == ROWS
+    assert rows[0] == {'name': 'name 0', 'price': '0.00'}
+    assert rows[-1] == {'name': f'name {ROWS - 1}', 'price': f'{ROWS - 1}.00'}
+    assert rows == client.get(f'/scrape/{scraper_id}').get_json()['data']
+
+
+def test_raw_ndjson_framing(client, scraper_id):
+    response = client.get(f'/raw/{scraper_id}?output_format=json&tags=tr><td&group_row_count=2&row_labels=a&row_labels=b&stream=ndjson')
+    rows = records(response)
+    assert len(rows) == ROWS
+    assert rows[-1] == {'a': f'name {ROWS - 1}', 'b': f'{ROWS - 1}.00'}
+
+
+def test_failure_mid_stream_ends_with_an_error_record(client, scraper_id, monkeypatch):
+    import extraction
+
+    real_iter_rows = extraction.ExtractionPlan.iter_rows
+
+    def iter_rows(self, cells):
+        for index, row in enumerate(real_iter_rows(self, cells)):
+            if index == 3:
+                raise RuntimeError('connection dropped')
+            yield row
+
+    monkeypatch.setattr(extraction.ExtractionPlan, 'iter_rows', iter_rows)
+    rows = records(client.get(f'/scrape/{scraper_id}?stream=ndjson'))
+    assert len(rows) == 4
+    assert rows[-1] == {'error': 'connection dropped'}
+
+
+def test_closing_a_stream_early_releases_the_upstream_connection(client, scraper_id, pages, monkeypatch):
+    monkeypatch.setattr(fetch, 'FETCH_MAX_CONNECTIONS_PER_HOST', 1)
+    monkeypatch.setattr(fetch, 'FETCH_POOL_TIMEOUT', 0.5)
+    monkeypatch.setattr(fetch, 'STREAM_CHUNK_SIZE', 1024)
+    monkeypatch.setattr(fetch, '_host_semaphores', {})
+    closed = []
+    real_close = fetch.requests.Response.close
+
+    def close(self):
+        closed.append(self.url)
+        real_close(self)
+
+    monkeypatch.setattr(fetch.requests.Response, 'close', close)
+
+    response = client.get(f'/scrape/{scraper_id}?stream=ndjson&mode=stream', buffered=False)
+    body = iter(response.response)
+    assert json.loads(next(body)) == {'name': 'name 0', 'price': '0.00'}
+    # The upstream body is still being read, so its connection is held
+    with pytest.raises(fetch.HostBusy):
+        with host_connection(pages.url('/table')):
+            pass
+
+    response.close()
+    assert closed == [pages.url('/table')]
+    start = time.monotonic()
+    with host_connection(pages.url('/table')):
+        assert time.monotonic() - start < 0.5
@@ -0,0 +1,89 @@
+import pytest
+
+import parse_jobs
+import parse_pool
+import scraper_routes
+from parse_pool import ParseJobError, ParseMemoryExceeded, ParseTimeout
+
+TABLE = '<div class="main"><table>' + ''.join(f'<tr><td>name {i}</td><td>{i}.00</td></tr>' for i in range(20)) + '</table></div>'
+
+
+@pytest.fixture
+def scraper_id(client, pages):
+    pages.pages['/table'] = TABLE
+    return client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': pages.url('/table')}).get_json()['scraper_id']
+
+
+def test_raw_extraction_runs_in_the_pool(client, scraper_id, monkeypatch):
+    query = f'/raw/{scraper_id}?output_format=json&tags=tr><td&row_labels=name&row_labels=price&group_row_count=2&trim_tag=<div class="main">'
+    monkeypatch.setattr(scraper_routes, 'PARSE_POOL_OFFLOAD', False)
+    local = client.get(query).get_json()
+
+    calls = []
+    real_extract = scraper_routes.run_extract_cells
+
+    def run_extract_cells(*args):
+        calls.append(args)
+        return real_extract(*args)
+
+    monkeypatch.setattr(scraper_routes, 'PARSE_POOL_OFFLOAD', True)
+    monkeypatch.setattr(scraper_routes, 'run_extract_cells', run_extract_cells)
+    monkeypatch.setattr(scraper_routes, 'load_document', lambda *args: pytest.fail('parsed in the request worker'))
+    pooled = client.get(query + '&n=1').get_json()
+
+    assert len(calls) == 1
+    assert pooled == local
+    assert pooled['data'][0] == {'name': 'name 0', 'price': '0.00'}
+
+
+def test_raw_trim_tag_not_found_in_the_pool(client, scraper_id, monkeypatch):
+    monkeypatch.setattr(scraper_routes, 'PARSE_POOL_OFFLOAD', True)
+    response = client.get(f'/raw/{scraper_id}?output_format=json&tags=td&trim_tag=<section>')
+    assert response.status_code == 404
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(parse_pool, 'PARSE_POOL_WORKERS', 1)
+    monkeypatch.setattr(parse_pool, 'PARSE_JOB_MAX_MEMORY_MB', 512)
+    monkeypatch.setattr(parse_pool, 'PARSE_JOB_GRACE', 1)
+    monkeypatch.setattr(parse_pool, '_pool', None)
+    yield parse_pool.get_parse_pool()
+    if parse_pool._pool is not None:
+        parse_pool._pool.shutdown(wait=True, cancel_futures=True)
+    parse_pool._pool = None
+
+
+def test_job_past_its_deadline_is_a_504(pool):
+    with pytest.raises(ParseTimeout) as error:
+        parse_pool._run(parse_jobs.spin, '', None, None, 0.5)
+    assert error.value.status == 504
+    # The alarm stops the job without losing the process
+    assert parse_pool._pool is pool
+    assert parse_pool._run(parse_jobs.echo, 'ok', None, None, 1) == 'OK'
+
+
+@pytest.mark.skipif(parse_pool.resource is None, reason='RLIMIT_AS needs the resource module')
+def test_job_over_the_memory_cap_is_a_413(pool):
+    with pytest.raises(ParseMemoryExceeded) as error:
+        parse_pool._run(parse_jobs.allocate, '', None, None, 5)
+    assert error.value.status == 413
+    assert parse_pool._pool is pool
+    assert parse_pool._run(parse_jobs.echo, 'ok', None, None, 1) == 'OK'
+
+
+def test_job_ignoring_its_alarm_replaces_the_pool(pool):
+    with pytest.raises(ParseTimeout):
+        parse_pool._run(parse_jobs.ignore_alarm, '', None, None, 0.5)
+    assert parse_pool._pool is None
+    assert parse_pool._run(parse_jobs.echo, 'ok', None, None, 1) == 'OK'
+    assert parse_pool._pool is not pool
+
+
+def test_broken_pool_is_replaced(pool):
+    with pytest.raises(ParseJobError) as error:
+        parse_pool._run(parse_jobs.crash, '', None, None, 5)
+    assert error.value.status == 500
+    assert parse_pool._pool is None
+    assert parse_pool._run(parse_jobs.echo, 'ok', None, None, 1) == 'OK'
+    assert parse_pool._pool is not pool
@@ -0,0 +1,54 @@
+from fetch import CachedPage
+from parsing import DocumentCache, TRIMMED_DOCUMENT_COST, DOCUMENT_SIZE_FACTOR, TrimTagNotFound, get_backend
+
+import pytest
+
+HTML = '<html><body><div class="main"><table><tr><td>a</td></tr></table></div><p>other</p></body></html>'
+
+
+def page(html=HTML):
+    return CachedPage('http://example.com', html.encode('utf-8'), 'utf-8', ttl=60)
+
+
+def test_trimmed_documents_share_the_root_charge():
+    cache = DocumentCache(max_bytes=10 * 1024 * 1024)
+    source = page()
+    backend = get_backend('html.parser')
+
+    root = cache.load(source, None, backend)
+    trimmed = cache.load(source, '<div class="main">', backend)
+
+    assert backend.tag_name(trimmed) == 'div'
+    assert trimmed is not root
+    assert cache.stats()['estimated_bytes'] == source.size * DOCUMENT_SIZE_FACTOR + TRIMMED_DOCUMENT_COST
+    assert cache.load(source, '<div class="main">', backend) is trimmed
+    assert cache.stats()['hits'] == 1
+
+
+def test_root_outlives_its_trimmed_entries():
+    source = page()
+    root_cost = source.size * DOCUMENT_SIZE_FACTOR
+    # Room for the root, one trimmed entry and nothing else
+    cache = DocumentCache(max_bytes=root_cost + TRIMMED_DOCUMENT_COST)
+    backend = get_backend('html.parser')
+
+    root = cache.load(source, None, backend)
+    cache.load(source, '<div class="main">', backend)
+    cache.load(source, '<table>', backend)
+
+    assert cache.stats()['entries'] == 2
+    assert cache.load(source, None, backend) is root
+
+
+def test_trimmed_entry_is_not_kept_without_its_root():
+    source = page()
+    cache = DocumentCache(max_bytes=source.size * DOCUMENT_SIZE_FACTOR - 1)
+    backend = get_backend('html.parser')
+
+    cache.load(source, '<div class="main">', backend)
+    assert cache.stats()['entries'] == 0
+
+
+def test_missing_trim_tag_raises():
+    with pytest.raises(TrimTagNotFound):
+        DocumentCache().load(page(), '<section>', get_backend('html.parser'))
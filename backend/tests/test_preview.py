@@ -0,0 +1,91 @@
+import pytest
+
+import scraper_routes
+
+PAGE = '<html><body><div class="main"><table>' + ''.join(
+    f'<tr><td>name {i}</td><td>{i}.00</td></tr>' for i in range(30)
+) + '</table></div><p>footer</p></body></html>'
+
+
+@pytest.fixture
+def scraper_id(client, pages):
+    pages.pages['/table'] = PAGE
+    return client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': pages.url('/table')}).get_json()['scraper_id']
+
+
+def preview(client, scraper_id, query=''):
+    return client.get(f'/preview/{scraper_id}?tags=tr><td&row_labels=name&row_labels=price&group_row_count=2{query}')
+
+
+def test_all_sections_by_default(client, scraper_id):
+    body = preview(client, scraper_id).get_json()
+    assert set(body) == {'json', 'html', 'tags'}
+    assert body['json']['data'][0] == {'name': 'name 0', 'price': '0.00'}
+    assert len(body['json']['data']) == 30
+    assert body['html']['offset'] == 0
+    assert body['html']['next_offset'] is None
+    assert body['html']['total_length'] == len(body['html']['content'])
+    assert body['tags']['tags'][0]['tag'] == '<[document]>'
+
+
+def test_selected_sections_only(client, scraper_id, pages):
+    assert set(preview(client, scraper_id, '&sections=json').get_json()) == {'json'}
+    assert set(preview(client, scraper_id, '&sections=tags,%20html').get_json()) == {'html', 'tags'}
+    assert preview(client, scraper_id, '&sections=json,css').status_code == 400
+    assert preview(client, scraper_id, '&sections=,').status_code == 400
+    # One fetch serves every section and request
+    assert pages.requests == ['/table']
+
+
+def test_html_pages_until_the_end(client, scraper_id):
+    full = preview(client, scraper_id, '&sections=html').get_json()['html']
+    total = full['total_length']
+
+    content = ''
+    offset = 0
+    requests = 0
+    while offset is not None:
+        page = preview(client, scraper_id, f'&sections=html&html_offset={offset}&html_limit=500').get_json()['html']
+        assert page['offset'] == offset
+        assert page['total_length'] == total
+        assert len(page['content']) <= 500
+        content += page['content']
+        offset = page['next_offset']
+        requests += 1
+
+    assert content == full['content']
+    assert requests == -(-total // 500)
+
+    past_end = preview(client, scraper_id, f'&sections=html&html_offset={total + 10}').get_json()['html']
+    assert past_end['content'] == ''
+    assert past_end['next_offset'] is None
+
+
+def test_html_limit_is_clamped(client, scraper_id, monkeypatch):
+    monkeypatch.setattr(scraper_routes, 'PREVIEW_HTML_PAGE_CHARS', 100)
+    page = preview(client, scraper_id, '&sections=html&html_limit=100000&html_offset=-5').get_json()['html']
+    assert page['offset'] == 0
+    assert len(page['content']) == 100
+    assert page['next_offset'] == 100
+
+    page = preview(client, scraper_id, '&sections=html&html_limit=0').get_json()['html']
+    assert len(page['content']) == 1
+    assert page['next_offset'] == 1
+
+
+def test_trim_tag(client, scraper_id):
+    body = preview(client, scraper_id, '&trim_tag=<div class="main">').get_json()
+    assert 'footer' not in body['html']['content']
+    assert len(body['json']['data']) == 30
+    assert body['tags']['tags'][0]['tag'] == '<div>'
+
+
+def test_trim_tag_not_found(client, scraper_id):
+    for sections in ('json', 'html', 'tags'):
+        response = preview(client, scraper_id, f'&trim_tag=<section>&sections={sections}')
+        assert response.status_code == 404
+        assert response.get_json() == {'error': 'Trim tag not found in page'}
+
+
+def test_unknown_scraper(client):
+    assert client.get('/preview/999').status_code == 404
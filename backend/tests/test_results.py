@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import db
+import results
+from results import load_current_results, load_results, save_results
+
+
+@pytest.fixture
+def scraper_id(client):
+    response = client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': 'http://example.com'})
+    return response.get_json()['scraper_id']
+
+
+@pytest.fixture
+def cursor(database):
+    conn = db.connect()
+    yield conn.cursor()
+    conn.close()
+
+
+def test_save_results_diffs_against_stored_rows(cursor, scraper_id):
+    first = [{'name': 'a', 'price': '1'}, {'name': 'b', 'price': '2'}, {'name': 'c', 'price': '3'}]
+    assert save_results(cursor, scraper_id, first, 'f1', {}) == {'inserted': 3, 'updated': 0, 'removed': 0}
+
+    second = [{'name': 'a', 'price': '1'}, {'name': 'b', 'price': '5'}]
+    assert save_results(cursor, scraper_id, second, 'f2', {'content_hash': 'h'}) == {'inserted': 0, 'updated': 1, 'removed': 1}
+
+    rows, last_updated_on = load_results(cursor, scraper_id)
+    assert rows == second
+    assert last_updated_on is not None
+    cursor.execute('SELECT last_content_hash, upstream_content_hash FROM scrapers WHERE scraper_id = %s', (scraper_id,))
+    assert dict(cursor.fetchone()) == {'last_content_hash': 'f2', 'upstream_content_hash': 'h'}
+
+
+def test_save_results_pages_large_writes(cursor, scraper_id, monkeypatch):
+    monkeypatch.setattr(results, 'RESULTS_WRITE_PAGE_SIZE', 7)
+    rows = [{'n': str(i)} for i in range(50)]
+    save_results(cursor, scraper_id, rows, 'f1', {})
+    changed = [{'n': str(i * 2)} for i in range(50)]
+    assert save_results(cursor, scraper_id, changed, 'f2', {})['updated'] == 49
+    assert load_results(cursor, scraper_id)[0] == changed
+
+
+def test_concurrent_writers_do_not_collide(database, scraper_id):
+    first = db.connect()
+    second = db.connect()
+    try:
+        save_results(first.cursor(), scraper_id, [{'n': '1'}, {'n': '2'}], 'f1', {})
+        # The second writer diffs against an empty table too, then waits for the first to commit
+        done = threading.Event()
+
+        def write_second():
+            save_results(second.cursor(), scraper_id, [{'n': '3'}, {'n': '4'}, {'n': '5'}], 'f2', {})
+            second.commit()
+            done.set()
+
+        thread = threading.Thread(target=write_second)
+        thread.start()
+        assert not done.wait(0.5)
+        first.commit()
+        thread.join(5)
+        assert done.is_set()
+
+        assert load_current_results(first.cursor(), scraper_id) == ([{'n': '3'}, {'n': '4'}, {'n': '5'}], 'f2')
+    finally:
+        first.close()
+        second.close()
+
+
+def test_load_current_results_without_rows(cursor, scraper_id):
+    assert load_current_results(cursor, scraper_id) == ([], None)
+    assert load_current_results(cursor, 999) == ([], None)
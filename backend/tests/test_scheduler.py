@@ -0,0 +1,163 @@
+from concurrent.futures import Future
+from datetime import datetime
+
+import psycopg2
+import pytest
+
+import db
+import scheduler
+from scheduler import Scheduler, enqueue_job
+
+
+def add_scraper(cursor, name='prices'):
+    now = datetime.utcnow()
+    cursor.execute(
+        'INSERT INTO scraper_config (created_on) VALUES (%s) RETURNING scraper_config_id',
+        (now,)
+    )
+    scraper_config_id = cursor.fetchone()['scraper_config_id']
+    cursor.execute(
+        'INSERT INTO scrapers (scraper_name, scraping_url, scraper_config_id, created_on) VALUES (%s, %s, %s, %s) RETURNING scraper_id',
+        (name, 'http://example.com', scraper_config_id, now)
+    )
+    return cursor.fetchone()['scraper_id']
+
+
+def job_statuses(cursor):
+    cursor.execute('SELECT job_id, status FROM scrape_jobs')
+    return {row['job_id']: row['status'] for row in cursor.fetchall()}
+
+
+@pytest.fixture
+def conn(database):
+    conn = db.connect()
+    yield conn
+    conn.close()
+
+
+def test_enqueue_job_returns_the_open_job(conn):
+    cursor = conn.cursor()
+    scraper_id = add_scraper(cursor)
+    first = enqueue_job(cursor, scraper_id)
+    second = enqueue_job(cursor, scraper_id)
+    assert first['job_id'] == second['job_id']
+
+
+def test_only_one_open_job_per_scraper(conn):
+    cursor = conn.cursor()
+    scraper_id = add_scraper(cursor)
+    conn.commit()
+    insert = "INSERT INTO scrape_jobs (scraper_id, status, triggered_by, enqueued_on) VALUES (%s, 'pending', 'manual', now())"
+    cursor.execute(insert, (scraper_id,))
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        cursor.execute(insert, (scraper_id,))
+    conn.rollback()
+
+
+def test_enqueue_job_after_a_concurrent_insert(conn, monkeypatch):
+    cursor = conn.cursor()
+    scraper_id = add_scraper(cursor)
+    conn.commit()
+
+    # Another request inserts between this one's existence check and its insert
+    other = db.connect()
+    other.cursor().execute(
+        "INSERT INTO scrape_jobs (scraper_id, status, triggered_by, enqueued_on) VALUES (%s, 'pending', 'manual', now())",
+        (scraper_id,)
+    )
+    other.commit()
+    other.close()
+    real_execute = cursor.execute
+    skipped = []
+
+    def execute(sql, params=None):
+        if sql.startswith('SELECT * FROM scrape_jobs') and not skipped:
+            skipped.append(sql)
+            return real_execute('SELECT 1 WHERE false')
+        return real_execute(sql, params)
+
+    monkeypatch.setattr(cursor, 'execute', execute, raising=False)
+    job = enqueue_job(cursor, scraper_id)
+    conn.commit()
+    assert job['scraper_id'] == scraper_id
+    assert list(job_statuses(cursor).values()) == ['pending']
+
+
+def test_failed_result_save_does_not_lose_other_jobs(conn, monkeypatch):
+    cursor = conn.cursor()
+    good = add_scraper(cursor, 'good')
+    bad = add_scraper(cursor, 'bad')
+    good_job = enqueue_job(cursor, good)['job_id']
+    bad_job = enqueue_job(cursor, bad)['job_id']
+    cursor.execute("UPDATE scrape_jobs SET status = 'running', started_on = now()")
+    conn.commit()
+
+    real_save = scheduler.save_results
+
+    def save_results(cursor, scraper_id, rows, fingerprint, upstream):
+        if scraper_id == bad:
+            # Same key twice, as when a concurrent /scrape stores the rows first
+            for _ in range(2):
+                cursor.execute(
+                    "INSERT INTO scrape_results (scraper_id, row_index, row_hash, row_data, created_on, last_updated_on) VALUES (%s, 0, '', '{}', now(), now())",
+                    (scraper_id,)
+                )
+        return real_save(cursor, scraper_id, rows, fingerprint, upstream)
+
+    monkeypatch.setattr(scheduler, 'save_results', save_results)
+
+    runner = Scheduler(workers=1)
+    for job_id, scraper_id in ((bad_job, bad), (good_job, good)):
+        future = Future()
+        future.set_result({'status': 200, 'scraper_id': scraper_id, 'data': [{'a': '1'}], 'fingerprint': 'f', 'upstream': {}})
+        runner.running[future] = job_id
+
+    runner._record_finished(conn, datetime.utcnow())
+    runner.executor.shutdown()
+
+    assert runner.running == {}
+    assert job_statuses(cursor) == {good_job: 'succeeded', bad_job: 'failed'}
+    cursor.execute('SELECT COUNT(*) AS count FROM scrape_results WHERE scraper_id = %s', (good,))
+    assert cursor.fetchone()['count'] == 1
+
+
+def test_enqueue_due_skips_scrapers_with_an_open_job(conn):
+    cursor = conn.cursor()
+    due = add_scraper(cursor, 'due')
+    queued = add_scraper(cursor, 'queued')
+    cursor.execute('UPDATE scrapers SET scrape_interval = 60')
+    enqueue_job(cursor, queued)
+    conn.commit()
+
+    assert scheduler.enqueue_due(cursor, datetime.utcnow()) == 1
+    assert scheduler.enqueue_due(cursor, datetime.utcnow()) == 0
+    conn.commit()
+    cursor.execute('SELECT scraper_id FROM scrape_jobs ORDER BY job_id')
+    assert [row['scraper_id'] for row in cursor.fetchall()] == [queued, due]
+
+
+def test_expired_job_keeps_its_outcome(conn):
+    cursor = conn.cursor()
+    scraper_id = add_scraper(cursor)
+    job_id = enqueue_job(cursor, scraper_id)['job_id']
+    cursor.execute("UPDATE scrape_jobs SET status = 'running', started_on = now() - INTERVAL '1 day'")
+    assert scheduler.expire_stale_jobs(cursor, datetime.utcnow()) == 1
+    conn.commit()
+
+    result = {'status': 200, 'scraper_id': scraper_id, 'data': [{'a': '1'}], 'fingerprint': 'f', 'upstream': {}}
+    assert scheduler.finish_job(cursor, job_id, result, datetime.utcnow()) is False
+    assert scheduler.finish_job(cursor, job_id, {'status': 500, 'error': 'late'}, datetime.utcnow()) is False
+    conn.commit()
+
+    cursor.execute('SELECT status, error FROM scrape_jobs WHERE job_id = %s', (job_id,))
+    assert dict(cursor.fetchone()) == {'status': 'failed', 'error': 'Job timed out'}
+    cursor.execute('SELECT COUNT(*) AS count FROM scrape_results WHERE scraper_id = %s', (scraper_id,))
+    assert cursor.fetchone()['count'] == 0
+
+
+@pytest.mark.parametrize('query', ['limit=-1', 'limit=abc', 'scraper_id=abc'])
+def test_job_list_rejects_bad_arguments(client, query):
+    response = client.get(f'/jobs?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
@@ -0,0 +1,104 @@
+def create_config(client, **fields):
+    response = client.post('/scraper-config', json=fields)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['scraper_config_id']
+
+
+def test_config_crud(client):
+    first = create_config(client, trim_input='<table>', group_row_count=2)
+    second = create_config(client)
+    assert second != first
+
+    config = client.get(f'/scraper-config/{first}').get_json()
+    assert (config['trim_input'], config['group_row_count']) == ('<table>', 2)
+
+    assert client.put(f'/scraper-config/{first}', json={'trim_input': '<div>', 'group_row_count': 3}).status_code == 200
+    config = client.get(f'/scraper-config/{first}').get_json()
+    assert (config['trim_input'], config['group_row_count']) == ('<div>', 3)
+    assert config['last_updated_on'] is not None
+
+    assert [c['scraper_config_id'] for c in client.get('/scraper-config').get_json()] == [first, second]
+    assert client.delete(f'/scraper-config/{first}').status_code == 200
+    assert client.get(f'/scraper-config/{first}').status_code == 404
+    assert client.put(f'/scraper-config/{first}', json={}).status_code == 404
+    assert client.delete(f'/scraper-config/{first}').status_code == 404
+
+
+def test_tag_crud(client):
+    config_id = create_config(client)
+    assert client.post(f'/scraper-config/{config_id}/tags', json={'tag': ['<td>', '<th>']}).status_code == 201
+    assert client.post(f'/scraper-config/{config_id}/tags', json={'tag': '<li>'}).status_code == 201
+    assert client.post(f'/scraper-config/{config_id}/tags', json={}).status_code == 400
+
+    tags = client.get(f'/scraper-config/{config_id}/tags').get_json()
+    assert [tag['tag'] for tag in tags] == ['<td>', '<th>', '<li>']
+    tag_id = tags[0]['scraper_config_tag_id']
+
+    assert client.put(f'/scraper-config/tags/{tag_id}', json={'tag': '<tr>'}).status_code == 200
+    assert client.get(f'/scraper-config/tags/{tag_id}').get_json()['tag'] == '<tr>'
+    assert client.delete(f'/scraper-config/tags/{tag_id}').status_code == 200
+    assert client.get(f'/scraper-config/tags/{tag_id}').status_code == 404
+    assert client.put(f'/scraper-config/tags/{tag_id}', json={'tag': '<tr>'}).status_code == 404
+
+    response = client.put(f'/scraper-config/{config_id}/tags', json={'tag': ['<a>', '<b>']})
+    assert response.get_json()['count'] == 2
+    assert [tag['tag'] for tag in client.get(f'/scraper-config/{config_id}/tags').get_json()] == ['<a>', '<b>']
+    assert client.delete(f'/scraper-config/{config_id}/tags').status_code == 200
+    assert client.get(f'/scraper-config/{config_id}/tags').get_json() == []
+
+
+def test_row_label_crud(client):
+    config_id = create_config(client)
+    response = client.post(f'/scraper-config/{config_id}/row-labels', json={'row_order': [0, 1], 'row_label': ['name', 'price']})
+    assert response.status_code == 201
+    assert client.post(f'/scraper-config/{config_id}/row-labels', json={'row_order': [2], 'row_label': ['a', 'b']}).status_code == 400
+
+    labels = client.get(f'/scraper-config/{config_id}/row-labels').get_json()
+    assert [(label['row_order'], label['row_label']) for label in labels] == [(0, 'name'), (1, 'price')]
+    label_id = labels[1]['scraper_config_row_label_id']
+
+    assert client.put(f'/scraper-config/row-labels/{label_id}', json={'row_order': 1, 'row_label': 'cost'}).status_code == 200
+    assert client.get(f'/scraper-config/row-labels/{label_id}').get_json()['row_label'] == 'cost'
+    assert client.delete(f'/scraper-config/row-labels/{label_id}').status_code == 200
+    assert client.get(f'/scraper-config/row-labels/{label_id}').status_code == 404
+
+    response = client.put(f'/scraper-config/{config_id}/row-labels', json={'row_label': ['x', 'y', 'z']})
+    assert response.get_json()['count'] == 3
+    labels = client.get(f'/scraper-config/{config_id}/row-labels').get_json()
+    assert [(label['row_order'], label['row_label']) for label in labels] == [(0, 'x'), (1, 'y'), (2, 'z')]
+    assert client.delete(f'/scraper-config/{config_id}/row-labels').status_code == 200
+    assert client.get(f'/scraper-config/{config_id}/row-labels').get_json() == []
+
+
+def test_children_of_an_unknown_config_are_rejected(client):
+    assert client.post('/scraper-config/999/tags', json={'tag': ['<td>']}).status_code == 404
+    assert client.post('/scraper-config/999/row-labels', json={'row_order': [0], 'row_label': ['a']}).status_code == 404
+    assert client.put('/scraper-config/999/tags', json={'tag': ['<td>']}).status_code == 404
+    assert client.put('/scraper-config/999/row-labels', json={'row_label': ['a']}).status_code == 404
+
+
+def test_deleting_a_config_removes_its_tags_and_labels(client):
+    config_id = create_config(client)
+    client.post(f'/scraper-config/{config_id}/tags', json={'tag': ['<td>']})
+    client.post(f'/scraper-config/{config_id}/row-labels', json={'row_order': [0], 'row_label': ['name']})
+
+    assert client.delete(f'/scraper-config/{config_id}').status_code == 200
+    assert client.get(f'/scraper-config/{config_id}/tags').get_json() == []
+    assert client.get(f'/scraper-config/{config_id}/row-labels').get_json() == []
+
+
+def test_config_edits_reach_the_next_scrape(client, pages):
+    pages.pages['/table'] = '<table><tr><th>h</th><td>a</td><td>1</td></tr></table>'
+    created = client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': pages.url('/table')}).get_json()
+    config_id = created['scraper_config_id']
+    client.put(f'/scraper-config/{config_id}', json={'group_row_count': 2})
+    client.put(f'/scraper-config/{config_id}/tags', json={'tag': ['<td>']})
+    client.put(f'/scraper-config/{config_id}/row-labels', json={'row_label': ['name', 'price']})
+
+    assert client.get(f"/scrape/{created['scraper_id']}").get_json()['data'] == [{'name': 'a', 'price': '1'}]
+
+    client.put(f'/scraper-config/{config_id}/tags', json={'tag': ['<th>', '<td>']})
+    client.put(f'/scraper-config/{config_id}', json={'group_row_count': 3})
+    client.put(f'/scraper-config/{config_id}/row-labels', json={'row_label': ['head', 'name', 'price']})
+    data = client.get(f"/scrape/{created['scraper_id']}").get_json()['data']
+    assert data == [{'head': 'h', 'name': 'a', 'price': '1'}]
@@ -0,0 +1,175 @@
+def create_scraper(client, **fields):
+    body = {'scraper_name': 'prices', 'scraping_url': 'http://example.com/prices', **fields}
+    response = client.post('/scrapers', json=body)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+
+def test_create_scraper_returns_new_ids(client):
+    first = create_scraper(client)
+    second = create_scraper(client, scraper_name='other')
+
+    assert second['scraper_id'] != first['scraper_id']
+    scraper = client.get(f"/scrapers/{first['scraper_id']}").get_json()
+    assert scraper['scraper_name'] == 'prices'
+    assert scraper['scraper_config_id'] == first['scraper_config_id']
+
+
+def test_scrape_interval_is_set_on_create_and_update(client):
+    created = create_scraper(client, scrape_interval=300)
+    scraper_id = created['scraper_id']
+    assert client.get(f'/scrapers/{scraper_id}').get_json()['scrape_interval'] == 300
+
+    response = client.put('/scrapers', json={
+        'scraper_id': scraper_id,
+        'scraper_name': 'prices',
+        'scraping_url': 'http://example.com/prices',
+        'scrape_interval': 60
+    })
+    assert response.status_code == 200
+    assert client.get(f'/scrapers/{scraper_id}').get_json()['scrape_interval'] == 60
+
+
+def test_invalid_scrape_interval_is_rejected(client):
+    response = client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': 'http://example.com', 'scrape_interval': -5})
+    assert response.status_code == 400
+
+
+def test_update_unknown_scraper_returns_404(client):
+    response = client.put('/scrapers', json={'scraper_id': 999, 'scraper_name': 'x', 'scraping_url': 'http://example.com'})
+    assert response.status_code == 404
+
+
+def test_page_cache_ttl_is_set_on_create_and_update(client):
+    scraper_id = create_scraper(client, page_cache_ttl=0)['scraper_id']
+    assert client.get(f'/scrapers/{scraper_id}').get_json()['page_cache_ttl'] == 0
+
+    client.put('/scrapers', json={'scraper_id': scraper_id, 'scraper_name': 'prices', 'scraping_url': 'http://example.com/prices', 'page_cache_ttl': 120})
+    assert client.get(f'/scrapers/{scraper_id}').get_json()['page_cache_ttl'] == 120
+
+
+def test_page_cache_ttl_override_is_used(client, pages):
+    pages.pages['/table'] = '<table><tr><td>a</td></tr></table>'
+    uncached = create_scraper(client, scraping_url=pages.url('/table'), page_cache_ttl=0)['scraper_id']
+
+    for _ in range(2):
+        assert client.get(f'/raw/{uncached}?output_format=json&tags=td').status_code == 200
+    assert pages.requests == ['/table', '/table']
+
+    pages.requests.clear()
+    cached = create_scraper(client, scraping_url=pages.url('/table'))['scraper_id']
+    for _ in range(2):
+        assert client.get(f'/raw/{cached}?output_format=json&tags=td').status_code == 200
+    assert pages.requests == ['/table']
+
+
+def test_parser_backend_is_set_on_create_and_update(client):
+    scraper_id = create_scraper(client, parser_backend='lxml')['scraper_id']
+    assert client.get(f'/scrapers/{scraper_id}').get_json()['parser_backend'] == 'lxml'
+
+    client.put('/scrapers', json={'scraper_id': scraper_id, 'scraper_name': 'prices', 'scraping_url': 'http://example.com/prices', 'parser_backend': 'html.parser'})
+    assert client.get(f'/scrapers/{scraper_id}').get_json()['parser_backend'] == 'html.parser'
+
+
+def test_unknown_parser_backend_is_rejected(client):
+    for parser_backend in ('html5', ''):
+        response = client.post('/scrapers', json={'scraper_name': 'prices', 'scraping_url': 'http://example.com', 'parser_backend': parser_backend})
+        assert response.status_code == 400
+
+    scraper_id = create_scraper(client, parser_backend='lxml')['scraper_id']
+    response = client.put('/scrapers', json={'scraper_id': scraper_id, 'scraper_name': 'prices', 'scraping_url': 'http://example.com/prices', 'parser_backend': 'html5'})
+    assert response.status_code == 400
+    assert client.get(f'/scrapers/{scraper_id}').get_json()['parser_backend'] == 'lxml'
+
+
+def test_delete_scraper_removes_its_results(client):
+    import db
+    from results import save_results
+
+    scraper_id = create_scraper(client)['scraper_id']
+    conn = db.connect()
+    try:
+        save_results(conn.cursor(), scraper_id, [{'a': '1'}, {'a': '2'}], 'f', {})
+        conn.commit()
+
+        response = client.delete('/scrapers', json={'scraper_id': scraper_id})
+        assert response.status_code == 200
+        assert client.get(f'/scrapers/{scraper_id}').status_code == 404
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) AS count FROM scrape_results WHERE scraper_id = %s', (scraper_id,))
+        assert cursor.fetchone()['count'] == 0
+    finally:
+        conn.close()
+
+    assert client.delete('/scrapers', json={'scraper_id': scraper_id}).status_code == 404
+
+
+def test_name_and_url_filters_match_wildcards_literally(client):
+    create_scraper(client, scraper_name='a_b', scraping_url='http://example.com/100%')
+    create_scraper(client, scraper_name='axb', scraping_url='http://example.com/1000')
+    create_scraper(client, scraper_name='a\\b', scraping_url='http://example.com/a\\b')
+
+    def names(query):
+        return [scraper['scraper_name'] for scraper in client.get(f'/scrapers?{query}').get_json()]
+
+    assert names('name=a_b') == ['a_b']
+    assert names('url=100%25') == ['a_b']
+    assert names('name=a%5Cb') == ['a\\b']
+    assert names('name=A') == ['a_b', 'axb', 'a\\b']
+
+
+def test_cached_scrape_checks_the_stored_fingerprint(client, pages):
+    import db
+    from results import save_results
+
+    pages.pages['/table'] = '<table><tr><td>a</td><td>1</td></tr></table>'
+    created = create_scraper(client, scraping_url=pages.url('/table'))
+    client.put(f"/scraper-config/{created['scraper_config_id']}/tags", json={'tag': ['<td>']})
+    client.put(f"/scraper-config/{created['scraper_config_id']}/row-labels", json={'row_label': ['name', 'price']})
+    scraper_id = created['scraper_id']
+
+    fresh = client.get(f'/scrape/{scraper_id}').get_json()
+    assert client.get(f'/scrape/{scraper_id}').get_json()['cached'] is True
+
+    # Another worker stores rows for other content; this worker's cached definition doesn't see it
+    conn = db.connect()
+    save_results(conn.cursor(), scraper_id, [{'name': 'b', 'price': '2'}], 'other', {})
+    conn.commit()
+    conn.close()
+
+    response = client.get(f'/scrape/{scraper_id}').get_json()
+    assert response['cached'] is False
+    assert response['data'] == fresh['data']
+    assert client.get(f'/scrape/{scraper_id}').get_json()['cached'] is True
+
+
+def test_storing_results_keeps_other_definitions_cached(client, pages):
+    from loader import definition_cache
+
+    pages.pages['/table'] = '<table><tr><td>a</td></tr></table>'
+    first = create_scraper(client, scraping_url=pages.url('/table'))['scraper_id']
+    second = create_scraper(client, scraper_name='other')['scraper_id']
+    client.get(f'/scrapers/{second}/full')
+    generation = definition_cache.generation_for(second)
+
+    assert client.get(f'/scrape/{first}').status_code == 200
+    assert definition_cache.generation_for(second) == generation
+    assert definition_cache.get(second) is not None
+
+
+def test_full_definition_formats_dates_alike_and_hides_internal_fields(client, pages):
+    pages.pages['/table'] = '<table><tr><td>a</td></tr></table>'
+    created = create_scraper(client, scraping_url=pages.url('/table'))
+    scraper_id, config_id = created['scraper_id'], created['scraper_config_id']
+    assert client.post(f'/scraper-config/{config_id}/tags', json={'tag': '<td>'}).status_code == 201
+    assert client.get(f'/scrape/{scraper_id}').status_code == 200
+
+    full = client.get(f'/scrapers/{scraper_id}/full').get_json()
+    config = client.get(f'/scraper-config/{config_id}').get_json()
+    tags = client.get(f'/scraper-config/{config_id}/tags').get_json()
+    assert full['config']['created_on'] == config['created_on']
+    assert full['config']['last_updated_on'] == config['last_updated_on']
+    assert full['tags'][0]['created_on'] == tags[0]['created_on']
+    assert full['created_on'] == client.get(f'/scrapers/{scraper_id}').get_json()['created_on']
+    for field in ('last_content_hash', 'upstream_etag', 'upstream_last_modified', 'upstream_content_hash'):
+        assert field not in full
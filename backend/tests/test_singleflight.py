@@ -0,0 +1,56 @@
+import time
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+
+from singleflight import SingleFlight
+
+
+def coalesced(name):
+    return REGISTRY.get_sample_value('coalesced_calls_total', {'endpoint': name, 'outcome': 'coalesced'}) or 0
+
+
+def test_singleflight_shares_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('single', 'key', slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('single', 'key', slow))) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    # Each follower counts itself as coalesced right before it starts waiting
+    while coalesced('single') < 5:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ['result'] * 6
+    assert calls == [1]
+    assert flight.in_flight() == 0
+    assert flight.do('test', 'key', lambda: 'fresh') == 'fresh'
+
+
+def test_singleflight_shares_the_error_and_forgets_the_key():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        flight.do('test', 'key', fail)
+    assert flight.in_flight() == 0
+    assert flight.do('test', 'key', lambda: 1) == 1
+    assert flight.do('test', 'other', lambda: 2) == 2
@@ -0,0 +1,57 @@
+import pytest
+
+from extraction import ExtractionPlan
+from parsing import get_backend, trim_document
+from streaming import StreamingExtractor
+
+HTML = '''
+<html><body>
+<div class="main">
+  <table>
+    <tr><th>Name</th><th>Price</th></tr>
+    <tr><td>apple <b>red</b></td><td>1.00</td></tr>
+    <tr><td>pear</td><td>2.&amp;50<br>each</td></tr>
+    <tr><td><script>skip()</script>plum</td><td></td></tr>
+  </table>
+  <ul><li>one<li>two</ul>
+</div>
+<p>outside</p>
+</body></html>
+'''
+
+
+def streamed(html, tag_names, trim_tag=None, chunk_size=7):
+    extractor = StreamingExtractor(tag_names, trim_tag)
+    cells = []
+    for start in range(0, len(html), chunk_size):
+        extractor.feed(html[start:start + chunk_size])
+        cells.extend(extractor.drain())
+        if extractor.done:
+            break
+    if not extractor.done:
+        extractor.finish()
+    cells.extend(extractor.drain())
+    return cells
+
+
+@pytest.mark.parametrize('tag_names, trim_tag', [
+    (['td'], None),
+    (['td', 'th'], None),
+    (['td', 'b', 'li'], '<div class="main">'),
+    (['tr'], '<table>'),
+    (['p', 'li'], '<ul>'),
+    (['script', 'td'], None),
+])
+def test_streaming_extractor_matches_the_parsed_tree(tag_names, trim_tag):
+    backend = get_backend('html.parser')
+    plan = ExtractionPlan(tag_names, [], trim_tag, None)
+    root = trim_document(backend, backend.parse(HTML), trim_tag)
+    assert streamed(HTML, tag_names, trim_tag) == plan.extract(backend, root)
+
+
+def test_streaming_extractor_stops_after_the_trim_element():
+    extractor = StreamingExtractor(['li'], '<ul>')
+    extractor.feed(HTML)
+    assert extractor.done
+    # html.parser nests unclosed <li> elements, so the first one holds both strings
+    assert extractor.drain() == ['onetwo', 'two']
@@ -20,6 +20,10 @@ function App() {
 
   // New states for Refresh output and toggles
   const [refreshOutputHtml, setRefreshOutputHtml] = useState('');
+  // /preview returns the HTML a page at a time; these track where the next page starts
+  const [refreshHtmlNextOffset, setRefreshHtmlNextOffset] = useState(null);
+  const [refreshHtmlTotalLength, setRefreshHtmlTotalLength] = useState(0);
+  const [refreshPreviewParams, setRefreshPreviewParams] = useState({});
   const [refreshOutputJson, setRefreshOutputJson] = useState(null);
   const [showOutput, setShowOutput] = useState(true);
   const [outputFormatHtml, setOutputFormatHtml] = useState(true); // true=HTML, false=JSON
@@ -45,8 +49,16 @@ function App() {
   const fetchScrapers = async () => {
     setLoading(true);
     try {
-      const response = await axios.get(`${API_BASE_URL}/scrapers`);
-      setScrapers(response.data);
+      // The list endpoint is paginated; follow X-Next-After-Id until the last page
+      let allScrapers = [];
+      let afterId = null;
+      do {
+        const params = afterId ? { after_id: afterId, limit: 1000 } : { limit: 1000 };
+        const response = await axios.get(`${API_BASE_URL}/scrapers`, { params });
+        allScrapers = allScrapers.concat(response.data);
+        afterId = response.headers['x-next-after-id'];
+      } while (afterId);
+      setScrapers(allScrapers);
     } catch (error) {
       console.error('Error fetching scrapers:', error);
     } finally {
@@ -204,25 +216,16 @@ function App() {
   // Fetch scraper config details including new fields
   const fetchScraperConfigDetails = async (scraperId) => {
     try {
-      // Fetch scraper to get scraper_config_id
-      const scraperRes = await axios.get(`${API_BASE_URL}/scrapers/${scraperId}`);
-      const scraperConfigId = scraperRes.data.scraper_config_id;
-
-      // Fetch scraper config
-      const configRes = await axios.get(`${API_BASE_URL}/scraper-config/${scraperConfigId}`);
-      const config = configRes.data;
+      // Scraper, config, tags and row labels in a single request
+      const fullRes = await axios.get(`${API_BASE_URL}/scrapers/${scraperId}/full`);
+      const config = fullRes.data.config || {};
       setTrimOutput(config.trim_input || '');
       setGroupRows(config.group_row_count || 1); // default to 1 if falsy
 
-      // Fetch selected tags
-      const tagsRes = await axios.get(`${API_BASE_URL}/scraper-config/${scraperConfigId}/tags`);
-      setSelectedTags(Array.isArray(tagsRes.data) ? tagsRes.data : []);
+      setSelectedTags(Array.isArray(fullRes.data.tags) ? fullRes.data.tags : []);
 
-      // Fetch row labels
-      const rowLabelsRes = await axios.get(`${API_BASE_URL}/scraper-config/${scraperConfigId}/row-labels`);
-      // Sort row labels by row_order
-      const sortedRowLabels = rowLabelsRes.data.sort((a, b) => a.row_order - b.row_order);
-      setRowLabels(sortedRowLabels);
+      // Row labels arrive sorted by row_order
+      setRowLabels(Array.isArray(fullRes.data.row_labels) ? fullRes.data.row_labels : []);
 
     } catch (error) {
       console.error('Error fetching scraper config details:', error);
@@ -238,10 +241,6 @@ function App() {
     if (!editScraperId) return;
 
     try {
-      // Fetch scraper to get scraper_config_id
-      const scraperRes = await axios.get(`${API_BASE_URL}/scrapers/${editScraperId}`);
-      const scraperConfigId = scraperRes.data.scraper_config_id;
-
       // Prepare optional parameters
       const params = {};
       if (trimOutput) params.trim_tag = trimOutput;
@@ -261,18 +260,37 @@ function App() {
         });
       }
 
-      // Call /raw endpoint with json output
-      const jsonRes = await axios.get(`${API_BASE_URL}/raw/${editScraperId}`, { params: { ...params, output_format: 'json' } });
-      setRefreshOutputJson(jsonRes.data);
-
-      // Call /raw endpoint with html output
-      const htmlRes = await axios.get(`${API_BASE_URL}/raw/${editScraperId}`, { params: { ...params, output_format: 'html' } });
-      setRefreshOutputHtml(htmlRes.data || '');
+      // One /preview call fetches and parses the page once for both outputs
+      const previewRes = await axios.get(`${API_BASE_URL}/preview/${editScraperId}`, { params: { ...params, sections: 'json,html' } });
+      setRefreshOutputJson(previewRes.data.json);
+      const html = previewRes.data.html;
+      setRefreshOutputHtml(html ? html.content : '');
+      setRefreshHtmlNextOffset(html ? html.next_offset : null);
+      setRefreshHtmlTotalLength(html ? html.total_length : 0);
+      setRefreshPreviewParams(params);
 
     } catch (error) {
       console.error('Error refreshing output:', error);
       setRefreshOutputJson(null);
       setRefreshOutputHtml('');
+      setRefreshHtmlNextOffset(null);
+      setRefreshHtmlTotalLength(0);
+    }
+  };
+
+  // Appends the next page of prettified HTML for the preview shown above
+  const loadMoreOutputHtml = async () => {
+    if (refreshHtmlNextOffset === null) return;
+    try {
+      const previewRes = await axios.get(`${API_BASE_URL}/preview/${editScraperId}`, {
+        params: { ...refreshPreviewParams, sections: 'html', html_offset: refreshHtmlNextOffset }
+      });
+      const html = previewRes.data.html;
+      setRefreshOutputHtml((current) => current + html.content);
+      setRefreshHtmlNextOffset(html.next_offset);
+      setRefreshHtmlTotalLength(html.total_length);
+    } catch (error) {
+      console.error('Error loading more output:', error);
     }
   };
 
@@ -394,22 +412,15 @@ function App() {
         group_row_count: groupRows
       });
 
-      // Delete existing tags and post new tags
-      await axios.delete(`${API_BASE_URL}/scraper-config/${scraperConfigId}/tags`);
-      if (selectedTags.length > 0) {
-        await axios.post(`${API_BASE_URL}/scraper-config/${scraperConfigId}/tags`, {
-          tag: selectedTags.map(tag => tag.tag)
-        });
-      }
+      // Replace tags and row labels, each in a single request
+      await axios.put(`${API_BASE_URL}/scraper-config/${scraperConfigId}/tags`, {
+        tag: selectedTags.map(tag => tag.tag)
+      });
 
-      // Delete existing row labels and post new row labels
-      await axios.delete(`${API_BASE_URL}/scraper-config/${scraperConfigId}/row-labels`);
-      if (rowLabels.length > 0) {
-        await axios.post(`${API_BASE_URL}/scraper-config/${scraperConfigId}/row-labels`, {
-          row_order: rowLabels.map((label, index) => index),
-          row_label: rowLabels.map(label => label.row_label)
-        });
-      }
+      await axios.put(`${API_BASE_URL}/scraper-config/${scraperConfigId}/row-labels`, {
+        row_order: rowLabels.map((label, index) => index),
+        row_label: rowLabels.map(label => label.row_label)
+      });
 
       setShowEditConfigModal(false);
     } catch (error) {
@@ -627,6 +638,16 @@ function App() {
                   {outputFormatHtml ? refreshOutputHtml : JSON.stringify(refreshOutputJson, null, 2)}
                 </pre>
               )}
+              {showOutput && outputFormatHtml && refreshHtmlNextOffset !== null && (
+                <div style={{ display: 'flex', alignItems: 'center', gap: '10px', marginBottom: 10 }}>
+                  <span>
+                    Showing {refreshOutputHtml.length.toLocaleString()} of {refreshHtmlTotalLength.toLocaleString()} characters
+                  </span>
+                  <button onClick={loadMoreOutputHtml}>
+                    Load more
+                  </button>
+                </div>
+              )}
 
               <div style={{ display: 'flex', justifyContent: 'flex-end', gap: '10px' }}>
                 <button onClick={handleConfirmConfig}>